@@ -0,0 +1,361 @@
+"""
+Load test for the ML and sensor APIs.
+
+Starts the APIs it needs (unless they are already running), drives one
+endpoint with an async HTTP client and reports throughput and latency
+percentiles. Results are saved as JSON together with the git commit, so
+runs can be compared between commits with --compare.
+
+With --rate the test is open-loop: requests are scheduled at a fixed rate
+whatever the response times, and latency is measured from the scheduled
+send time, so time spent waiting for a free connection counts. Without it
+each of the --concurrency clients sends its next request as soon as the
+previous one returns.
+
+The fleet scenarios run the mock sensor server with --fleet-size virtual
+sensors and a --profile of link latency and failures; fleet asks random
+sensors one at a time, fleet-batch asks for --batch-size random sensors
+per request.
+
+Usage:
+    python load_test.py predict --concurrency 32 --duration 20
+    python load_test.py batch --batch-size 500 --concurrency 4
+    python load_test.py sensor --rate 50 --duration 10
+    python load_test.py fleet --fleet-size 5000 --profile cellular --concurrency 256
+    python load_test.py fleet-batch --fleet-size 5000 --batch-size 1000
+    python load_test.py predict --compare load_test_results/predict_<...>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'load_test_results')
+
+ML_API_URL = "http://localhost:8000"
+SENSOR_API_URL = "http://localhost:8001"
+
+# How each API is started and when it counts as up
+SERVERS = {
+    'ml': {
+        'command': [sys.executable, 'irrigation_api.py'],
+        'cwd': os.path.join(BACKEND_DIR, 'ml_api'),
+        'ready_url': f"{ML_API_URL}/health/ready"
+    },
+    'sensor': {
+        'command': [sys.executable, 'mock_sensor_server.py'],
+        'cwd': os.path.join(BACKEND_DIR, 'sensor_api'),
+        'ready_url': f"{SENSOR_API_URL}/api/health"
+    },
+    # The mock sensor server again, started with the fleet options
+    'fleet': {
+        'command': [sys.executable, 'mock_sensor_server.py'],
+        'cwd': os.path.join(BACKEND_DIR, 'sensor_api'),
+        'ready_url': f"{SENSOR_API_URL}/api/health"
+    }
+}
+SERVER_START_TIMEOUT = 60
+
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+def sensor_reading(rng):
+    """A reading as the sensors report it: integer moisture, temperature in tenths"""
+    return {'moisture': rng.randint(400, 900), 'temperature': rng.randint(0, 400) / 10}
+
+
+def fleet_sensor(rng, fleet_size):
+    """A random virtual sensor id, as mock_sensor_server names them"""
+    return f"sensor-{rng.randint(1, fleet_size)}"
+
+
+# Scenario name -> (server, method, url, body(rng, args), readings per request);
+# a url with {sensor} gets a random fleet sensor per request
+SCENARIOS = {
+    'predict': ('ml', 'POST', f"{ML_API_URL}/api/predict",
+                lambda rng, args: sensor_reading(rng), lambda batch_size: 1),
+    'batch': ('ml', 'POST', f"{ML_API_URL}/api/predict/batch",
+              lambda rng, args: {'readings': [sensor_reading(rng) for _ in range(args.batch_size)]},
+              lambda batch_size: batch_size),
+    'sensor': ('sensor', 'GET', f"{SENSOR_API_URL}/api/getCurrentReading",
+               lambda rng, args: None, lambda batch_size: 1),
+    'fleet': ('fleet', 'GET', f"{SENSOR_API_URL}/api/sensors/{{sensor}}/current",
+              lambda rng, args: None, lambda batch_size: 1),
+    'fleet-batch': ('fleet', 'POST', f"{SENSOR_API_URL}/api/fleet/readings",
+                    lambda rng, args: {'sensors': [fleet_sensor(rng, args.fleet_size)
+                                                   for _ in range(args.batch_size)]},
+                    lambda batch_size: batch_size),
+}
+BATCH_SCENARIOS = ('batch', 'fleet-batch')
+
+
+def is_up(url):
+    try:
+        return httpx.get(url, timeout=1).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+def start_server(name, options=()):
+    """Start an API unless it is already answering; returns the process or None"""
+    server = SERVERS[name]
+    if is_up(server['ready_url']):
+        print(f"Using the {name} API already running at {server['ready_url']}")
+        return None
+
+    command = server['command'] + list(options)
+    print(f"Starting the {name} API: {' '.join(command)}")
+    process = subprocess.Popen(
+        command, cwd=server['cwd'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        # Its own process group, so reloader and worker children stop with it
+        start_new_session=(os.name == 'posix')
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while not is_up(server['ready_url']):
+        if process.poll() is not None or time.monotonic() > deadline:
+            stop_server(process)
+            raise RuntimeError(f"The {name} API did not become ready")
+        time.sleep(0.2)
+    return process
+
+
+def check_fleet(fleet_size, profile):
+    """
+    Fail unless the sensor API that answers is the mock server simulating
+    fleet_size sensors with profile, since one already running is reused
+    """
+    fleet = httpx.get(SERVERS['fleet']['ready_url'], timeout=5).json().get('fleet')
+    if fleet is None:
+        raise RuntimeError(
+            f"The sensor API at {SENSOR_API_URL} is not the mock sensor server; stop it to run fleet scenarios"
+        )
+    if (fleet.get('sensors'), fleet.get('profile')) != (fleet_size, profile):
+        raise RuntimeError(
+            f"The mock sensor server at {SENSOR_API_URL} simulates {fleet.get('sensors')} sensors with "
+            f"profile '{fleet.get('profile')}', not {fleet_size} with '{profile}'; stop it or pass "
+            f"--fleet-size {fleet.get('sensors')} --profile {fleet.get('profile')}"
+        )
+
+
+def stop_server(process):
+    if process is None or process.poll() is not None:
+        return
+    if os.name == 'posix':
+        os.killpg(process.pid, signal.SIGTERM)
+    else:
+        process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_load(args):
+    """Send requests for args.duration seconds (or args.requests requests) and time each one"""
+    server, method, url, make_body, _ = SCENARIOS[args.scenario]
+    rng = random.Random(args.seed)
+    bodies = [
+        (url.format(sensor=fleet_sensor(rng, args.fleet_size)), make_body(rng, args))
+        for _ in range(min(args.requests or 1000, 1000))
+    ]
+
+    latencies = []
+    statuses = {}
+    errors = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        async def send(request, scheduled, record):
+            request_url, body = request
+            try:
+                response = await client.request(method, request_url, json=body)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if record:
+                latencies.append(time.perf_counter() - scheduled)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not status.startswith('2'):
+                    errors[status] = errors.get(status, 0) + 1
+
+        # Warm-up requests prime connections and the servers and aren't recorded
+        for i in range(args.warmup):
+            await send(bodies[i % len(bodies)], time.perf_counter(), False)
+
+        start = time.perf_counter()
+        end = start + args.duration
+        sent = 0
+
+        def more():
+            return sent < args.requests if args.requests else time.perf_counter() < end
+
+        if args.rate:
+            slots = asyncio.Semaphore(args.concurrency)
+            pending = set()
+
+            async def scheduled_send(body, scheduled):
+                async with slots:
+                    await send(body, scheduled, True)
+
+            interval = 1 / args.rate
+            while more():
+                scheduled = start + sent * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                task = asyncio.create_task(scheduled_send(bodies[sent % len(bodies)], scheduled))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                sent += 1
+            if pending:
+                await asyncio.gather(*pending)
+        else:
+            async def client_loop():
+                nonlocal sent
+                while more():
+                    body = bodies[sent % len(bodies)]
+                    sent += 1
+                    await send(body, time.perf_counter(), True)
+
+            await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+
+        elapsed = time.perf_counter() - start
+
+    return latencies, statuses, errors, elapsed
+
+
+def summarize(latencies, statuses, errors, elapsed, readings_per_request):
+    latencies_ms = np.array(latencies) * 1000
+    completed = len(latencies_ms)
+    summary = {
+        'requests': completed,
+        'errors': sum(errors.values()),
+        'statuses': statuses,
+        'elapsed_s': elapsed,
+        'throughput_rps': completed / elapsed if elapsed else 0.0,
+        'readings_per_s': completed * readings_per_request / elapsed if elapsed else 0.0,
+        'latency_ms': {}
+    }
+    if completed:
+        summary['latency_ms'] = {
+            'min': float(latencies_ms.min()),
+            'mean': float(latencies_ms.mean()),
+            **{f"p{p}": float(np.percentile(latencies_ms, p)) for p in LATENCY_PERCENTILES},
+            'max': float(latencies_ms.max())
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(result):
+    summary = result['summary']
+    config = result['config']
+    print(f"\n{config['scenario']} @ {result['commit'] or 'unknown commit'}: "
+          f"concurrency {config['concurrency']}, rate {config['rate'] or 'unlimited'}, "
+          f"batch size {config['batch_size']}")
+    print(f"  requests     {summary['requests']} in {summary['elapsed_s']:.1f}s, {summary['errors']} errors "
+          f"{summary['statuses']}")
+    print(f"  throughput   {summary['throughput_rps']:,.1f} req/s, {summary['readings_per_s']:,.1f} readings/s")
+    if summary['latency_ms']:
+        print("  latency ms   " + "  ".join(f"{name} {value:.2f}" for name, value in summary['latency_ms'].items()))
+
+
+def print_comparison(result, baseline):
+    """Change from a previous result file, for throughput and each latency statistic"""
+    print(f"\nCompared with {baseline['commit'] or 'unknown commit'} ({baseline['finished_at']}):")
+    rows = [('throughput_rps', result['summary']['throughput_rps'], baseline['summary']['throughput_rps'])]
+    for name, value in result['summary']['latency_ms'].items():
+        previous = baseline['summary']['latency_ms'].get(name)
+        if previous is not None:
+            rows.append((f"latency {name} ms", value, previous))
+    for name, value, previous in rows:
+        change = (value - previous) / previous * 100 if previous else float('nan')
+        print(f"  {name:18} {previous:12,.2f} -> {value:12,.2f}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the ML and sensor APIs")
+    parser.add_argument('scenario', choices=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16, help="Connections / requests in flight")
+    parser.add_argument('--rate', type=float, default=0, help="Requests per second (0: as fast as possible)")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds to run")
+    parser.add_argument('--requests', type=int, default=0, help="Stop after this many requests instead")
+    parser.add_argument('--batch-size', type=int, default=100, help="Readings per batch request")
+    parser.add_argument('--fleet-size', type=int, default=1000, help="Virtual sensors in the fleet scenarios")
+    parser.add_argument('--profile', default='none', help="Mock link profile in the fleet scenarios")
+    parser.add_argument('--warmup', type=int, default=50, help="Unrecorded requests sent first")
+    parser.add_argument('--timeout', type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-start', action='store_true', help="Don't start the APIs, use running ones")
+    parser.add_argument('--output', help="Result file (default load_test_results/<scenario>_<time>.json)")
+    parser.add_argument('--compare', help="Previous result file to compare with")
+    args = parser.parse_args()
+
+    server, _, _, _, readings_per_request = SCENARIOS[args.scenario]
+    options = ['--sensors', str(args.fleet_size), '--profile', args.profile] if server == 'fleet' else []
+    process = None if args.no_start else start_server(server, options)
+    try:
+        if server == 'fleet':
+            check_fleet(args.fleet_size, args.profile)
+        started_at = datetime.now()
+        latencies, statuses, errors, elapsed = asyncio.run(run_load(args))
+    finally:
+        stop_server(process)
+
+    result = {
+        'commit': git_commit(),
+        'started_at': started_at.isoformat(),
+        'finished_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'scenario': args.scenario,
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'duration_s': args.duration,
+            'requests': args.requests,
+            'batch_size': args.batch_size if args.scenario in BATCH_SCENARIOS else 1,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            **({'fleet_size': args.fleet_size, 'profile': args.profile} if server == 'fleet' else {})
+        },
+        'summary': summarize(latencies, statuses, errors, elapsed, readings_per_request(args.batch_size))
+    }
+    print_summary(result)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{args.scenario}_{started_at.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
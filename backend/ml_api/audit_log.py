@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+
+# Columns of an audit record, in the order record() takes them
+AUDIT_COLUMNS = (
+    'timestamp', 'endpoint', 'crop', 'zone', 'moisture', 'temperature',
+    'probability', 'threshold', 'need_irrigation', 'model_version'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    crop TEXT,
+    zone TEXT,
+    moisture REAL NOT NULL,
+    temperature REAL NOT NULL,
+    probability REAL NOT NULL,
+    threshold REAL NOT NULL,
+    need_irrigation INTEGER NOT NULL,
+    model_version TEXT
+);
+CREATE INDEX IF NOT EXISTS decisions_timestamp ON decisions (timestamp);
+"""
+
+
+class AuditLog:
+    """
+    Append-only record of irrigation decisions in a SQLite database.
+
+    record() only appends a tuple to an in-memory buffer, so the request
+    path never touches the disk. A background task writes the buffer in one
+    transaction every flush_interval seconds, or as soon as it holds
+    flush_batch_size records. The buffer is bounded: once max_queue_size
+    records are waiting, new ones are dropped and counted rather than
+    slowing requests down. The database runs in WAL mode, so queries and
+    other worker processes can read while a batch is being written.
+
+    record() and record_many() must be called from the event loop thread.
+    """
+
+    def __init__(self, path, max_queue_size=100000, flush_interval=1.0, flush_batch_size=5000):
+        self.path = path
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+
+        self._pending = []
+        self._batch_ready = None
+        self._flusher = None
+        self._stopping = False
+        self._connection = None
+
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self):
+        return self._flusher is not None and not self._flusher.done()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    async def start(self):
+        """Create the database if needed and start the flush task on the running loop"""
+        if self.running:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = self._connect()
+        self._connection.executescript(SCHEMA)
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush task once it has written whatever is still buffered"""
+        if not self.running:
+            return
+        # Not cancelled: a batch being written in a worker thread would keep
+        # going and race the close below
+        self._stopping = True
+        self._batch_ready.set()
+        await self._flusher
+        self._flusher = None
+        self._connection.close()
+        self._connection = None
+
+    def record(self, timestamp, endpoint, crop, zone, moisture, temperature,
+               probability, threshold, need_irrigation, model_version):
+        """Buffer one decision; returns False when the buffer is full and it was dropped"""
+        if len(self._pending) >= self.max_queue_size:
+            self.dropped += 1
+            return False
+        self._pending.append((timestamp, endpoint, crop, zone, moisture, temperature,
+                              probability, threshold, need_irrigation, model_version))
+        self.recorded += 1
+        if len(self._pending) >= self.flush_batch_size and self._batch_ready is not None:
+            self._batch_ready.set()
+        return True
+
+    def record_many(self, timestamp, endpoint, crop, zone, moisture, temperature,
+                    probabilities, threshold, need_irrigation, model_version):
+        """Buffer a batch of decisions sharing a timestamp and model; returns how many were kept"""
+        room = max(self.max_queue_size - len(self._pending), 0)
+        kept = min(room, len(moisture))
+        self.dropped += len(moisture) - kept
+        self._pending.extend(
+            (timestamp, endpoint, crop, zone, m, t, p, threshold, n, model_version)
+            for m, t, p, n in zip(moisture[:kept], temperature[:kept], probabilities[:kept], need_irrigation[:kept])
+        )
+        self.recorded += kept
+        if len(self._pending) >= self.flush_batch_size and self._batch_ready is not None:
+            self._batch_ready.set()
+        return kept
+
+    def _take(self):
+        records, self._pending = self._pending, []
+        return records
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            records = self._take()
+            if records:
+                await loop.run_in_executor(None, self._write, records)
+        # Records buffered while the last batch was being written
+        await loop.run_in_executor(None, self._write, self._take())
+
+    def _write(self, records):
+        """Insert records in one transaction (runs in a worker thread)"""
+        if not records:
+            return
+        start = time.perf_counter()
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    f"INSERT INTO decisions ({', '.join(AUDIT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(AUDIT_COLUMNS))})",
+                    ((timestamp.isoformat(), *rest) for timestamp, *rest in records)
+                )
+            self.written += len(records)
+        except sqlite3.Error as e:
+            self.failed += len(records)
+            logging.error(f"Writing {len(records)} audit records failed: {str(e)}")
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def query(self, limit=100, since=None, until=None, crop=None, model_version=None):
+        """
+        Most recent decisions first, as dicts; opens its own read connection.
+        since and until may carry a UTC offset; they are compared in local
+        time, which is how timestamps are stored.
+        """
+        conditions, parameters = [], []
+        for column, operator, value in (
+            ('timestamp', '>=', since), ('timestamp', '<', until),
+            ('crop', '=', crop), ('model_version', '=', model_version)
+        ):
+            if getattr(value, 'tzinfo', None) is not None:
+                value = value.astimezone().replace(tzinfo=None)
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if not os.path.exists(self.path):
+            return []
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=10)
+        try:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                f"SELECT id, {', '.join(AUDIT_COLUMNS)} FROM decisions {where} ORDER BY id DESC LIMIT ?",
+                (*parameters, limit)
+            ).fetchall()
+        finally:
+            connection.close()
+        return [dict(row, need_irrigation=bool(row['need_irrigation'])) for row in rows]
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "path": self.path,
+            "queue_depth": len(self._pending),
+            "max_queue_size": self.max_queue_size,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms
+        }
@@ -0,0 +1,157 @@
+"""
+Measures what the /metrics instrumentation costs per prediction request.
+
+Requests are driven straight through the ASGI app in-process, so the numbers
+exclude the network and the HTTP server and show the instrumentation
+overhead at its most visible. Each cycle runs four rounds, off, on, on, off,
+so drift cancels out, and the overhead reported is the median over cycles
+of the on rounds minus the off rounds. The same difference between the two
+off rounds of each cycle is the noise floor: an overhead within it can't
+be told apart from run-to-run variation. The cache is disabled and readings
+are random so every request reaches the model. The middleware is also
+timed on its own around an endpoint that does nothing.
+
+Usage:
+    python benchmark_metrics.py [requests_per_round] [cycles]
+"""
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+import irrigation_api
+from metrics import Histogram, MetricsMiddleware, MetricsRegistry, mark_handler_start, mark_handler_end
+
+
+def request_scope(path, body):
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('127.0.0.1', 8000)
+    }
+
+
+async def call(app, path, body):
+    """Send one request through the ASGI app and return its status"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(request_scope(path, body), receive, send)
+    return status
+
+
+async def run_round(bodies):
+    start = time.perf_counter()
+    for body in bodies:
+        status = await call(irrigation_api.app, '/api/predict', body)
+        if status != 200:
+            raise RuntimeError(f"Prediction request failed with status {status}")
+    return (time.perf_counter() - start) / len(bodies)
+
+
+def observe_cost(samples=200000):
+    histogram = Histogram('benchmark_seconds', 'Benchmark histogram', ('stage',))
+    start = time.perf_counter()
+    for i in range(samples):
+        histogram.observe(i * 1e-7, 'predict')
+    return (time.perf_counter() - start) / samples
+
+
+async def middleware_cost(requests=50000):
+    """Per-request cost of MetricsMiddleware around an endpoint that does nothing"""
+    async def endpoint(scope, receive, send):
+        mark_handler_start(scope)
+        mark_handler_end(scope)
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        pass
+
+    registry = MetricsRegistry()
+    middleware = MetricsMiddleware(
+        endpoint, registry,
+        requests=registry.counter('requests', 'Requests', ('path', 'status')),
+        errors=registry.counter('errors', 'Errors', ('path', 'status')),
+        in_flight=registry.gauge('in_flight', 'In flight', ('path',)),
+        stage_latency=registry.histogram('stages', 'Stages', ('path', 'stage')),
+        request_latency=registry.histogram('latency', 'Latency', ('path',)),
+        instrumented_paths=['/api/predict']
+    )
+    scope = request_scope('/api/predict', b'')
+
+    timings = {}
+    for enabled in (True, False):
+        registry.enabled = enabled
+        start = time.perf_counter()
+        for _ in range(requests):
+            await middleware(scope, None, send)
+        timings[enabled] = (time.perf_counter() - start) / requests
+    return timings[True] - timings[False]
+
+
+async def main(requests_per_round, cycles):
+    irrigation_api.load_model()
+    irrigation_api.warm_up()
+    irrigation_api.ready = True
+    irrigation_api.cache.max_size = 0
+
+    rng = random.Random(0)
+    bodies = [
+        json.dumps({'moisture': rng.uniform(400, 900), 'temperature': rng.uniform(0, 40)}).encode()
+        for _ in range(requests_per_round)
+    ]
+
+    # One untimed round per mode warms up routing and the thread pool
+    for enabled in (True, False):
+        irrigation_api.metrics.enabled = enabled
+        await run_round(bodies[:200])
+
+    overheads, noise, timings = [], [], {True: [], False: []}
+    for _ in range(cycles):
+        cycle = []
+        for enabled in (False, True, True, False):
+            irrigation_api.metrics.enabled = enabled
+            cycle.append(await run_round(bodies))
+        off_first, on_first, on_second, off_second = cycle
+        overheads.append((on_first + on_second - off_first - off_second) / 2)
+        noise.append(abs(off_second - off_first))
+        timings[False] += [off_first, off_second]
+        timings[True] += [on_first, on_second]
+    irrigation_api.metrics.enabled = True
+
+    off = statistics.median(timings[False]) * 1e6
+    overhead = statistics.median(overheads) * 1e6
+    print(f"Histogram.observe:              {observe_cost() * 1e9:8.0f} ns")
+    print(f"MetricsMiddleware alone:        {await middleware_cost() * 1e6:8.1f} us/request")
+    print(f"/api/predict, metrics disabled: {off:8.1f} us/request")
+    print(f"/api/predict, metrics enabled:  {statistics.median(timings[True]) * 1e6:8.1f} us/request")
+    print(f"Overhead:                       {overhead:8.1f} us/request ({overhead / off * 100:+.1f}%)")
+    print(f"Noise (off vs off):             {statistics.median(noise) * 1e6:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    requests_per_round = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    asyncio.run(main(requests_per_round, cycles))
@@ -1,21 +1,144 @@
 # irrigation_api.py
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import sys
+import warnings
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware  # Add this import
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-import joblib
 import logging
 from datetime import datetime
-import pandas as pd
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+import numpy as np
+from typing import List, Optional
 
 # Define project root directory at the top of the file
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Shared model loading and feature encoding live with the ML code
+sys.path.insert(0, BASE_DIR)
+from ml.inference import (
+    load_serving_model, ModelRegistry, check_canaries, crop_model_path, load_newest_valid,
+    IRRIGATION_THRESHOLD, decide
+)
+from prediction_batcher import MicroBatcher, QueueFullError
+from prediction_cache import PredictionCache
+from metrics import MetricsRegistry, MetricsMiddleware, mark_handler_start, mark_handler_end
+from prediction_stream import PredictionBroadcaster, sse_event, SSE_KEEPALIVE
+from model_pool import ModelPool, UnknownModelError
+from audit_log import AuditLog
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+MODELS_DIR = os.path.join(BASE_DIR, 'ml', 'models')
+MODEL_PATH = os.path.join(MODELS_DIR, 'irrigation_model.joblib')
+# Versioned models published by training; the latest version is served
+# when the registry is not empty, MODEL_PATH otherwise
+MODEL_REGISTRY_DIR = os.path.join(BASE_DIR, 'ml', 'models', 'registry')
+# Seconds between checks for a newer registry version; 0 disables the watcher
+MODEL_WATCH_INTERVAL = 0
+# Allowed difference from the canary probabilities recorded at publish time
+CANARY_TOLERANCE = 1e-9
+# Serve the flattened forest exported next to the model when it exists
+USE_COMPACT_MODEL = True
+# Answer on-grid readings from a precomputed decision table (built offline
+# with ml/training/build_decision_table.py, or at startup if missing)
+TABLE_MODE = False
+# Memory-map the compact model and table arrays instead of reading them
+MMAP_MODEL = True
+# Readings scored once at startup before the API reports ready
+WARMUP_READINGS = [(400, 0), (650, 20), (900, 40), (612.5, 21.37)]
+
+# Per-crop and per-zone models. Requests may name a crop or a zone; the
+# default crop is served by the model above, any other crop by the model
+# at CROP_MODELS[crop] or ml/models/crops/<crop>/ (written by
+# `rf_model_training.py <csv> <crop>`), loaded on first use into an LRU
+# pool bounded by MODEL_POOL_MAX_MB and MODEL_POOL_MAX_MODELS
+DEFAULT_CROP = "wheat"
+CROP_MODELS = {}
+ZONE_CROPS = {}  # zone id -> crop, e.g. {"north-field": "maize"}
+MODEL_POOL_MAX_MB = 256
+MODEL_POOL_MAX_MODELS = 8
+# Crops loaded at startup (before forking workers) instead of on first use
+PRELOAD_CROPS = []
+
+# Prediction settings; the irrigation threshold is IRRIGATION_THRESHOLD in
+# ml/inference/decisions.py, shared with the sensor API's local scoring
+MAX_BATCH_SIZE = 10000
+
+# Micro-batching of concurrent /api/predict calls: a batch is scored once it
+# holds MICRO_BATCH_SIZE readings or MICRO_BATCH_WAIT_MS after its first one
+MICRO_BATCHING = True
+MICRO_BATCH_SIZE = 64
+MICRO_BATCH_WAIT_MS = 2.0
+MICRO_BATCH_QUEUE_SIZE = 1000
+INFERENCE_WORKERS = 1
+
+# LRU cache of probabilities per (moisture, temperature); 0 disables it
+PREDICTION_CACHE_SIZE = 10000
+# Batches up to this many readings are looked up in the cache in one go;
+# larger ones are scored directly. Batch results are never cached
+BATCH_CACHE_MAX_READINGS = 64
+
+# Per-stage latency histograms and request counters exposed on /metrics
+METRICS_ENABLED = True
+METRICS_PATHS = ["/api/predict", "/api/predict/batch"]
+
+# Streaming predictions: while /api/predict/stream has clients, one task
+# follows the sensor API's /api/stream, scores each reading once and pushes
+# it to all of them. Sensor APIs without a stream (the mock server) are
+# polled every SENSOR_POLL_INTERVAL seconds instead, which is also the
+# delay before reconnecting after an error
+SENSOR_STREAM = True
+SENSOR_API_URL = "http://localhost:8001/api/getCurrentReading"
+SENSOR_STREAM_URL = "http://localhost:8001/api/stream"
+SENSOR_POLL_INTERVAL = 10
+SENSOR_TIMEOUT = 5
+# The sensor API sends a heartbeat every 15s, so a quieter stream is dead
+SENSOR_STREAM_TIMEOUT = 35
+STREAM_KEEPALIVE_INTERVAL = 15
+
+# Audit log of every decision (inputs, probability, threshold, model
+# version), buffered in memory and written in batches to SQLite by a
+# background task; records beyond AUDIT_QUEUE_SIZE waiting are dropped
+AUDIT_LOG = True
+AUDIT_DB_PATH = os.path.join(BASE_DIR, 'logs', 'decision_audit.db')
+AUDIT_QUEUE_SIZE = 100000
+AUDIT_FLUSH_INTERVAL = 1.0
+AUDIT_FLUSH_BATCH = 5000
+
+# Worker processes started by `python irrigation_api.py`; see launcher.py
+API_WORKERS = 1
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up in the background so liveness answers while the model loads"""
+    startup = asyncio.create_task(warm_start())
+    yield
+    startup.cancel()
+    for task in list(background_tasks):
+        task.cancel()
+    await batcher.stop()
+    await audit.stop()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Wheat Irrigation Prediction API",
     description="API for predicting irrigation needs for wheat crops based on sensor data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -27,6 +150,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics = MetricsRegistry(enabled=METRICS_ENABLED)
+request_count = metrics.counter(
+    "irrigation_api_requests_total", "Prediction requests handled", ("path", "status"))
+error_count = metrics.counter(
+    "irrigation_api_errors_total", "Prediction requests answered with a server error", ("path", "status"))
+in_flight = metrics.gauge(
+    "irrigation_api_requests_in_flight", "Prediction requests being handled", ("path",))
+request_latency = metrics.histogram(
+    "irrigation_api_request_duration_seconds", "End-to-end prediction request latency", ("path",))
+stage_latency = metrics.histogram(
+    "irrigation_api_stage_duration_seconds",
+    "Prediction request latency by stage (validation, handler, serialization)", ("path", "stage"))
+inference_latency = metrics.histogram(
+    "irrigation_api_inference_duration_seconds",
+    "Model call latency by stage (encode, predict), per batch", ("stage",))
+batch_queue_depth = metrics.gauge(
+    "irrigation_api_batch_queue_depth", "Readings waiting for the micro-batcher")
+audit_queue_depth = metrics.gauge(
+    "irrigation_api_audit_queue_depth", "Decisions waiting to be written to the audit log")
+model_ready = metrics.gauge(
+    "irrigation_api_model_ready", "1 once the model is loaded and warmed up")
+pooled_models = metrics.gauge(
+    "irrigation_api_pooled_models", "Per-crop models held in the model pool")
+pooled_model_bytes = metrics.gauge(
+    "irrigation_api_model_pool_bytes", "Approximate memory held by the model pool")
+
+app.add_middleware(
+    MetricsMiddleware,
+    registry=metrics,
+    requests=request_count,
+    errors=error_count,
+    in_flight=in_flight,
+    stage_latency=stage_latency,
+    request_latency=request_latency,
+    instrumented_paths=METRICS_PATHS
+)
+
+def observe_inference(stage, seconds):
+    inference_latency.observe(seconds, stage)
+
+def inference_observer():
+    """Stage callback for ServingModel predictions, None when metrics are off"""
+    return observe_inference if metrics.enabled else None
+
+# Crop and zone keys double as directory names, so they are kept to a safe alphabet
+ROUTING_KEY_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
 # Pydantic models for request validation
 class SensorData(BaseModel):
     moisture: float = Field(
@@ -41,132 +211,583 @@ class SensorData(BaseModel):
         le=40, 
         description="Temperature in Celsius (0-40)"
     )
+    crop: Optional[str] = Field(
+        None,
+        pattern=ROUTING_KEY_PATTERN,
+        description=f"Crop whose model scores the reading (default {DEFAULT_CROP})"
+    )
+    zone: Optional[str] = Field(
+        None,
+        pattern=ROUTING_KEY_PATTERN,
+        description="Zone id, scored with the model of the zone's crop"
+    )
 
 class PredictionResponse(BaseModel):
     need_irrigation: bool
     confidence: float  # Changed from str to float
     timestamp: datetime
 
-# Load the trained model
-try:
-    model = joblib.load(os.path.join(BASE_DIR, 'ml', 'models', 'irrigation_model.joblib'))
-    logging.info("Model loaded successfully")
-except Exception as e:
-    logging.error(f"Error loading model: {str(e)}")
-    raise RuntimeError("Failed to load model")
+class BatchSensorData(BaseModel):
+    readings: List[SensorData] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_SIZE,
+        description=f"Sensor readings to score in one call (1-{MAX_BATCH_SIZE})"
+    )
+    # A batch is scored by one model; crop and zone on individual readings are ignored
+    crop: Optional[str] = Field(None, pattern=ROUTING_KEY_PATTERN)
+    zone: Optional[str] = Field(None, pattern=ROUTING_KEY_PATTERN)
+
+class BatchPredictionItem(BaseModel):
+    need_irrigation: bool
+    confidence: float
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[BatchPredictionItem]  # Same order as the submitted readings
+    timestamp: datetime
+
+# Model state, filled in by warm_start (or before forking workers)
+model = None
+ready = False
+startup_error = None
+startup_timings = {"imports_ms": (time.perf_counter() - _import_started) * 1000}
+
+registry = ModelRegistry(MODEL_REGISTRY_DIR)
+reload_lock = asyncio.Lock()
+reload_status = {"state": "idle", "version": None, "error": None, "finished_at": None}
+background_tasks = set()
+
+def load_model_version(version=None):
+    """Load a registry version (the latest by default), or MODEL_PATH when the registry is empty"""
+    version = version or registry.latest()
+    model_path = registry.model_path(version) if version else MODEL_PATH
+    return load_model_file(model_path, version)
+
+def load_model_file(model_path, version=None):
+    return load_serving_model(
+        model_path, use_compact=USE_COMPACT_MODEL, table_mode=TABLE_MODE, mmap=MMAP_MODEL,
+        version=version
+    )
+
+def load_model():
+    """
+    Load the newest registry version that passes its canaries, or MODEL_PATH,
+    with the encoder it was trained with; the sensor API's DecisionScorer
+    picks its model the same way
+    """
+    global model
+    start = time.perf_counter()
+    try:
+        model, rejected = load_newest_valid(registry, load_model_file, MODEL_PATH, tolerance=CANARY_TOLERANCE)
+        for version, error in rejected.items():
+            logging.error(f"Model {version} rejected: {error}")
+        if rejected:
+            # The registry watcher doesn't retry the rejected latest version
+            latest = registry.latest()
+            reload_status.update(state="failed", version=latest, error=rejected.get(latest),
+                                 finished_at=datetime.now())
+        logging.info(f"Model {model.version} loaded successfully from {model.source}")
+    except Exception as e:
+        logging.error(f"Error loading model: {str(e)}")
+        raise RuntimeError("Failed to load model")
+    startup_timings["model_load_ms"] = (time.perf_counter() - start) * 1000
+
+def load_crop_model(crop):
+    """Load and validate the model of a non-default crop for the model pool"""
+    model_path = CROP_MODELS.get(crop) or crop_model_path(MODELS_DIR, crop)
+    if not os.path.exists(model_path):
+        raise UnknownModelError(f"No model for crop '{crop}'")
+    candidate = load_serving_model(
+        model_path, use_compact=USE_COMPACT_MODEL, table_mode=TABLE_MODE, mmap=MMAP_MODEL
+    )
+    validate_model(candidate)
+    return candidate
+
+def preload_models():
+    """Load the default model and PRELOAD_CROPS, e.g. before forking workers"""
+    load_model()
+    pool.preload(PRELOAD_CROPS)
+
+def validate_model(candidate):
+    """Score the canary readings with a freshly loaded model; raise if it looks broken"""
+    check_canaries(candidate, registry, CANARY_TOLERANCE)
+
+async def reload_model(version=None):
+    """
+    Load a model version in the background, validate it and swap it in.
+    Requests already running keep the model object they started with.
+    """
+    global model
+    async with reload_lock:
+        reload_status.update(state="loading", version=version or registry.latest(), error=None)
+        try:
+            candidate = await run_in_threadpool(load_model_version, version)
+            await run_in_threadpool(validate_model, candidate)
+            previous, model = model, candidate
+            logging.info(f"Model {previous.version} replaced by {candidate.version}")
+            reload_status.update(state="idle", version=candidate.version)
+        except Exception as e:
+            logging.error(f"Model reload failed: {str(e)}")
+            reload_status.update(state="failed", error=str(e))
+        reload_status["finished_at"] = datetime.now()
+
+async def watch_registry():
+    """Reload whenever a newer version appears in the registry"""
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        latest = registry.latest()
+        failed_before = reload_status["state"] == "failed" and reload_status["version"] == latest
+        if latest and latest != model.version and not failed_before:
+            await reload_model(latest)
+
+def spawn(coroutine):
+    """Run a background task, keeping a reference until it finishes"""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def warm_up():
+    """Score synthetic readings so first requests don't pay for lazy initialization"""
+    start = time.perf_counter()
+    moisture, temperature = (np.array(values, dtype=float) for values in zip(*WARMUP_READINGS))
+    model.predict_model(moisture, temperature)
+    model.predict_positive(moisture, temperature)
+    for m, t in WARMUP_READINGS:
+        decide(model.predict_one(m, t))
+    startup_timings["warmup_ms"] = (time.perf_counter() - start) * 1000
+
+async def warm_start():
+    """Load and warm up the model, start the batcher, then report ready"""
+    global ready, startup_error
+    try:
+        if model is None:
+            await run_in_threadpool(load_model)
+        await run_in_threadpool(warm_up)
+        await run_in_threadpool(pool.preload, PRELOAD_CROPS)
+        if MICRO_BATCHING:
+            await batcher.start()
+        if MODEL_WATCH_INTERVAL > 0:
+            spawn(watch_registry())
+        if SENSOR_STREAM:
+            spawn(follow_sensor_stream())
+        if AUDIT_LOG:
+            await audit.start()
+        ready = True
+        startup_timings["total_ms"] = (time.perf_counter() - _import_started) * 1000
+        logging.info("Startup complete: " + ", ".join(
+            f"{stage} {ms:.1f}ms" for stage, ms in startup_timings.items()
+        ))
+    except Exception as e:
+        startup_error = str(e)
+        logging.error(f"Startup failed: {startup_error}")
+
+def check_ready():
+    """Reject requests until the model is loaded and warmed up"""
+    if not ready:
+        raise HTTPException(status_code=503, detail=startup_error or "Model is still loading")
+
+def crop_for(crop=None, zone=None):
+    """Crop whose model serves a request: its crop, its zone's crop, or the default"""
+    if zone is not None:
+        if zone not in ZONE_CROPS:
+            raise UnknownModelError(f"Unknown zone '{zone}'")
+        if crop is not None and crop != ZONE_CROPS[zone]:
+            raise ValueError(f"Zone '{zone}' grows {ZONE_CROPS[zone]}, not {crop}")
+        return ZONE_CROPS[zone]
+    return crop or DEFAULT_CROP
+
+async def model_for(crop=None, zone=None):
+    """Serving model for a request's crop or zone, loading it into the pool on first use"""
+    try:
+        key = crop_for(crop, zone)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if key == DEFAULT_CROP:
+        return model
+
+    try:
+        return pool.peek(key) or await run_in_threadpool(pool.get, key)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logging.error(f"Loading the model for crop '{key}' failed: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Model for crop '{key}' could not be loaded")
+
+batcher = MicroBatcher(
+    lambda serving_model, moisture, temperature: serving_model.predict_positive(
+        moisture, temperature, inference_observer()
+    ),
+    max_batch_size=MICRO_BATCH_SIZE,
+    max_wait_ms=MICRO_BATCH_WAIT_MS,
+    max_queue_size=MICRO_BATCH_QUEUE_SIZE,
+    workers=INFERENCE_WORKERS
+)
+
+cache = PredictionCache(max_size=PREDICTION_CACHE_SIZE)
+
+audit = AuditLog(
+    AUDIT_DB_PATH,
+    max_queue_size=AUDIT_QUEUE_SIZE,
+    flush_interval=AUDIT_FLUSH_INTERVAL,
+    flush_batch_size=AUDIT_FLUSH_BATCH
+)
+
+pool = ModelPool(load_crop_model, max_bytes=MODEL_POOL_MAX_MB * 1024 * 1024, max_models=MODEL_POOL_MAX_MODELS)
+
+broadcaster = PredictionBroadcaster()
+
+# Older models were fitted on DataFrames; features are now plain arrays in the same column order
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now()}
+    return {"status": "healthy", "ready": ready, "timestamp": datetime.now()}
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness: the process is up and startup has not failed"""
+    if startup_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup_error})
+    return {"status": "alive", "timestamp": datetime.now()}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: the model is loaded, warmed up and accepting predictions"""
+    if not ready:
+        return JSONResponse(status_code=503, content={
+            "status": "failed" if startup_error else "starting",
+            "error": startup_error,
+            "startup_timings_ms": startup_timings
+        })
+    return {"status": "ready", "startup_timings_ms": startup_timings, "timestamp": datetime.now()}
 
 @app.get("/model-info")
 async def model_info():
     """Get model information"""
+    check_ready()
     return {
         "model_type": "Random Forest Classifier",
         "features_required": ["moisture", "temperature"],
-        "version": "1.0"
+        "version": model.version,
+        "fingerprint": model.fingerprint,
+        "source": model.source,
+        "loaded_at": model.loaded_at,
+        "compact_model": model.is_compact,
+        "table_mode": model.decision_table is not None,
+        "registry_versions": registry.versions(),
+        "reload": reload_status,
+        "default_crop": DEFAULT_CROP,
+        "loaded_crops": pool.keys(),
+        "zones": ZONE_CROPS
     }
 
+@app.post("/admin/reload", status_code=202)
+async def admin_reload(version: Optional[str] = None):
+    """Load a registry version (the latest by default) in the background and swap it in"""
+    check_ready()
+    if version is not None and version not in registry.versions():
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    if version is None and registry.latest() is None:
+        raise HTTPException(status_code=404, detail="The model registry is empty")
+    if reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+
+    spawn(reload_model(version))
+    return {"status": "reloading", "version": version or registry.latest()}
+
+@app.get("/batching-stats")
+async def batching_stats():
+    """Micro-batching queue depth, batch sizes and wait times"""
+    return batcher.stats()
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Prediction cache size, hits, misses and evictions"""
+    return cache.stats()
+
+@app.get("/model-pool-stats")
+async def model_pool_stats():
+    """Per-crop models in memory, their footprint, loads and evictions"""
+    return pool.stats()
+
+@app.get("/audit-stats")
+async def audit_stats():
+    """Audit log buffer depth, records written and records dropped"""
+    return audit.stats()
+
+@app.get("/api/decisions")
+async def recent_decisions(
+    limit: int = Query(100, ge=1, le=10000),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    crop: Optional[str] = None,
+    model_version: Optional[str] = None
+):
+    """
+    Recent decisions from the audit log, newest first. Decisions appear
+    once flushed, up to AUDIT_FLUSH_INTERVAL seconds after they were made.
+    """
+    if not AUDIT_LOG:
+        raise HTTPException(status_code=404, detail="The audit log is disabled")
+    decisions = await run_in_threadpool(
+        audit.query, limit=limit, since=since, until=until, crop=crop, model_version=model_version
+    )
+    return {"decisions": decisions, "count": len(decisions)}
+
+@app.get("/stream-stats")
+async def stream_stats():
+    """Connected stream clients, frames published and stale frames dropped"""
+    return broadcaster.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request, stage and inference metrics in the Prometheus text format"""
+    batch_queue_depth.set(batcher.stats()["queue_depth"])
+    audit_queue_depth.set(audit.stats()["queue_depth"])
+    model_ready.set(1 if ready else 0)
+    pooled_models.set(len(pool.keys()))
+    pooled_model_bytes.set(pool.resident_bytes)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/predict", response_model=PredictionResponse)
-async def predict_irrigation(data: SensorData):
-    """Predict irrigation needs for wheat based on sensor data"""
+async def predict_irrigation(data: SensorData, request: Request):
+    """Predict irrigation needs based on sensor data, with the model of the reading's crop or zone"""
+    mark_handler_start(request.scope)
+    check_ready()
+    current = await model_for(data.crop, data.zone)
     try:
-        features = prepare_features(data)
-        probability = model.predict_proba(features)[0][1]
-        need_irrigation = probability >= 0.6
-        
-        # Calculate confidence as decimal (0-1)
-        confidence = probability if need_irrigation else (1 - probability)
-
-        return PredictionResponse(
+        probability = await score_reading(data.moisture, data.temperature, current)
+        need_irrigation, confidence = decide(probability)
+        timestamp = datetime.now()
+        if audit.running:
+            audit.record(
+                timestamp, "predict", crop_for(data.crop, data.zone), data.zone, data.moisture,
+                data.temperature, probability, IRRIGATION_THRESHOLD, need_irrigation, current.version
+            )
+
+        response = PredictionResponse(
             need_irrigation=need_irrigation,
             confidence=confidence,  # Raw confidence value without formatting
-            timestamp=datetime.now()
+            timestamp=timestamp
         )
+        mark_handler_end(request.scope)
+        return response
+    except QueueFullError as e:
+        logging.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logging.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def prepare_features(data: SensorData):
-    """Prepare features for wheat crop predictions"""
+@app.post("/api/predict/batch", response_model=BatchPredictionResponse)
+async def predict_irrigation_batch(data: BatchSensorData, request: Request):
+    """Predict irrigation needs for many readings with a single model call"""
+    mark_handler_start(request.scope)
+    check_ready()
+    current = await model_for(data.crop, data.zone)
     try:
-        # Create single-row DataFrame
-        input_data = pd.DataFrame({
-            'moisture': [data.moisture],
-            'temp': [data.temperature]
-        })
-        
-        # Feature engineering
-        input_data['moisture_normalized'] = (input_data['moisture'] - 400) / (900 - 400) * 100
-        input_data['temp_normalized'] = (input_data['temp'] - input_data['temp'].min()) / \
-                                      (input_data['temp'].max() - input_data['temp'].min())
-        
-        # Manual binning for moisture
-        moisture_value = input_data['moisture'].iloc[0]
-        if moisture_value < 550:
-            moisture_bin = 'low'
-        elif moisture_value < 700:
-            moisture_bin = 'medium_low'
-        elif moisture_value < 850:
-            moisture_bin = 'medium_high'
-        else:
-            moisture_bin = 'high'
-        
-        input_data['moisture_bin'] = moisture_bin
-        
-        # Manual binning for temperature
-        temp_value = input_data['temp'].iloc[0]
-        if temp_value < 15:
-            temp_bin = 'cold'
-        elif temp_value < 25:
-            temp_bin = 'optimal'
-        else:
-            temp_bin = 'hot'
-            
-        input_data['temp_bin'] = temp_bin
-        
-        # Create interaction features
-        input_data['moisture_temp_interaction'] = input_data['moisture_normalized'] * \
-                                                input_data['temp_normalized']
-        
-        # Generate dummy variables
-        moisture_dummies = pd.get_dummies(input_data['moisture_bin'], prefix='moisture')
-        temp_dummies = pd.get_dummies(input_data['temp_bin'], prefix='temp')
-        
-        # Ensure all expected columns are present
-        expected_moisture_bins = ['moisture_low', 'moisture_medium_low', 
-                                'moisture_medium_high', 'moisture_high']
-        expected_temp_bins = ['temp_cold', 'temp_optimal', 'temp_hot']
-        
-        for col in expected_moisture_bins:
-            if col not in moisture_dummies.columns:
-                moisture_dummies[col] = 0
-                
-        for col in expected_temp_bins:
-            if col not in temp_dummies.columns:
-                temp_dummies[col] = 0
-        
-        # Select numerical features
-        numerical_features = [
-            'moisture_normalized', 'temp_normalized',
-            'moisture', 'temp', 'moisture_temp_interaction'
-        ]
-        
-        # Combine features
-        features = pd.concat([
-            input_data[numerical_features],
-            moisture_dummies[expected_moisture_bins],
-            temp_dummies[expected_temp_bins]
-        ], axis=1)
-        
-        return features
+        moisture = np.fromiter((r.moisture for r in data.readings), dtype=float, count=len(data.readings))
+        temperature = np.fromiter((r.temperature for r in data.readings), dtype=float, count=len(data.readings))
+
+        probabilities = await run_in_threadpool(score_batch, moisture, temperature, current)
+        need_irrigation, confidence = decide(probabilities)
+        need_irrigation = need_irrigation.tolist()
+        timestamp = datetime.now()
+        if audit.running:
+            audit.record_many(
+                timestamp, "batch", crop_for(data.crop, data.zone), data.zone, moisture.tolist(),
+                temperature.tolist(), probabilities.tolist(), IRRIGATION_THRESHOLD, need_irrigation,
+                current.version
+            )
 
+        response = BatchPredictionResponse(
+            predictions=[
+                BatchPredictionItem(need_irrigation=n, confidence=c)
+                for n, c in zip(need_irrigation, confidence.tolist())
+            ],
+            timestamp=timestamp
+        )
+        mark_handler_end(request.scope)
+        return response
     except Exception as e:
-        logging.error(f"Error preparing features: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Feature preparation failed: {str(e)}")
+        logging.error(f"Batch prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/predict/stream")
+async def prediction_stream():
+    """
+    Server-sent events carrying each new sensor reading with its prediction.
+    A client that falls behind skips to the newest frame.
+    """
+    check_ready()
+    if not SENSOR_STREAM:
+        raise HTTPException(status_code=404, detail="Sensor streaming is disabled")
+
+    async def events():
+        subscription = broadcaster.subscribe()
+        try:
+            while True:
+                frame = await subscription.next(timeout=STREAM_KEEPALIVE_INTERVAL)
+                yield SSE_KEEPALIVE if frame is None else sse_event(frame)
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def score_reading(moisture, temperature, current=None):
+    """
+    Probability for one reading: decision table, then cache, then the model.
+    The cache only holds the default crop's model, since it empties itself
+    whenever it sees another model.
+    """
+    current = current or model
+    probability = current.lookup(moisture, temperature)
+    if probability is not None:
+        return probability
+
+    cached = current is model
+    if cached:
+        probability = cache.get(current.fingerprint, moisture, temperature)
+        if probability is not None:
+            return probability
+
+    if batcher.running:
+        probability = await batcher.submit(current, moisture, temperature)
+    else:
+        probability = await run_in_threadpool(current.predict_one, moisture, temperature, inference_observer())
+    # Results from a model swapped out meanwhile would flush the new model's entries
+    if cached and current is model:
+        cache.put(current.fingerprint, moisture, temperature, probability)
+    return probability
+
+def fetch_sensor_reading():
+    with urlopen(SENSOR_API_URL, timeout=SENSOR_TIMEOUT) as response:
+        return json.load(response)
+
+def open_sensor_stream(sensor=None):
+    """The sensor API's event stream, of one sensor when given"""
+    url = SENSOR_STREAM_URL + (f"?{urlencode({'sensor': sensor})}" if sensor else "")
+    return urlopen(url, timeout=SENSOR_STREAM_TIMEOUT)
+
+async def sensor_events(response):
+    """(event, data) of each server-sent event on an open stream, until it closes"""
+    event, data = None, []
+    while True:
+        line = await run_in_threadpool(response.readline)
+        if not line:
+            raise ConnectionError("Sensor stream closed")
+        line = line.decode('utf-8').rstrip('\r\n')
+        if line.startswith('event:'):
+            event = line[len('event:'):].strip()
+        elif line.startswith('data:'):
+            data.append(line[len('data:'):].strip())
+        elif not line:
+            if event and data:
+                yield event, json.loads('\n'.join(data))
+            event, data = None, []
+
+async def prediction_frame(data):
+    """Score one sensor reading and build its stream frame"""
+    reading = SensorData(**data)
+    current = model
+    probability = await score_reading(reading.moisture, reading.temperature, current)
+    need_irrigation, confidence = decide(probability)
+    timestamp = datetime.now()
+    if audit.running:
+        audit.record(
+            timestamp, "stream", DEFAULT_CROP, None, reading.moisture, reading.temperature,
+            probability, IRRIGATION_THRESHOLD, need_irrigation, current.version
+        )
+    return {"event": "prediction", "data": {
+        "reading": reading.model_dump(),
+        "need_irrigation": need_irrigation,
+        "confidence": confidence,
+        "model_version": current.version,
+        "timestamp": timestamp.isoformat()
+    }}
+
+def sensor_error_frame(error):
+    return {"event": "sensor_error", "data": {"error": error, "timestamp": datetime.now().isoformat()}}
+
+async def follow_sensor_stream():
+    """
+    Score and publish every reading the sensor API pushes while anyone is
+    listening. The stream follows the sensor /api/getCurrentReading reports,
+    whose current reading is published first; a link going down is published
+    as a sensor_error. The stream is closed once the last client leaves.
+    """
+    sequence = 0
+    streaming = True
+
+    def publish(frame):
+        nonlocal sequence
+        sequence += 1
+        frame["sequence"] = sequence
+        broadcaster.publish(frame)
+
+    while True:
+        await broadcaster.wait_for_subscribers()
+        try:
+            current = await run_in_threadpool(fetch_sensor_reading)
+            publish(await prediction_frame(current))
+            if streaming:
+                response = await run_in_threadpool(open_sensor_stream, current.get("sensor"))
+                try:
+                    async for event, data in sensor_events(response):
+                        if event == "reading":
+                            try:
+                                publish(await prediction_frame(data))
+                            except ValueError as e:
+                                # A reading outside the model's range doesn't end the stream
+                                publish(sensor_error_frame(str(e)))
+                        elif event == "link" and data.get("state") != "connected":
+                            publish(sensor_error_frame(
+                                f"Sensor link is down, {data.get('state')} ({data.get('last_error') or 'not connected'})"
+                            ))
+                        if not broadcaster.subscriber_count:
+                            break
+                finally:
+                    response.close()
+                continue
+        except HTTPError as e:
+            if e.code == 404 and streaming and e.url.startswith(SENSOR_STREAM_URL):
+                streaming = False
+                logging.info(f"Sensor API has no {SENSOR_STREAM_URL}, polling it every {SENSOR_POLL_INTERVAL}s")
+            else:
+                logging.warning(f"Sensor stream update failed: {str(e)}")
+                publish(sensor_error_frame(str(e)))
+        except Exception as e:
+            logging.warning(f"Sensor stream update failed: {str(e)}")
+            publish(sensor_error_frame(str(e)))
+        await asyncio.sleep(SENSOR_POLL_INTERVAL)
+
+def score_batch(moisture, temperature, current=None):
+    """Probabilities for arrays of readings; small batches score only their cache misses"""
+    current = current or model
+    if (not cache.enabled or current.decision_table is not None or current is not model
+            or len(moisture) > BATCH_CACHE_MAX_READINGS):
+        return current.predict_positive(moisture, temperature, inference_observer())
+
+    cached = cache.get_many(current.fingerprint, moisture.tolist(), temperature.tolist())
+    missing = [i for i, probability in enumerate(cached) if probability is None]
+    if not missing:
+        return np.array(cached)
+    if len(missing) == len(cached):
+        return current.predict_positive(moisture, temperature, inference_observer())
+    probabilities = np.array([0.0 if probability is None else probability for probability in cached])
+    probabilities[missing] = current.predict_positive(
+        moisture[missing], temperature[missing], inference_observer()
+    )
+    return probabilities
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from launcher import serve
+    serve(app, preload=preload_models, host="0.0.0.0", port=8000, workers=API_WORKERS)
\ No newline at end of file
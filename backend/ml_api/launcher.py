@@ -0,0 +1,131 @@
+"""
+Multi-worker launcher for the irrigation API.
+
+uvicorn's own --workers mode spawns fresh interpreters, so every worker
+would load its own copy of the forest. This launcher loads the model once in
+the parent, binds the listening socket and then forks the workers:
+
+  - the compact model and decision table are memory-mapped, so every worker
+    reads the same page-cache pages;
+  - anything else loaded before the fork (e.g. a joblib pipeline) is shared
+    copy-on-write, and gc.freeze() keeps the garbage collector from
+    touching, and thereby copying, those objects.
+
+Usage:
+    python launcher.py --workers 4 --port 8000
+
+Each worker reloads models on its own, so with several workers use
+MODEL_WATCH_INTERVAL rather than /admin/reload (which reaches one worker).
+Platforms without os.fork (Windows) fall back to a single process.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, log_level):
+    """Serve app on an already bound socket; runs inside a forked child"""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def serve(app, preload=None, host="0.0.0.0", port=8000, workers=1, log_level="info"):
+    """
+    Run app with the given number of worker processes. preload is called
+    once in the parent before forking, typically to load the model.
+    """
+    if workers <= 1 or not hasattr(os, 'fork'):
+        if workers > 1:
+            logging.warning("os.fork is not available, running a single worker")
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    start = time.perf_counter()
+    if preload is not None:
+        preload()
+    logging.info(f"Model preloaded in the parent in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    sock = bind_socket(host, port)
+    # Move everything loaded so far out of the collector's reach before forking
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn_worker(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = index
+        logging.info(f"Started worker {index} (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    logging.info(f"Serving on {host}:{port} with {workers} workers")
+    for index in range(workers):
+        spawn_worker(index)
+
+    # Replace workers that die unexpectedly until asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            logging.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+            spawn_worker(index)
+
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the irrigation API with several workers")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--log-level', default="info")
+    args = parser.parse_args()
+
+    import irrigation_api
+    serve(
+        irrigation_api.app, preload=irrigation_api.preload_models,
+        host=args.host, port=args.port, workers=args.workers, log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import math
+import threading
+import time
+
+import numpy as np
+
+# Latency buckets in seconds, from tens of microseconds (table and cache
+# hits) up to the seconds a large batch can take
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """
+    A named metric with one value (or set of values) per label combination.
+    Each thread records into its own shard without taking a lock; the
+    shards are only merged when the metric is rendered, so recording costs
+    a dict lookup and an add rather than a lock round trip.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # Values set directly rather than accumulated
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        """This thread's values, registered for merging on first use"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _merged(self):
+        with self._lock:
+            merged = dict(self._values)
+            shards = [shard.copy() for shard in self._shards]
+        for shard in shards:
+            for labels, value in shard.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples(sorted(self._merged().items())))
+        return lines
+
+    def _samples(self, items):
+        for labels, value in items:
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A gauge is either moved with inc and dec, which are sharded like
+    counters, or set outright, which replaces the value for every thread
+    """
+
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        values = self._shard()
+        values[labels] = values.get(labels, 0) - amount
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+            for shard in self._shards:
+                shard.pop(labels, None)
+
+
+class Histogram(Metric):
+    """
+    Cumulative-bucket histogram; each label set keeps per-bucket counts, a
+    sum and a count. observe() only appends the value to the calling
+    thread's pending list; pending values are bucketed together with NumPy
+    when the histogram is rendered, or once a thread has fold_every of them.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, fold_every=4096):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.fold_every = fold_every
+
+    def _thread_pending(self):
+        try:
+            return self._local.pending
+        except AttributeError:
+            pending = self._local.pending = []
+            with self._lock:
+                self._shards.append(pending)
+            return pending
+
+    def observe(self, value, *labels):
+        pending = self._thread_pending()
+        pending.append((labels, value))
+        if len(pending) >= self.fold_every:
+            with self._lock:
+                self._fold(pending)
+
+    def observe_many(self, values, *labels):
+        """observe() for each of an array of values, bucketed in one pass"""
+        with self._lock:
+            self._add(labels, np.asarray(values, dtype=float))
+
+    def _add(self, labels, values):
+        if not len(values):
+            return
+        counts = np.bincount(np.searchsorted(self.buckets, values, side='left'), minlength=len(self.buckets) + 1)
+        state = self._values.get(labels)
+        if state is None:
+            # One count per bucket plus the +Inf overflow, then sum and count
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        for i, count in enumerate(counts.tolist()):
+            state[i] += count
+        state[-2] += float(values.sum())
+        state[-1] += len(values)
+
+    def _fold(self, pending):
+        """Bucket a thread's pending values; called with the lock held"""
+        # Values its thread appends meanwhile stay behind for the next fold
+        count = len(pending)
+        records = pending[:count]
+        del pending[:count]
+        by_labels = {}
+        for labels, value in records:
+            by_labels.setdefault(labels, []).append(value)
+        for labels, values in by_labels.items():
+            self._add(labels, np.array(values))
+
+    def _merged(self):
+        with self._lock:
+            for pending in self._shards:
+                self._fold(pending)
+            return {labels: list(state) for labels, state in self._values.items()}
+
+    def _samples(self, items):
+        bucket_names = self.labelnames + ('le',)
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                yield (f"{self.name}_bucket{format_labels(bucket_names, labels + (format_value(bound),))}"
+                       f" {cumulative}")
+            suffix = format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{suffix} {format_value(state[-2])}"
+            yield f"{self.name}_count{suffix} {state[-1]}"
+
+
+class MetricsRegistry:
+    """
+    The metrics one process exposes on /metrics. With enabled False every
+    recording call is skipped, which is how the overhead benchmark measures
+    the uninstrumented baseline.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = []
+        self._collectors = []
+
+    def add_collector(self, collect):
+        """collect() is called before every render, to record what was buffered"""
+        self._collectors.append(collect)
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Scope keys the endpoint sets to split a request into body parsing and
+# validation, the handler, and response serialization. The scope is the
+# one per-request object the middleware and the endpoint share, so marking
+# a stage is a dict store rather than a timer object and a context variable
+HANDLER_STARTED = 'metrics.handler_started'
+HANDLER_FINISHED = 'metrics.handler_finished'
+
+
+def mark_handler_start(scope):
+    """Called by an endpoint, with request.scope, once its arguments are parsed and validated"""
+    scope[HANDLER_STARTED] = time.perf_counter()
+
+
+def mark_handler_end(scope):
+    """Called by an endpoint, with request.scope, just before returning its response"""
+    scope[HANDLER_FINISHED] = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task hop) counting requests,
+    errors and in-flight requests per path, and recording the request stages
+    for endpoints that mark their handler boundaries. Only paths in
+    instrumented_paths are tracked so probes and /metrics itself stay out of
+    the numbers.
+
+    A request only appends its timestamps to a list owned by this worker's
+    event loop; they are folded into the counters and histograms when the
+    registry is rendered, or every fold_every requests so the list stays
+    bounded between scrapes.
+    """
+
+    def __init__(self, app, registry, requests, errors, in_flight, stage_latency, request_latency,
+                 instrumented_paths, fold_every=4096):
+        self.app = app
+        self.registry = registry
+        self.requests = requests
+        self.errors = errors
+        self.in_flight = in_flight
+        self.stage_latency = stage_latency
+        self.request_latency = request_latency
+        self.instrumented_paths = frozenset(instrumented_paths)
+        self.fold_every = fold_every
+        # (path, status, started, handler started, handler finished, response started, finished)
+        self._pending = []
+        self._in_flight = dict.fromkeys(self.instrumented_paths, 0)
+        registry.add_collector(self.fold)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path')
+        if scope['type'] != 'http' or not self.registry.enabled or path not in self.instrumented_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        response_started = math.nan
+
+        # A plain function returning send's awaitable, not a coroutine of its
+        # own, so each message costs no extra coroutine frame
+        def send_wrapper(message):
+            nonlocal status, response_started
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_started = time.perf_counter()
+            return send(message)
+
+        self._in_flight[path] += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._in_flight[path] -= 1
+            self._pending.append((
+                path, status, started, scope.get(HANDLER_STARTED, math.nan),
+                scope.get(HANDLER_FINISHED, math.nan), response_started, time.perf_counter()
+            ))
+            if len(self._pending) >= self.fold_every:
+                self.fold()
+
+    def fold(self):
+        """Record the requests finished since the last fold, a path at a time"""
+        pending, self._pending = self._pending, []
+        by_path = {}
+        for record in pending:
+            by_path.setdefault(record[0], []).append(record)
+        for path, records in by_path.items():
+            statuses = {}
+            for record in records:
+                statuses[record[1]] = statuses.get(record[1], 0) + 1
+            for status, count in statuses.items():
+                self.requests.inc(path, str(status), amount=count)
+                if status >= 500:
+                    self.errors.inc(path, str(status), amount=count)
+
+            # Columns: started, handler started, handler finished, response started, finished;
+            # NaN where an endpoint didn't mark its handler or no response was sent
+            started, handler_started, handler_finished, response_started, finished = (
+                np.array([record[2:] for record in records]).T
+            )
+            self.request_latency.observe_many(finished - started, path)
+            marked = ~np.isnan(handler_started)
+            self.stage_latency.observe_many((handler_started - started)[marked], path, 'validation')
+            staged = marked & ~np.isnan(handler_finished) & ~np.isnan(response_started)
+            self.stage_latency.observe_many((handler_finished - handler_started)[staged], path, 'handler')
+            self.stage_latency.observe_many((response_started - handler_finished)[staged], path, 'serialization')
+        for path, count in self._in_flight.items():
+            self.in_flight.set(count, path)
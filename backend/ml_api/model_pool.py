@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class UnknownModelError(LookupError):
+    """Raised when no model is configured for a routing key"""
+
+
+class ModelPool:
+    """
+    Lazily loaded models, one per routing key, held in a memory-bounded LRU.
+
+    load(key) is called the first time a key is requested and must return a
+    ServingModel (or raise UnknownModelError). Each key has its own load
+    lock, so concurrent first requests for the same key load it once while
+    other keys keep being served. Once the resident models exceed max_bytes
+    or max_models the least recently used ones are evicted; requests still
+    holding an evicted model finish on it.
+    """
+
+    def __init__(self, load, max_bytes=256 * 1024 * 1024, max_models=8):
+        self.load = load
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> [load lock, threads using it]; dropped when the last one is
+        # done, so keys that fail to load (unknown crops) leave nothing behind
+        self._load_locks = {}
+
+        self.hits = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.evictions = 0
+        self.load_time_total = 0.0
+
+    def peek(self, key):
+        """The loaded model for key, or None without loading it"""
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+            return model
+
+    def get(self, key):
+        """The model for key, loading it on first use; blocks while it loads"""
+        model = self.peek(key)
+        if model is not None:
+            return model
+
+        with self._lock:
+            entry = self._load_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                return self._load(key)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._load_locks[key]
+
+    def _load(self, key):
+        """Load key while holding its load lock, unless another thread already has"""
+        # Another thread may have finished loading while we waited
+        model = self.peek(key)
+        if model is not None:
+            return model
+
+        start = time.perf_counter()
+        try:
+            model = self.load(key)
+        except UnknownModelError:
+            raise
+        except Exception:
+            self.load_failures += 1
+            raise
+        elapsed = time.perf_counter() - start
+        self.load_time_total += elapsed
+        self.loads += 1
+        logging.info(f"Model for '{key}' loaded in {elapsed * 1000:.1f}ms ({model.nbytes / 1024:.0f} KB)")
+
+        with self._lock:
+            self._models[key] = model
+            self._evict()
+        return model
+
+    def preload(self, keys):
+        """Load keys ahead of traffic; failures are logged, not raised"""
+        for key in keys:
+            if key in self._models:
+                continue
+            try:
+                self.get(key)
+            except Exception as e:
+                logging.error(f"Preloading the model for '{key}' failed: {str(e)}")
+
+    def evict(self, key):
+        with self._lock:
+            return self._models.pop(key, None) is not None
+
+    def _evict(self):
+        """Drop least recently used models until within budget, keeping the newest"""
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_models or self.resident_bytes > self.max_bytes
+        ):
+            key, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            logging.info(f"Model for '{key}' evicted from the model pool")
+
+    @property
+    def resident_bytes(self):
+        return sum(model.nbytes for model in self._models.values())
+
+    def keys(self):
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        with self._lock:
+            resident = {key: model.nbytes for key, model in self._models.items()}
+        return {
+            "models": list(resident),
+            "size": len(resident),
+            "max_models": self.max_models,
+            "resident_bytes": sum(resident.values()),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "evictions": self.evictions,
+            "mean_load_ms": 1000 * self.load_time_total / self.loads if self.loads else 0.0
+        }
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+class QueueFullError(Exception):
+    """Raised when the prediction queue is at capacity"""
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-reading predictions and scores them together.
+
+    Requests wait on a bounded queue; a collector task takes up to
+    max_batch_size of them, waiting at most max_wait_ms after the first one
+    arrives, and runs one predict_batch(model, moisture, temperature) call in
+    a worker thread. Each caller's future is then resolved with its own
+    probability, so the event loop never blocks on the model. Readings are
+    scored by the model they were submitted with, so a batch spanning a
+    model swap is split rather than scored by the newer model.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_wait_ms=2.0,
+                 max_queue_size=1000, workers=1):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.workers = workers
+
+        self._queue = None
+        self._executor = None
+        self._slots = None
+        self._collector = None
+        self._pending = set()
+
+        # Counters reported by stats()
+        self._requests = 0
+        self._rejected = 0
+        self._batches = 0
+        self._batched_items = 0
+        self._largest_batch = 0
+        self._last_batch_size = 0
+        self._wait_total = 0.0
+        self._inference_total = 0.0
+
+    @property
+    def running(self):
+        return self._collector is not None and not self._collector.done()
+
+    async def start(self):
+        """Start the collector task on the running event loop"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='predict')
+        self._slots = asyncio.Semaphore(self.workers)
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Finish queued work, then stop the collector and the worker threads"""
+        if not self.running:
+            return
+        await self._queue.join()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        self._collector = None
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, model, moisture, temperature):
+        """Queue one reading for model and wait for its class-1 probability"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((model, moisture, temperature, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise QueueFullError(f"Prediction queue is full ({self.max_queue_size} pending)")
+        self._requests += 1
+        return await future
+
+    async def _collect(self):
+        """Group queued readings into batches and dispatch them"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Bound the number of batches scored at once to the worker count
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _run(self, batch):
+        """Score one batch in a worker thread and resolve its futures"""
+        try:
+            dispatched = time.perf_counter()
+            try:
+                probabilities = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._score, batch
+                )
+            except Exception as e:
+                logging.error(f"Batched prediction error: {str(e)}")
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+            else:
+                for item, probability in zip(batch, probabilities.tolist()):
+                    if not item[3].done():
+                        item[3].set_result(probability)
+
+            self._batches += 1
+            self._batched_items += len(batch)
+            self._last_batch_size = len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            self._wait_total += sum(dispatched - item[4] for item in batch)
+            self._inference_total += time.perf_counter() - dispatched
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+            self._slots.release()
+
+    def _score(self, batch):
+        """Score a batch, one predict_batch call per model it contains"""
+        moisture = np.fromiter((item[1] for item in batch), dtype=float, count=len(batch))
+        temperature = np.fromiter((item[2] for item in batch), dtype=float, count=len(batch))
+
+        groups = {}
+        for i, item in enumerate(batch):
+            groups.setdefault(id(item[0]), (item[0], []))[1].append(i)
+
+        if len(groups) == 1:
+            return self.predict_batch(batch[0][0], moisture, temperature)
+
+        probabilities = np.empty(len(batch))
+        for model, indices in groups.values():
+            probabilities[indices] = self.predict_batch(model, moisture[indices], temperature[indices])
+        return probabilities
+
+    def stats(self):
+        """Queue depth, batch sizes and timings since startup"""
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "workers": self.workers,
+            "requests": self._requests,
+            "rejected": self._rejected,
+            "batches": self._batches,
+            "last_batch_size": self._last_batch_size,
+            "largest_batch_size": self._largest_batch,
+            "mean_batch_size": self._batched_items / self._batches if self._batches else 0.0,
+            "mean_queue_wait_ms": 1000 * self._wait_total / self._batched_items if self._batched_items else 0.0,
+            "mean_inference_ms": 1000 * self._inference_total / self._batches if self._batches else 0.0
+        }
@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of irrigation probabilities keyed on the reading.
+
+    Entries belong to one model version: the first lookup made with a
+    different version empties the cache, so a model change can never serve
+    stale probabilities.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    @staticmethod
+    def key(moisture, temperature):
+        """Normalize a reading so 600, 600.0 and -0.0/0.0 share an entry"""
+        return (float(moisture) + 0.0, float(temperature) + 0.0)
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, moisture, temperature):
+        """Cached probability for a reading, or None"""
+        if not self.enabled:
+            return None
+        key = self.key(moisture, temperature)
+        with self._lock:
+            self._check_version(version)
+            probability = self._entries.get(key)
+            if probability is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return probability
+
+    def get_many(self, version, moisture, temperature):
+        """
+        Cached probabilities for a list of readings under one lock, None
+        where a reading isn't cached. Misses are counted but nothing is
+        inserted, so a batch can't push single-reading entries out.
+        """
+        if not self.enabled:
+            return [None] * len(moisture)
+        keys = [(m + 0.0, t + 0.0) for m, t in zip(moisture, temperature)]
+        with self._lock:
+            self._check_version(version)
+            entries = self._entries
+            probabilities = [entries.get(key) for key in keys]
+            hits = 0
+            for key, probability in zip(keys, probabilities):
+                if probability is not None:
+                    entries.move_to_end(key)
+                    hits += 1
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return probabilities
+
+    def put(self, version, moisture, temperature, probability):
+        """Store a probability, evicting the least recently used entry when full"""
+        if not self.enabled:
+            return
+        key = self.key(moisture, temperature)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = probability
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "model_version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
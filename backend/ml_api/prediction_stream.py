@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+
+class Subscription:
+    """
+    One client's mailbox. It holds at most one frame: publishing while the
+    client still has an unread frame replaces it, so a slow client skips
+    stale frames instead of building up a backlog.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, frame):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._ready.set()
+
+    async def next(self, timeout=None):
+        """Newest unread frame, or None when nothing arrives within timeout"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class PredictionBroadcaster:
+    """
+    Fans scored sensor readings out to every connected stream client.
+
+    Readings are scored once by a single task, however many clients are
+    connected; publish() never waits on a client. New subscribers get the
+    latest frame straight away so they don't sit blank until the next reading.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._has_subscribers = asyncio.Event()
+        self.latest = None
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscription = Subscription()
+        if self.latest is not None:
+            subscription.offer(self.latest)
+        self._subscribers.add(subscription)
+        self._has_subscribers.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+        self.dropped += subscription.dropped
+        if not self._subscribers:
+            self._has_subscribers.clear()
+
+    async def wait_for_subscribers(self):
+        await self._has_subscribers.wait()
+
+    def publish(self, frame):
+        self.latest = frame
+        self.published += 1
+        for subscription in self._subscribers:
+            subscription.offer(frame)
+
+    def stats(self):
+        return {
+            "subscribers": self.subscriber_count,
+            "published": self.published,
+            "dropped": self.dropped + sum(s.dropped for s in self._subscribers)
+        }
+
+
+def sse_event(frame):
+    """Encode a frame as a server-sent event; the sequence number is the event id"""
+    return (
+        f"id: {frame['sequence']}\n"
+        f"event: {frame['event']}\n"
+        f"data: {json.dumps(frame['data'])}\n\n"
+    )
+
+
+# Comment line sent when idle so proxies don't close the connection
+SSE_KEEPALIVE = ": keep-alive\n\n"
@@ -12,7 +12,7 @@ def generate_test_data():
     }
 
 def test_service():
-    """Test the wheat irrigation prediction service"""
+    """Smoke test of the wheat irrigation prediction service; see ../load_test.py for capacity"""
     base_url = "http://localhost:8000"
     
     print("Testing Wheat Irrigation Prediction Service...")
@@ -48,12 +48,12 @@ def test_service():
         test_data = generate_test_data()
         print(f"Sending test data: {json.dumps(test_data, indent=2)}")
         
-        response = requests.post(f"{base_url}/predict", json=test_data)
+        response = requests.post(f"{base_url}/api/predict", json=test_data)
         if response.status_code == 200:
             result = response.json()
             print("✓ Prediction successful")
             print(f"Need irrigation: {result['need_irrigation']}")
-            print(f"Probability: {result['probability']:.2f}")
+            print(f"Confidence: {result['confidence']:.2f}")
             print(f"Timestamp: {result['timestamp']}")
         else:
             print("✗ Prediction failed")
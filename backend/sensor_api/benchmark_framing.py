@@ -0,0 +1,81 @@
+"""
+Compares host-side decode throughput of the ASCII line format and binary
+frames, offline.
+
+The same random readings are encoded both ways. ASCII lines go through
+parse_line one at a time, as SerialReader does in ascii mode; frames go
+through FrameDecoder in bursts of different sizes, as they would arrive
+from read(in_waiting), plus one run on a stream with corrupt frames and
+stray bytes to show the cost of resynchronising. The fastest of several
+rounds is reported. Readings per second the link itself can carry at
+9600 baud (10 bits per byte on the wire) are printed for scale.
+
+Usage:
+    python benchmark_framing.py [readings] [rounds]
+"""
+import sys
+import time
+
+import numpy as np
+
+from serial_framing import FRAME_DTYPE, FRAME_SIZE, FrameDecoder, frame_readings, generate_frames
+from serial_reader import parse_line
+
+BAUD_RATE = 9600
+BURST_SIZES = (64, 1024, 16384)
+
+
+def best_of(rounds, run):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def decode_ascii(lines):
+    for line in lines:
+        parse_line(line.decode('utf-8', errors='replace').strip())
+
+
+def decode_binary(data, burst_size):
+    decoder = FrameDecoder()
+    for i in range(0, len(data), burst_size):
+        frames = decoder.feed(data[i:i + burst_size])
+        if len(frames):
+            frame_readings(frames)
+    return decoder
+
+
+def report(name, readings, seconds):
+    print(f"{name:<34} {readings / seconds:>12,.0f} readings/s {seconds / readings * 1e9:>8.0f} ns/reading")
+
+
+def main(readings, rounds):
+    data = generate_frames(readings, seed=0)
+    frames = np.frombuffer(data, dtype=FRAME_DTYPE)
+    lines = [
+        f"0,{temperature / 10:.1f},0,0,0,{raw}\r\n".encode()
+        for temperature, raw in zip(frames['temperature'].tolist(), frames['raw_moisture'].tolist())
+    ]
+
+    line_bytes = sum(len(line) for line in lines) / len(lines)
+    print(f"Link capacity at {BAUD_RATE} baud: ASCII {BAUD_RATE / 10 / line_bytes:.0f} readings/s "
+          f"({line_bytes:.1f} bytes), binary {BAUD_RATE / 10 / FRAME_SIZE:.0f} readings/s ({FRAME_SIZE} bytes)\n")
+
+    report("ASCII parse_line", readings, best_of(rounds, lambda: decode_ascii(lines)))
+    for burst_size in BURST_SIZES:
+        seconds = best_of(rounds, lambda: decode_binary(data, burst_size))
+        report(f"Binary, {burst_size}-byte bursts", readings, seconds)
+
+    noisy = generate_frames(readings, seed=0, corrupt_rate=0.01, noise_rate=0.01)
+    seconds = best_of(rounds, lambda: decode_binary(noisy, 1024))
+    report("Binary, 1% corrupt + 1% noise", readings, seconds)
+    print(f"\nNoisy stream decoder stats: {decode_binary(noisy, 1024).stats()}")
+
+
+if __name__ == "__main__":
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    main(readings, rounds)
@@ -0,0 +1,147 @@
+"""
+Irrigation decisions for the sensor API's current readings.
+
+The model is picked the way irrigation_api picks it at startup: the newest
+registry version that passes its canary checks, else the default model
+file, with the flattened forest exported next to it memory-mapped when
+there is one. A newer version only replaces the current model once it
+passes the same canaries, so both services skip the versions the other
+rejects. Decisions use the shared IRRIGATION_THRESHOLD from ml.inference.
+
+The model is loaded on first use and scored in this process, so a decision
+costs no HTTP round trip. When no model can be loaded (the ML code or its
+dependencies aren't installed, or no model has been trained), readings are
+forwarded to the ML API's /api/predict instead, and loading is retried
+every refresh_interval seconds. The same interval picks up newly published
+registry versions.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.request import Request, urlopen
+
+# Project root, where the shared ml package lives
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODELS_DIR = os.path.join(BASE_DIR, 'ml', 'models')
+
+
+class DecisionScorer:
+    """
+    Scores readings with the local model, or through the ML API at ml_api_url
+    while the model is unavailable
+    """
+
+    def __init__(self, ml_api_url, timeout=5, local=True, refresh_interval=60.0, models_dir=MODELS_DIR):
+        self.ml_api_url = ml_api_url
+        self.timeout = timeout
+        self.local = local
+        self.refresh_interval = refresh_interval
+        self.model_path = os.path.join(models_dir, 'irrigation_model.joblib')
+        self.registry_dir = os.path.join(models_dir, 'registry')
+        self.model = None
+        self.load_error = None if local else "Local scoring is disabled"
+        self.rejected = set()  # Versions that failed to load or failed their canaries
+        self._inference = None
+        self._registry = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self.scored = {"local": 0, "ml_api": 0, "failed": 0}
+
+    def _refresh(self):
+        """Load the model on first use, then reload once per interval if a newer version was published"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = now
+            version = None
+            try:
+                if self._inference is None:
+                    if BASE_DIR not in sys.path:
+                        sys.path.insert(0, BASE_DIR)
+                    import ml.inference
+                    self._inference = ml.inference
+                    self._registry = ml.inference.ModelRegistry(self.registry_dir)
+                if self.model is None:
+                    # Nothing to serve yet: fall back past rejected versions to an
+                    # earlier good one, or the default model file
+                    candidate, rejected = self._inference.load_newest_valid(
+                        self._registry, self._load, self.model_path, skip=self.rejected
+                    )
+                    self._reject(rejected)
+                else:
+                    version = self._registry.latest()
+                    if version is None or version in self.rejected or self.model.version == version:
+                        return
+                    candidate = self._load(self._registry.model_path(version), version)
+                    self._inference.check_canaries(candidate, self._registry)
+                self.model = candidate
+                self.load_error = None
+                logging.info(f"Decision model {candidate.version} loaded from {candidate.source}")
+            except Exception as e:
+                # Keep serving the previous model, or forward without one, and
+                # don't retry this version until a newer one is published
+                if version is not None:
+                    self._reject({version: f"{type(e).__name__}: {e}"})
+                self.load_error = f"{type(e).__name__}: {e}"
+                logging.warning(f"Decision model {version or ''} not loaded: {self.load_error}")
+
+    def _load(self, path, version):
+        return self._inference.load_serving_model(path, mmap=True, version=version)
+
+    def _reject(self, rejected):
+        for version, error in rejected.items():
+            self.rejected.add(version)
+            logging.warning(f"Decision model {version} rejected: {error}")
+
+    def decide(self, moisture, temperature):
+        """
+        The decision for one reading: need_irrigation, confidence, and where
+        it was made ('local' with the model version, or 'ml_api'). Raises
+        when the model is unavailable and the ML API can't be reached.
+        """
+        if self.local:
+            self._refresh()
+        model = self.model
+        if model is not None:
+            need_irrigation, confidence = self._inference.decide(model.predict_one(moisture, temperature))
+            self.scored["local"] += 1
+            return {
+                "need_irrigation": need_irrigation,
+                "confidence": confidence,
+                "source": "local",
+                "model_version": model.version
+            }
+
+        body = json.dumps({"moisture": moisture, "temperature": temperature}).encode()
+        request = Request(f"{self.ml_api_url}/api/predict", data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                prediction = json.load(response)
+        except Exception:
+            self.scored["failed"] += 1
+            raise
+        self.scored["ml_api"] += 1
+        return {
+            "need_irrigation": prediction["need_irrigation"],
+            "confidence": prediction["confidence"],
+            "source": "ml_api",
+            "model_version": None
+        }
+
+    def stats(self):
+        model = self.model
+        return {
+            "mode": "local" if model is not None else "ml_api",
+            "model_version": model.version if model is not None else None,
+            "model_source": model.source if model is not None else None,
+            "load_error": self.load_error,
+            "rejected_versions": sorted(self.rejected),
+            "ml_api": self.ml_api_url,
+            "scored": dict(self.scored)
+        }
@@ -0,0 +1,219 @@
+"""
+Fake Arduinos on pseudo-terminals, for running the sensor API without
+hardware (Linux and macOS only).
+
+Each fake device opens a pty pair and writes lines in the Arduino's format
+to it; the sensor API opens the printed device path like a real port. Only
+field 1 (temperature in C) and field 5 (raw moisture, 1023 dry to 0 wet)
+are read by the API, the other fields are sent as 0. Devices can be made
+slow (a long interval) or dead (never sending) to check that they don't
+hold up the others. With --binary the devices send serial_framing frames
+instead of lines.
+
+FakeSerialDevice is an in-process stand-in that needs no pty and works on
+any platform, Windows included: pass its open method to SerialReader as
+open_port, and unplug() and plug() it to exercise reconnects and backoff.
+
+Usage:
+    python fake_arduino.py [--count 3] [--interval 1.0] [--slow 1] [--dead 1] [--binary]
+Then set SENSORS in sensor_api.py to the printed paths (and SENSOR_FRAMING
+for binary devices).
+"""
+import argparse
+import math
+import os
+import random
+import threading
+import time
+
+import serial
+
+from serial_framing import encode_frame
+
+
+class FakeArduino:
+    """One pty-backed device sending a reading every interval seconds"""
+
+    def __init__(self, interval=1.0, seed=0, silent=False, binary=False):
+        self.interval = interval
+        self.silent = silent
+        self.binary = binary
+        self.rng = random.Random(seed)
+        # Only here, so FakeSerialDevice still imports where tty doesn't exist
+        import tty
+        self._master, self._slave = os.openpty()
+        # Raw mode: no echo back into the master, no newline translation
+        tty.setraw(self._slave)
+        # Never block when nothing is reading the port and its buffer fills
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._stopping = threading.Event()
+        self._thread = None
+        self.sent = 0
+
+    def sample(self, now=None):
+        """A plausible reading: moisture and temperature drifting slowly"""
+        now = time.time() if now is None else now
+        temperature = 25 + 8 * math.sin(now / 600) + self.rng.uniform(-0.5, 0.5)
+        raw_moisture = 500 + 150 * math.sin(now / 900) + self.rng.uniform(-10, 10)
+        return temperature, raw_moisture
+
+    def line(self, now=None):
+        temperature, raw_moisture = self.sample(now)
+        return f"0,{temperature:.1f},0,0,0,{raw_moisture:.0f}\r\n".encode()
+
+    def frame(self, now=None):
+        temperature, raw_moisture = self.sample(now)
+        return encode_frame(self.sent, round(raw_moisture), temperature)
+
+    def write(self, data):
+        try:
+            os.write(self._master, data)
+            return True
+        except BlockingIOError:
+            return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"fake-{self.port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            message = self.frame() if self.binary else self.line()
+            if not self.silent and self.write(message):
+                self.sent += 1
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class FakeSerialDevice:
+    """
+    A device SerialReader can open in-process. Bytes given to send() are
+    read back through the connection; while unplugged, opening fails and
+    open connections raise on read, as when a USB cable is pulled. The time
+    of every open attempt is kept in open_attempts.
+    """
+
+    def __init__(self, plugged=True):
+        self.plugged = plugged
+        self.open_attempts = []
+        self._data = bytearray()
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def open(self, port, baudrate=9600, timeout=None):
+        with self._condition:
+            self.open_attempts.append(time.monotonic())
+            if not self.plugged:
+                raise serial.SerialException(f"could not open port {port}: device not connected")
+            self._data.clear()
+            return FakeSerialConnection(self, timeout, self._generation)
+
+    def send(self, data):
+        with self._condition:
+            if self.plugged:
+                self._data.extend(data)
+                self._condition.notify_all()
+
+    def unplug(self):
+        with self._condition:
+            self.plugged = False
+            self._generation += 1
+            self._data.clear()
+            self._condition.notify_all()
+
+    def plug(self):
+        with self._condition:
+            self.plugged = True
+
+
+class FakeSerialConnection:
+    """The pyserial calls SerialReader makes, served from a FakeSerialDevice"""
+
+    def __init__(self, device, timeout, generation):
+        self._device = device
+        self._timeout = timeout
+        self._generation = generation
+        self.is_open = True
+
+    def _wait(self, ready):
+        """Wait until ready() or the read timeout; raise if the device went away"""
+        device = self._device
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while True:
+            if device._generation != self._generation or not self.is_open:
+                raise serial.SerialException("device reports readiness to read but returned no data "
+                                             "(device disconnected?)")
+            if ready():
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            device._condition.wait(remaining)
+
+    @property
+    def in_waiting(self):
+        return len(self._device._data)
+
+    def read(self, size=1):
+        with self._device._condition:
+            self._wait(lambda: len(self._device._data) >= size)
+            data = bytes(self._device._data[:size])
+            del self._device._data[:size]
+            return data
+
+    def readline(self):
+        data = self._device._data
+        with self._device._condition:
+            if self._wait(lambda: b'\n' in data):
+                size = data.index(b'\n') + 1
+            else:
+                size = len(data)
+            line = bytes(data[:size])
+            del data[:size]
+            return line
+
+    def close(self):
+        self.is_open = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Arduinos on pseudo-terminals")
+    parser.add_argument('--count', type=int, default=3, help="Number of devices")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between readings")
+    parser.add_argument('--slow', type=int, default=0, help="Devices sending 10x less often")
+    parser.add_argument('--dead', type=int, default=0, help="Devices that never send")
+    parser.add_argument('--binary', action='store_true', help="Send binary frames instead of CSV lines")
+    args = parser.parse_args()
+
+    devices = []
+    for i in range(args.count):
+        dead = i >= args.count - args.dead
+        slow = not dead and i >= args.count - args.dead - args.slow
+        device = FakeArduino(args.interval * (10 if slow else 1), seed=i, silent=dead, binary=args.binary).start()
+        devices.append(device)
+        print(f"sensor-{i + 1}: {device.port}" + (" (dead)" if dead else " (slow)" if slow else ""))
+
+    print("\nSENSORS = {" + ", ".join(f"'sensor-{i + 1}': '{d.port}'" for i, d in enumerate(devices)) + "}")
+    if args.binary:
+        print("SENSOR_FRAMING = {" + ", ".join(f"'sensor-{i + 1}': 'binary'" for i in range(args.count)) + "}")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for device in devices:
+            device.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+RAW_DTYPE = np.dtype([('t', '<f8'), ('moisture', '<f4'), ('temperature', '<f4')])
+ROLLUP_DTYPE = np.dtype([
+    ('t', '<f8'), ('count', '<u4'),
+    ('moisture_min', '<f4'), ('moisture_max', '<f4'), ('moisture_mean', '<f4'),
+    ('temperature_min', '<f4'), ('temperature_max', '<f4'), ('temperature_mean', '<f4')
+])
+
+# Resolution -> (bucket seconds, chunk file naming); raw readings go to one
+# file per day, minute rollups to one per month and hour rollups to one per year
+RESOLUTIONS = {
+    'raw': (None, '%Y-%m-%d'),
+    '1m': (60, '%Y-%m'),
+    '1h': (3600, '%Y'),
+}
+
+# How long each resolution is kept, in days
+DEFAULT_RETENTION = {'raw': 7, '1m': 90, '1h': 5 * 365}
+
+# Longest span 'auto' answers from each resolution, finest first
+AUTO_RESOLUTION_SPANS = (('raw', 3600), ('1m', 2 * 86400), ('1h', float('inf')))
+
+FIELDS = ('moisture', 'temperature')
+
+
+def utc(t):
+    return datetime.fromtimestamp(t, timezone.utc)
+
+
+def chunk_name(resolution, t):
+    return utc(t).strftime(RESOLUTIONS[resolution][1]) + '.bin'
+
+
+def chunk_range(resolution, name):
+    """Start and end epoch seconds of the period a chunk file covers"""
+    start = datetime.strptime(name[:-len('.bin')], RESOLUTIONS[resolution][1]).replace(tzinfo=timezone.utc)
+    if resolution == 'raw':
+        end = start + timedelta(days=1)
+    elif resolution == '1m':
+        end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    else:
+        end = start.replace(year=start.year + 1)
+    return start.timestamp(), end.timestamp()
+
+
+class Rollup:
+    """Running min/max/mean of one bucket, fed readings or finer rollups"""
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.low = [np.inf] * len(FIELDS)
+        self.high = [-np.inf] * len(FIELDS)
+        self.total = [0.0] * len(FIELDS)
+
+    def add(self, values, count=1, low=None, high=None):
+        self.count += count
+        for i, value in enumerate(values):
+            self.low[i] = min(self.low[i], value if low is None else low[i])
+            self.high[i] = max(self.high[i], value if high is None else high[i])
+            self.total[i] += value * count
+
+    def add_rollup(self, record):
+        self.add(
+            [record[f'{field}_mean'] for field in FIELDS], int(record['count']),
+            [record[f'{field}_min'] for field in FIELDS], [record[f'{field}_max'] for field in FIELDS]
+        )
+
+    def record(self):
+        values = [self.start, self.count]
+        for i in range(len(FIELDS)):
+            values += [self.low[i], self.high[i], self.total[i] / self.count]
+        return tuple(values)
+
+
+class SeriesWriter:
+    """Pending records and open rollup buckets of one sensor"""
+
+    def __init__(self):
+        self.pending = {resolution: [] for resolution in RESOLUTIONS}
+        self.open = {'1m': None, '1h': None}
+        self.last_t = -np.inf
+
+    def add(self, t, moisture, temperature):
+        # Chunks must stay sorted for range lookups, so a clock step back is clamped
+        t = self.last_t = max(t, self.last_t)
+        self.pending['raw'].append((t, moisture, temperature))
+        self._feed('1m', t, lambda bucket: bucket.add((moisture, temperature)))
+
+    def _feed(self, resolution, t, update):
+        size = RESOLUTIONS[resolution][0]
+        start = t - t % size
+        bucket = self.open[resolution]
+        # A reading from an earlier bucket (a clock step back) joins the open one
+        if bucket is not None and start > bucket.start:
+            self._close(resolution)
+            bucket = None
+        if bucket is None:
+            bucket = self.open[resolution] = Rollup(start)
+        update(bucket)
+
+    def _close(self, resolution):
+        record = self.open[resolution].record()
+        self.open[resolution] = None
+        self.pending[resolution].append(record)
+        if resolution == '1m':
+            minute = np.array([record], dtype=ROLLUP_DTYPE)[0]
+            self._feed('1h', record[0], lambda bucket: bucket.add_rollup(minute))
+
+    def open_records(self, resolution):
+        """Records of the open bucket; the open hour includes the open minute"""
+        if resolution == 'raw':
+            return []
+        minute = self.open['1m']
+        if resolution == '1m':
+            return [] if minute is None else [minute.record()]
+
+        hour = self.open['1h']
+        if minute is None:
+            return [] if hour is None else [hour.record()]
+        records = []
+        merged = Rollup(minute.start - minute.start % 3600)
+        if hour is not None:
+            if hour.start == merged.start:
+                merged.add_rollup(np.array([hour.record()], dtype=ROLLUP_DTYPE)[0])
+            else:
+                # The hour closes once the first minute of the next one does
+                records.append(hour.record())
+        merged.add_rollup(np.array([minute.record()], dtype=ROLLUP_DTYPE)[0])
+        return records + [merged.record()]
+
+
+class HistoryStore:
+    """
+    Append-only, chunked time-series store for sensor readings.
+
+    Every sensor has a directory with one sub-directory per resolution:
+    raw readings, and 1-minute and 1-hour rollups holding the count,
+    min, max and mean of moisture and temperature. Records are fixed-size
+    binary rows appended to chunk files covering a day (raw), a month (1m)
+    or a year (1h), so a range query only opens the chunks it overlaps
+    and retention deletes whole files.
+
+    Rollups are built incrementally as readings arrive; a bucket is written
+    when the first reading of the next bucket comes in, and open buckets
+    are included in queries. Appends are buffered in memory until flush(),
+    and queries see buffered records too. After a restart, readings written
+    after the last closed bucket are replayed to reopen it the first time a
+    sensor is appended to or queried.
+    """
+
+    def __init__(self, root, retention=None):
+        self.root = root
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self._series = {}
+        self._lock = threading.Lock()
+        self.appended = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+
+    def _dir(self, sensor_id, resolution):
+        return os.path.join(self.root, sensor_id, resolution)
+
+    def sensors(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.listdir(self.root))
+
+    def _writer(self, sensor_id):
+        writer = self._series.get(sensor_id)
+        if writer is None:
+            writer = self._series[sensor_id] = SeriesWriter()
+            self._recover(sensor_id, writer)
+        return writer
+
+    def _recover(self, sensor_id, writer):
+        """Reopen the buckets that were still open when the store was last closed"""
+        last_hour = self._last_record('1h', sensor_id)
+        hour_end = last_hour['t'] + 3600 if last_hour is not None else -np.inf
+        last_minute = self._last_record('1m', sensor_id)
+        minute_end = last_minute['t'] + 60 if last_minute is not None else -np.inf
+
+        for minute in self._read(sensor_id, '1m', hour_end, np.inf):
+            writer._feed('1h', float(minute['t']), lambda bucket: bucket.add_rollup(minute))
+        for reading in self._read(sensor_id, 'raw', minute_end, np.inf):
+            writer.last_t = float(reading['t'])
+            writer._feed('1m', writer.last_t,
+                         lambda bucket: bucket.add((float(reading['moisture']), float(reading['temperature']))))
+
+    def _last_record(self, resolution, sensor_id):
+        directory = self._dir(sensor_id, resolution)
+        if not os.path.isdir(directory):
+            return None
+        for name in sorted(os.listdir(directory), reverse=True):
+            records = np.fromfile(os.path.join(directory, name), dtype=ROLLUP_DTYPE)
+            if len(records):
+                return records[-1]
+        return None
+
+    def append(self, sensor_id, timestamp, moisture, temperature):
+        """Buffer one reading; timestamp is a datetime"""
+        with self._lock:
+            self._writer(sensor_id).add(timestamp.timestamp(), moisture, temperature)
+            self.appended += 1
+
+    def flush(self):
+        """Append buffered records to their chunk files"""
+        start = time.perf_counter()
+        with self._lock:
+            batches = []
+            for sensor_id, writer in self._series.items():
+                for resolution, records in writer.pending.items():
+                    if records:
+                        batches.append((sensor_id, resolution, records))
+                        writer.pending[resolution] = []
+            # Written under the lock so queries never miss records between buffer and file
+            for sensor_id, resolution, records in batches:
+                self._write(sensor_id, resolution, records)
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def _write(self, sensor_id, resolution, records):
+        dtype = RAW_DTYPE if resolution == 'raw' else ROLLUP_DTYPE
+        rows = np.array(records, dtype=dtype)
+        directory = self._dir(sensor_id, resolution)
+        os.makedirs(directory, exist_ok=True)
+        # Records in one batch can straddle a chunk boundary
+        names = np.array([chunk_name(resolution, t) for t in rows['t']])
+        for name in np.unique(names):
+            with open(os.path.join(directory, name), 'ab') as f:
+                rows[names == name].tofile(f)
+
+    def _read(self, sensor_id, resolution, start, end):
+        """Records with start <= t < end from the chunk files"""
+        dtype = RAW_DTYPE if resolution == 'raw' else ROLLUP_DTYPE
+        directory = self._dir(sensor_id, resolution)
+        if not os.path.isdir(directory):
+            return np.empty(0, dtype=dtype)
+        parts = []
+        for name in sorted(os.listdir(directory)):
+            chunk_start, chunk_end = chunk_range(resolution, name)
+            if chunk_end <= start or chunk_start >= end:
+                continue
+            records = np.fromfile(os.path.join(directory, name), dtype=dtype)
+            # Chunks are appended in time order, so the range is a contiguous slice
+            lo, hi = np.searchsorted(records['t'], [start, end])
+            parts.append(records[lo:hi])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    def query(self, sensor_id, start, end, resolution='auto'):
+        """
+        Records of one sensor between two datetimes at a resolution
+        ('raw', '1m', '1h' or 'auto'), oldest first, as (resolution, records).
+        'auto' picks the finest resolution suited to the span.
+        """
+        start, end = start.timestamp(), end.timestamp()
+        if resolution == 'auto':
+            resolution = next(name for name, span in AUTO_RESOLUTION_SPANS if end - start <= span)
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r}, expected auto or one of {list(RESOLUTIONS)}")
+
+        dtype = RAW_DTYPE if resolution == 'raw' else ROLLUP_DTYPE
+        size = RESOLUTIONS[resolution][0]
+        # Rollup buckets overlapping the start of the range count too
+        first = start - start % size if size else start
+        with self._lock:
+            stored = self._read(sensor_id, resolution, first, end)
+            writer = self._series.get(sensor_id)
+            # After a restart the open buckets are only on disk as raw readings
+            if writer is None and os.path.isdir(os.path.join(self.root, sensor_id)):
+                writer = self._writer(sensor_id)
+            buffered = [] if writer is None else writer.pending[resolution] + writer.open_records(resolution)
+        buffered = np.array(buffered, dtype=dtype)
+        if len(buffered):
+            buffered = buffered[(buffered['t'] >= first) & (buffered['t'] < end)]
+            stored = np.concatenate([stored, buffered])
+        return resolution, stored
+
+    def apply_retention(self, now=None):
+        """Delete chunk files that end before their resolution's retention window"""
+        now = time.time() if now is None else now
+        removed = 0
+        for sensor_id in self.sensors():
+            for resolution, days in self.retention.items():
+                directory = self._dir(sensor_id, resolution)
+                if not os.path.isdir(directory):
+                    continue
+                cutoff = now - days * 86400
+                for name in os.listdir(directory):
+                    if chunk_range(resolution, name)[1] <= cutoff:
+                        os.remove(os.path.join(directory, name))
+                        removed += 1
+        if removed:
+            logging.info(f"History retention removed {removed} chunk files")
+        return removed
+
+    def stats(self):
+        size = 0
+        files = 0
+        for directory, _, names in os.walk(self.root):
+            files += len(names)
+            size += sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+        return {
+            "path": self.root,
+            "sensors": self.sensors(),
+            "appended": self.appended,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "chunk_files": files,
+            "bytes": size,
+            "retention_days": self.retention
+        }
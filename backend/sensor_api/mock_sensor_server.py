@@ -1,72 +1,259 @@
-from flask import Flask, jsonify
-from flask_cors import CORS
-import math
-import time
+"""
+Mock sensor API: serves simulated readings on the sensor API's endpoints,
+for running the system without hardware and for load testing at fleet scale.
+
+By default it simulates one sensor. With --sensors N it simulates a fleet of
+N virtual sensors (see sensor_fleet.py) whose readings are reproducible from
+--seed, with daily curves in UTC shifted by --utc-offset hours, and --profile adds link latency and failures. Requests are handled
+on an asyncio event loop and simulated latency is awaited, so slow virtual
+links don't tie up workers. Responses are built as JSONResponse directly,
+skipping FastAPI's per-field encoding of large batches.
+
+Usage:
+    python mock_sensor_server.py [--sensors 5000] [--seed 0] [--profile cellular]
+
+Endpoints, besides those of sensor_api.py:
+    GET  /api/fleet/readings?offset=0&limit=1000   readings of a range of sensors
+    POST /api/fleet/readings {"sensors": [...]}     readings of the listed sensors
+Batch responses can be posted to the ML API's /api/predict/batch as they are.
+Every reading endpoint takes ?at=<ISO time> to sample a fixed moment.
+"""
+import argparse
+import asyncio
 from datetime import datetime
+from typing import List, Optional
 
-app = Flask(__name__)
-CORS(app)
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Query
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from sensor_fleet import PROFILES, SensorFleet, sensor_id, sensor_index
 
 # Configuration
 API_PORT = 8001
+FLEET_SIZE = 1
+FLEET_SEED = 0
+FLEET_PROFILE = 'none'
+# Hours from UTC of the fleet's solar time (the afternoon peak is at 14:00)
+FLEET_UTC_OFFSET = 0.0
+# Seconds between samples of a virtual sensor
+SAMPLE_INTERVAL = 1.0
+# Most sensors one batch request may ask for
+MAX_FLEET_BATCH = 10000
+# Most samples /readings returns in one call
+MAX_READINGS = 1024
+
+app = FastAPI(title="Mock Sensor API")
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+fleet = SensorFleet(FLEET_SIZE, FLEET_SEED, FLEET_PROFILE, SAMPLE_INTERVAL, FLEET_UTC_OFFSET)
+served = {"requests": 0, "readings": 0, "failed": 0, "offline": 0}
+
+
+class FleetRequest(BaseModel):
+    sensors: List[str] = Field(..., min_length=1, max_length=MAX_FLEET_BATCH)
+
+
+def error_response(status, message, **fields):
+    return JSONResponse(
+        {**fields, "error": message, "timestamp": datetime.now().isoformat()}, status_code=status
+    )
+
+
+def sample_time(at):
+    """Epoch seconds of the ?at= time, or now"""
+    return (at or datetime.now()).timestamp()
+
+
+async def simulate_link():
+    """Wait the profile's latency; an error response when the request is to fail"""
+    served["requests"] += 1
+    delay = fleet.request_latency()
+    if delay:
+        await asyncio.sleep(delay)
+    if fleet.request_fails():
+        served["failed"] += 1
+        return error_response(500, "Simulated sensor read failure")
+    return None
+
+
+def reading_entries(indices, t):
+    # A page past the end of the fleet, or of offline sensors only
+    if not len(indices):
+        return []
+    moisture, temperature, sample_t = fleet.readings(indices, t)
+    timestamp = datetime.fromtimestamp(float(sample_t.flat[0])).isoformat()
+    served["readings"] += len(indices)
+    return [
+        {"sensor": sensor_id(i), "moisture": m, "temperature": temp, "timestamp": timestamp}
+        for i, m, temp in zip(indices.tolist(), moisture.astype(int).tolist(), temperature.tolist())
+    ]
+
+
+def offline_response(sensor):
+    served["offline"] += 1
+    return error_response(503, "Sensor link is down (simulated)", sensor=sensor, last_reading=None)
+
+
+async def current_reading(sensor, at, include_sensor=True):
+    index = sensor_index(sensor, fleet.count)
+    if index is None:
+        return error_response(404, f"Unknown sensor '{sensor}'", fleet_size=fleet.count)
+    failure = await simulate_link()
+    if failure is not None:
+        return failure
+    if fleet.offline[index]:
+        return offline_response(sensor)
+    entry = reading_entries(np.array([index]), sample_time(at))[0]
+    if not include_sensor:
+        del entry["sensor"]
+    return JSONResponse(entry)
+
+
+async def recent_readings(sensor, n, at):
+    index = sensor_index(sensor, fleet.count)
+    if index is None:
+        return error_response(404, f"Unknown sensor '{sensor}'", fleet_size=fleet.count)
+    failure = await simulate_link()
+    if failure is not None:
+        return failure
+    if fleet.offline[index]:
+        return offline_response(sensor)
+    moisture, temperature, times = fleet.history(index, sample_time(at), n)
+    served["readings"] += n
+    readings = [
+        {"moisture": m, "temperature": temp, "timestamp": datetime.fromtimestamp(t).isoformat()}
+        for m, temp, t in zip(moisture.astype(int).tolist(), temperature.tolist(), times.tolist())
+    ]
+    return JSONResponse({"sensor": sensor, "readings": readings, "count": len(readings)})
 
-def generate_mock_sensor_data():
-    """
-    Generates realistic mock sensor data following the same pattern as mockSensor.ts
-    """
-    current_time = time.time()
-    hour_of_day = datetime.now().hour
-    
-    # Moisture calculation (similar to mockSensor.ts)
-    base_moisture = 650
-    moisture_variation = math.sin(current_time / 3600) * 50  # Hourly sine wave
-    random_moisture = (hash(str(current_time)) % 100) - 50  # Random variation
-    moisture = max(400, min(900, base_moisture + moisture_variation + random_moisture))
-    
-    # Temperature calculation (similar to mockSensor.ts)
-    base_temp = 25
-    temp_cycle = math.sin((hour_of_day - 6) * math.pi / 12) * 8  # Peak at 12:00, low at 00:00
-    random_temp = (hash(str(current_time + 1)) % 40) / 20 - 1  # Random variation
-    temperature = max(0, min(40, base_temp + temp_cycle + random_temp))
-    
-    return {
-        "moisture": round(moisture),
-        "temperature": round(temperature * 10) / 10
-    }
 
-@app.route('/api/getCurrentReading', methods=['GET'])
-def get_current_reading():
-    """
-    Mock endpoint that returns simulated sensor data
-    """
-    try:
-        # Add a small random delay to simulate real sensor reading
-        time.sleep(0.1)
-        
-        data = generate_mock_sensor_data()
-        return jsonify(data), 200
-        
-    except Exception as e:
-        return jsonify({
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }), 500
-
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """
-    Health check endpoint
-    """
-    return jsonify({
+async def fleet_readings(indices, at):
+    failure = await simulate_link()
+    if failure is not None:
+        return failure
+    offline = fleet.offline[indices]
+    served["offline"] += int(offline.sum())
+    return JSONResponse({
+        "readings": reading_entries(indices[~offline], sample_time(at)),
+        "offline": [sensor_id(i) for i in indices[offline].tolist()],
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.get("/api/getCurrentReading")
+async def get_current_reading(at: Optional[datetime] = None):
+    """Current reading of the first sensor, as the frontend expects it"""
+    return await current_reading(sensor_id(0), at, include_sensor=False)
+
+
+@app.get("/api/readings")
+async def get_recent_readings(n: int = Query(60, ge=1, le=MAX_READINGS), at: Optional[datetime] = None):
+    """The last n samples of the first sensor, oldest first"""
+    return await recent_readings(sensor_id(0), n, at)
+
+
+@app.get("/api/sensors")
+async def list_sensors(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_FLEET_BATCH),
+                       at: Optional[datetime] = None):
+    """A page of sensors with their current readings, and a summary of the whole fleet"""
+    indices = np.arange(offset, min(offset + limit, fleet.count))
+    t = sample_time(at)
+    online = indices[~fleet.offline[indices]]
+    entries = {entry["sensor"]: entry for entry in reading_entries(online, t)}
+    page = [
+        {"id": sensor_id(i), "connected": not fleet.offline[i], "current": entries.get(sensor_id(i))}
+        for i in indices.tolist()
+    ]
+
+    reporting = np.flatnonzero(~fleet.offline)
+    summary = {"sensors": fleet.count, "reporting": len(reporting)}
+    if len(reporting):
+        moisture, temperature, _ = fleet.readings(reporting, t)
+        summary["moisture"] = float(moisture.mean())
+        summary["temperature"] = float(temperature.mean())
+    return JSONResponse({
+        "sensors": page, "offset": offset, "summary": summary, "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.get("/api/sensors/{sensor}/current")
+async def get_sensor_reading(sensor: str, at: Optional[datetime] = None):
+    """Current reading of one sensor"""
+    return await current_reading(sensor, at)
+
+
+@app.get("/api/sensors/{sensor}/readings")
+async def get_sensor_readings(sensor: str, n: int = Query(60, ge=1, le=MAX_READINGS), at: Optional[datetime] = None):
+    """The last n samples of one sensor, oldest first"""
+    return await recent_readings(sensor, n, at)
+
+
+@app.get("/api/fleet/readings")
+async def get_fleet_readings(offset: int = Query(0, ge=0), limit: int = Query(1000, ge=1, le=MAX_FLEET_BATCH),
+                             at: Optional[datetime] = None):
+    """Current readings of sensors offset to offset + limit; offline sensors are listed apart"""
+    return await fleet_readings(np.arange(offset, min(offset + limit, fleet.count)), at)
+
+
+@app.post("/api/fleet/readings")
+async def post_fleet_readings(request: FleetRequest, at: Optional[datetime] = None):
+    """Current readings of the listed sensors"""
+    indices = [sensor_index(sensor, fleet.count) for sensor in request.sensors]
+    unknown = [sensor for sensor, index in zip(request.sensors, indices) if index is None]
+    if unknown:
+        return error_response(404, f"Unknown sensors: {', '.join(unknown[:10])}", fleet_size=fleet.count)
+    return await fleet_readings(np.array(indices, dtype=np.int64), at)
+
+
+@app.get("/api/health")
+async def health_check():
+    """Health check with the fleet's configuration and what has been served"""
+    return {
         "status": "healthy",
         "mode": "mock",
+        "fleet": {
+            "sensors": fleet.count,
+            "seed": fleet.seed,
+            "profile": fleet.profile,
+            "offline": int(fleet.offline.sum()),
+            "sample_interval": fleet.sample_interval,
+            "utc_offset": fleet.utc_offset
+        },
+        "served": served,
         "timestamp": datetime.now().isoformat()
-    }), 200
+    }
+
+
+def main():
+    global fleet
+    parser = argparse.ArgumentParser(description="Serve simulated sensor readings")
+    parser.add_argument('--sensors', type=int, default=FLEET_SIZE, help="Number of virtual sensors")
+    parser.add_argument('--seed', type=int, default=FLEET_SEED, help="Seed for sensor curves and noise")
+    parser.add_argument('--profile', choices=list(PROFILES), default=FLEET_PROFILE,
+                        help="Simulated link latency and failures")
+    parser.add_argument('--sample-interval', type=float, default=SAMPLE_INTERVAL,
+                        help="Seconds between samples of a sensor")
+    parser.add_argument('--utc-offset', type=float, default=FLEET_UTC_OFFSET,
+                        help="Hours from UTC of the sensors' solar time, e.g. 5.5")
+    parser.add_argument('--port', type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    fleet = SensorFleet(args.sensors, args.seed, args.profile, args.sample_interval, args.utc_offset)
+    print(f"Starting mock sensor API server on port {args.port}...")
+    print(f"Simulating {args.sensors} sensor(s), seed {args.seed}, profile '{args.profile}' "
+          f"({int(fleet.offline.sum())} offline)")
+    print("Note: This is a mock server for testing - no real sensors required")
+    uvicorn.run(app, host='0.0.0.0', port=args.port, log_level='warning')
+
 
 if __name__ == '__main__':
-    try:
-        print(f"Starting mock sensor API server on port {API_PORT}...")
-        print("Note: This is a mock server for testing - no real sensors required")
-        app.run(host='0.0.0.0', port=API_PORT, debug=True)
-    except Exception as e:
-        print(f"Failed to start server: {e}")
+    main()
@@ -0,0 +1,52 @@
+import threading
+from datetime import datetime
+
+
+class ReadingBuffer:
+    """
+    Fixed-size ring buffer of timestamped sensor readings.
+
+    One reader thread appends; HTTP handlers read. The slots are allocated
+    up front and overwritten in place, so memory stays constant however
+    long the API runs. latest() is O(1) and last(n) is O(n).
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def append(self, moisture, temperature, timestamp=None):
+        reading = {
+            'moisture': moisture,
+            'temperature': temperature,
+            'timestamp': timestamp or datetime.now()
+        }
+        with self._lock:
+            self._slots[self._next] = reading
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self.total += 1
+        return reading
+
+    def latest(self):
+        """Newest reading, or None before the first one"""
+        with self._lock:
+            if not self._count:
+                return None
+            return self._slots[self._next - 1]
+
+    def last(self, n):
+        """Up to n newest readings, oldest first"""
+        with self._lock:
+            n = min(n, self._count)
+            start = self._next - n
+            if start >= 0:
+                return self._slots[start:self._next]
+            return self._slots[start:] + self._slots[:self._next]
+
+    def __len__(self):
+        return self._count
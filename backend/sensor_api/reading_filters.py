@@ -0,0 +1,160 @@
+"""
+Incremental smoothing and windowed statistics of sensor readings.
+
+Readings are on a fixed grid after parsing: whole moisture units from 400 to
+900 and tenths of a degree from 0 to 40. Window statistics work in grid
+steps, so sums are exact integers that never drift, and the median comes
+from a histogram of the window instead of sorting it. Adding a reading is
+constant time: min and max come from monotonic queues, mean and variance
+from running sums, and the median pointer moves past at most the empty
+bins between neighbouring values. Windows are in seconds of reading time,
+so they mean the same at any sampling rate.
+"""
+import math
+import threading
+from collections import deque
+
+# field -> (lowest value, highest value, grid step)
+FIELD_GRIDS = {
+    'moisture': (400, 900, 1),
+    'temperature': (0, 40, 0.1),
+}
+
+
+class RollingStats:
+    """Count, mean, variance, min, max and median of one field over a time window"""
+
+    def __init__(self, seconds, low, high, step):
+        self.seconds = seconds
+        self.low = low
+        self.step = step
+        self._entries = deque()  # (t, bin) in arrival order
+        self._mins = deque()  # increasing bins, candidates for the minimum
+        self._maxes = deque()  # decreasing bins, candidates for the maximum
+        self._counts = [0] * (round((high - low) / step) + 1)
+        self._sum = 0
+        self._sum_squares = 0
+        # Median bin m and the number of values in bins below it
+        self._median = 0
+        self._below = 0
+
+    def _bin(self, value):
+        return min(len(self._counts) - 1, max(0, round((value - self.low) / self.step)))
+
+    def add(self, t, value):
+        b = self._bin(value)
+        self._entries.append((t, b))
+        while self._mins and self._mins[-1][1] > b:
+            self._mins.pop()
+        self._mins.append((t, b))
+        while self._maxes and self._maxes[-1][1] < b:
+            self._maxes.pop()
+        self._maxes.append((t, b))
+        self._sum += b
+        self._sum_squares += b * b
+        self._counts[b] += 1
+        if b < self._median:
+            self._below += 1
+
+        cutoff = t - self.seconds
+        while self._entries and self._entries[0][0] <= cutoff:
+            self._remove(*self._entries.popleft())
+        self._rebalance()
+
+    def _remove(self, t, b):
+        if self._mins[0] == (t, b):
+            self._mins.popleft()
+        if self._maxes[0] == (t, b):
+            self._maxes.popleft()
+        self._sum -= b
+        self._sum_squares -= b * b
+        self._counts[b] -= 1
+        if b < self._median:
+            self._below -= 1
+
+    def _rebalance(self):
+        """Move the median bin so it holds the k-th smallest value, k = (n + 1) // 2"""
+        k = (len(self._entries) + 1) // 2
+        if not k:
+            self._median, self._below = 0, 0
+            return
+        while self._below + self._counts[self._median] < k:
+            self._below += self._counts[self._median]
+            self._median += 1
+        while self._below >= k:
+            self._median -= 1
+            self._below -= self._counts[self._median]
+
+    def _value(self, b):
+        return self.low + b * self.step
+
+    def summary(self):
+        n = len(self._entries)
+        if not n:
+            return {"count": 0}
+        median = self._median
+        if n % 2 == 0 and self._below + self._counts[median] == n // 2:
+            # Even count split between two bins: the median is their midpoint
+            upper = median + 1
+            while not self._counts[upper]:
+                upper += 1
+            median = (median + upper) / 2
+        variance = (n * self._sum_squares - self._sum ** 2) / (n * n) * self.step ** 2
+        digits = max(0, -int(math.floor(math.log10(self.step)))) + 2
+        return {
+            "count": n,
+            "mean": round(self._value(self._sum / n), digits),
+            "std": round(math.sqrt(max(0.0, variance)), digits),
+            "variance": round(variance, digits),
+            "min": round(self._value(self._mins[0][1]), digits),
+            "max": round(self._value(self._maxes[0][1]), digits),
+            "median": round(self._value(median), digits)
+        }
+
+
+class ReadingFilters:
+    """
+    Smoothed values and window statistics of one sensor, updated with every
+    reading. The EMA weights readings by age with time constant ema_seconds,
+    so gaps in the data age the average the same way at any sampling rate.
+    """
+
+    def __init__(self, windows, ema_seconds):
+        self.windows = windows
+        self.ema_seconds = ema_seconds
+        self._stats = {
+            name: {field: RollingStats(seconds, *grid) for field, grid in FIELD_GRIDS.items()}
+            for name, seconds in windows.items()
+        }
+        self._ema = {}
+        self._last_t = None
+        self._lock = threading.Lock()
+
+    def update(self, reading):
+        t = reading['timestamp'].timestamp()
+        with self._lock:
+            if self._last_t is None:
+                weight = 1.0
+            else:
+                weight = 1 - math.exp(-max(0.0, t - self._last_t) / self.ema_seconds)
+            self._last_t = t
+            for field in FIELD_GRIDS:
+                value = reading[field]
+                previous = self._ema.get(field, value)
+                self._ema[field] = previous + weight * (value - previous)
+                for stats in self._stats.values():
+                    stats[field].add(t, value)
+
+    def snapshot(self):
+        with self._lock:
+            if not self._ema:
+                return None
+            return {
+                "smoothed": {
+                    field: round(value, 2) for field, value in self._ema.items()
+                },
+                "windows": {
+                    name: {field: stats.summary() for field, stats in fields.items()}
+                    for name, fields in self._stats.items()
+                }
+            }
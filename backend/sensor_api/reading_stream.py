@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def frame_key(frame):
+    return frame['event'], frame['data'].get('sensor')
+
+
+class Subscription:
+    """
+    One stream client's pending frames, at most one per event and sensor. A
+    frame that finds an unsent one of the same event and sensor replaces it,
+    so a slow client gets the newest reading and link state of every sensor
+    instead of a growing backlog.
+    """
+
+    def __init__(self, sensor=None):
+        self.sensor = sensor
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def wants(self, frame):
+        return self.sensor is None or frame['data'].get('sensor') == self.sensor
+
+    def offer(self, frame):
+        key = frame_key(frame)
+        with self._condition:
+            if self._pending.pop(key, None) is not None:
+                self.dropped += 1
+            self._pending[key] = frame
+            self._condition.notify()
+
+    def next(self, timeout=None):
+        """Pending frames in publish order, or [] when none arrive within timeout"""
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout)
+            frames = list(self._pending.values())
+            self._pending.clear()
+            return frames
+
+
+class ReadingBroadcaster:
+    """
+    Fans readings out from the serial reader threads to every stream client.
+
+    Each frame gets a sequence number. Numbering starts from the startup
+    time in milliseconds, so numbers keep increasing across restarts. The
+    last replay_size frames are kept so a client that reconnects with the
+    last sequence number it saw gets exactly the frames it missed. If that
+    number is older than the replay log, or from before a restart, the
+    client gets a reset and the latest frame of each event of every sensor
+    instead.
+    """
+
+    def __init__(self, replay_size=1000):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._log = deque(maxlen=replay_size)
+        self._latest = {}
+        self._sequence = int(time.time() * 1000)
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data):
+        with self._lock:
+            self._sequence += 1
+            frame = {'sequence': self._sequence, 'event': event, 'data': data}
+            self._log.append(frame)
+            self._latest[frame_key(frame)] = frame
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            if subscription.wants(frame):
+                subscription.offer(frame)
+        return frame
+
+    def subscribe(self, last_sequence=None, sensor=None):
+        """
+        Register a client. Returns the subscription, the frames to send
+        first, and whether the client's last_sequence couldn't be resumed.
+        """
+        subscription = Subscription(sensor)
+        with self._lock:
+            resumable = (
+                last_sequence is not None and last_sequence <= self._sequence and
+                (not self._log or last_sequence >= self._log[0]['sequence'] - 1)
+            )
+            if resumable:
+                backlog = [frame for frame in self._log if frame['sequence'] > last_sequence]
+            else:
+                backlog = sorted(self._latest.values(), key=lambda frame: frame['sequence'])
+            self._subscribers.add(subscription)
+        backlog = [frame for frame in backlog if subscription.wants(frame)]
+        return subscription, backlog, last_sequence is not None and not resumable
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            self.dropped += subscription.dropped
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            return {
+                "subscribers": len(subscribers),
+                "published": self.published,
+                "sequence": self._sequence,
+                "replay_frames": len(self._log),
+                "dropped": self.dropped + sum(s.dropped for s in subscribers)
+            }
+
+
+def sse_event(event, data, sequence=None):
+    """Encode a server-sent event; frames carry their sequence number as the event id"""
+    lines = f"id: {sequence}\n" if sequence is not None else ""
+    return f"{lines}event: {event}\ndata: {json.dumps(data)}\n\n"
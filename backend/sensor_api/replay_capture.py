@@ -0,0 +1,151 @@
+"""
+Replays serial captures through the sensor API's reading path and reports
+parse throughput.
+
+Captured records are read by a SerialReader exactly as a live port would be,
+so they go through parse_line (or the frame decoder), map_value, clamping
+and rounding, then to the listeners. Replayed readings keep their captured
+timestamps. With --history they are appended to a history store, and with
+--predict they are scored by the ML API in batches, so an incident can be
+reproduced end to end.
+
+Usage:
+    python replay_capture.py serial_captures/default [--speed 1|10|max]
+    python replay_capture.py serial_captures/default/2024-06-01T000000.cap.gz --speed max --history /tmp/replayed
+    python replay_capture.py serial_captures/default --speed 60 --predict
+"""
+import argparse
+import json
+import os
+import time
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from history_store import HistoryStore
+from reading_buffer import ReadingBuffer
+from serial_capture import ReplayPort, capture_files, read_header
+from serial_reader import SerialReader
+
+ML_API_URL = "http://localhost:8000"
+PREDICT_BATCH_SIZE = 500
+
+
+class PredictionSink:
+    """Scores replayed readings with the ML API's batch endpoint"""
+
+    def __init__(self, url, batch_size):
+        self.url = url
+        self.batch_size = batch_size
+        self.pending = []
+        self.scored = 0
+        self.irrigate = 0
+        self.errors = 0
+
+    def __call__(self, reading):
+        self.pending.append({'moisture': reading['moisture'], 'temperature': reading['temperature']})
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        body = json.dumps({'readings': self.pending}).encode()
+        self.pending = []
+        request = Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urlopen(request, timeout=30) as response:
+                predictions = json.load(response)['predictions']
+        except (URLError, OSError, KeyError, ValueError) as e:
+            self.errors += 1
+            print(f"Prediction request failed: {e}")
+            return
+        self.scored += len(predictions)
+        self.irrigate += sum(p['need_irrigation'] for p in predictions)
+
+
+def parse_speed(value):
+    return 0.0 if value == 'max' else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay serial captures through the reading path")
+    parser.add_argument('paths', nargs='+', help="Capture files or directories of them")
+    parser.add_argument('--speed', type=parse_speed, default=1.0,
+                        help="1 for the captured pace, N for N times faster, max for no waiting")
+    parser.add_argument('--framing', choices=['ascii', 'binary'],
+                        help="Serial framing (default: from the capture header)")
+    parser.add_argument('--sensor', help="Sensor id for history (default: the capture directory name)")
+    parser.add_argument('--history', help="Append replayed readings to a history store in this directory")
+    parser.add_argument('--predict', action='store_true', help="Score replayed readings with the ML API")
+    parser.add_argument('--ml-api', default=ML_API_URL)
+    args = parser.parse_args()
+
+    files = capture_files(args.paths)
+    if not files:
+        parser.error("no capture files found")
+    framing = args.framing or read_header(files[0]).get('framing', 'ascii')
+    sensor_id = args.sensor or os.path.basename(os.path.dirname(os.path.abspath(files[0])))
+
+    replay = ReplayPort(files, args.speed)
+    buffer = ReadingBuffer()
+    reader = SerialReader('replay', buffer, timeout=0.01, open_port=replay.open, settle_time=0,
+                          framing=framing, clock=replay.clock)
+
+    first_reading = last_reading = None
+
+    def track(reading):
+        nonlocal first_reading, last_reading
+        first_reading = first_reading or reading['timestamp']
+        last_reading = reading['timestamp']
+
+    reader.listeners.append(track)
+    history = None
+    if args.history:
+        history = HistoryStore(args.history)
+        reader.listeners.append(
+            lambda reading: history.append(sensor_id, reading['timestamp'], reading['moisture'], reading['temperature'])
+        )
+    predictions = None
+    if args.predict:
+        predictions = PredictionSink(f"{args.ml_api}/api/predict/batch", PREDICT_BATCH_SIZE)
+        reader.listeners.append(predictions)
+
+    speed = f"{args.speed:g}x" if args.speed else "max speed"
+    print(f"Replaying {len(files)} capture file(s) of '{sensor_id}' ({framing}) at {speed}")
+    start = time.perf_counter()
+    reader.start()
+    try:
+        while not replay.finished.wait(1):
+            pass
+    except KeyboardInterrupt:
+        print("Interrupted")
+    reader.stop()
+    elapsed = time.perf_counter() - start
+    if predictions is not None:
+        predictions.flush()
+    if history is not None:
+        history.flush()
+
+    stats = reader.stats()
+    readings = stats['readings']
+    print(f"\n  records      {replay.records:,} ({replay.bytes:,} bytes) in {elapsed:.2f}s")
+    print(f"  readings     {readings:,}, {stats['parse_errors']:,} parse errors"
+          + (f", frames {stats['frames']}" if 'frames' in stats else ""))
+    print(f"  throughput   {readings / elapsed:,.0f} readings/s, {replay.bytes / elapsed / 1024:,.1f} KiB/s")
+    handle = stats['handle_latency']
+    if handle['samples']:
+        print(f"  parse+publish per read  p50 {handle['p50_ms'] * 1000:.1f} us, p95 {handle['p95_ms'] * 1000:.1f} us, "
+              f"max {handle['max_ms'] * 1000:.1f} us")
+    if first_reading is not None:
+        span = (last_reading - first_reading).total_seconds()
+        print(f"  captured     {first_reading.isoformat()} to {last_reading.isoformat()}"
+              + (f", replayed at {span / elapsed:,.1f}x real time" if elapsed else ""))
+    if history is not None:
+        print(f"  history      {history.appended:,} readings appended to {args.history}")
+    if predictions is not None:
+        print(f"  predictions  {predictions.scored:,} scored, {predictions.irrigate:,} need irrigation, "
+              f"{predictions.errors} failed batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-import serial
-import time
+import math
+import os
 import threading
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from decision_scorer import DecisionScorer
+from reading_buffer import ReadingBuffer
+from reading_filters import ReadingFilters
+from serial_reader import SerialReader
+from serial_capture import CaptureWriter
+from history_store import HistoryStore
+from reading_stream import ReadingBroadcaster, sse_event
 
 app = Flask(__name__)
 CORS(app)
@@ -12,62 +20,171 @@ CORS(app)
 SENSOR_PORT = 'COM9'
 API_PORT = 8001
 
-# Global variable for the serial connection
-arduino = None
-arduino_lock = threading.Lock()
-
-def map_value(value, in_min, in_max, out_min, out_max):
-    """Map a value from one range to another"""
-    return (value - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
-
-def get_arduino_connection():
-    global arduino
-    with arduino_lock:
-        if arduino is None or not arduino.is_open:
-            try:
-                arduino = serial.Serial(port=SENSOR_PORT, baudrate=9600, timeout=1)
-                time.sleep(2)  # Give time for connection to stabilize
-            except serial.SerialException as e:
-                print(f"Error opening serial port: {e}")
-                arduino = None
-    return arduino
-
-def read_arduino_data():
-    """
-    Reads data from Arduino and maps the values to the frontend's expected range
-    Raw sensor: 1023 (fully dry) to 0 (maximum wet)
-    Frontend expects: 400 (driest) to 900 (wettest)
-    """
-    arduino = get_arduino_connection()
-    if arduino:
+# Serial devices by sensor id. Ports are device names ('COM9',
+# '/dev/ttyUSB0') or pyserial URLs; fake_arduino.py provides stand-ins
+SENSORS = {'default': SENSOR_PORT}
+# Sensors whose firmware sends binary frames (see serial_framing.py)
+# instead of CSV lines, e.g. {'default': 'binary'}; others use 'ascii'
+SENSOR_FRAMING = {}
+# Seconds before reopening a failed port; doubles with each consecutive
+# failure up to the maximum. Requests fail at once while a link is down
+SERIAL_RETRY_INTERVAL = 2.0
+SERIAL_MAX_RETRY_INTERVAL = 60.0
+# Record everything read from each port to compressed files under
+# CAPTURE_DIR/<sensor id>/, for replay with replay_capture.py
+SERIAL_CAPTURE = False
+CAPTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serial_captures')
+# Sensor served by /api/getCurrentReading and /api/readings
+DEFAULT_SENSOR = next(iter(SENSORS))
+
+# Readings kept in memory per sensor by its reader thread
+READING_BUFFER_SIZE = 1024
+# Most readings /api/readings returns in one call
+MAX_READINGS = READING_BUFFER_SIZE
+# A reading older than this many seconds is reported as a sensor failure
+STALE_READING_SECONDS = 10
+
+# Current readings also carry an exponential moving average with this time
+# constant in seconds, and mean, std, min, max and median over each window
+# (name -> seconds), all updated incrementally as readings arrive
+FILTER_EMA_SECONDS = 30
+FILTER_WINDOWS = {'1m': 60, '10m': 600}
+
+# /api/currentDecision scores the current reading in this process with the
+# model the ML API serves, loaded on first use and checked for newer
+# registry versions every DECISION_MODEL_REFRESH seconds. Without the model
+# (or with LOCAL_SCORING off) readings are forwarded to ML_API_URL instead.
+# Versions are canary-checked like the ML API does, and the threshold is
+# the one both services import from ml/inference/decisions.py
+LOCAL_SCORING = True
+ML_API_URL = "http://localhost:8000"
+ML_API_TIMEOUT = 5
+DECISION_MODEL_REFRESH = 60
+
+# Every reading is kept in a local time-series store with 1-minute and
+# 1-hour rollups; buffered readings are written every HISTORY_FLUSH_INTERVAL
+# seconds and chunks older than HISTORY_RETENTION_DAYS are deleted
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sensor_history')
+HISTORY_FLUSH_INTERVAL = 5
+HISTORY_RETENTION_DAYS = {'raw': 7, '1m': 90, '1h': 5 * 365}
+# Most points /api/history returns; longer ranges need a coarser resolution
+MAX_HISTORY_POINTS = 10000
+
+# Server-sent events on /api/stream: frames kept for clients resuming after
+# a reconnect, and seconds between heartbeats on an idle stream
+STREAM_REPLAY_SIZE = 1000
+STREAM_HEARTBEAT_INTERVAL = 15
+# Milliseconds EventSource waits before reconnecting
+STREAM_RETRY_MS = 3000
+
+# Each serial port is owned by its own background reader thread, so a slow
+# or dead device only affects its own readings; handlers only read the
+# ring buffers
+sensors = {
+    sensor_id: SerialReader(
+        port, ReadingBuffer(READING_BUFFER_SIZE), framing=SENSOR_FRAMING.get(sensor_id, 'ascii'),
+        retry_interval=SERIAL_RETRY_INTERVAL, max_retry_interval=SERIAL_MAX_RETRY_INTERVAL,
+        capture=CaptureWriter(
+            os.path.join(CAPTURE_DIR, sensor_id), port, SENSOR_FRAMING.get(sensor_id, 'ascii')
+        ) if SERIAL_CAPTURE else None
+    )
+    for sensor_id, port in SENSORS.items()
+}
+
+# Registered first so the statistics served include the newest reading
+filters = {sensor_id: ReadingFilters(FILTER_WINDOWS, FILTER_EMA_SECONDS) for sensor_id in sensors}
+for sensor_id, reader in sensors.items():
+    reader.listeners.append(filters[sensor_id].update)
+
+history = HistoryStore(HISTORY_DIR, retention=HISTORY_RETENTION_DAYS)
+for sensor_id, reader in sensors.items():
+    reader.listeners.append(
+        lambda reading, sensor_id=sensor_id: history.append(
+            sensor_id, reading['timestamp'], reading['moisture'], reading['temperature']
+        )
+    )
+history_stopping = threading.Event()
+
+broadcaster = ReadingBroadcaster(STREAM_REPLAY_SIZE)
+for sensor_id, reader in sensors.items():
+    reader.listeners.append(
+        lambda reading, sensor_id=sensor_id: broadcaster.publish(
+            'reading', {'sensor': sensor_id, **reading_response(reading)}
+        )
+    )
+    # So stream clients learn that a link is down rather than seeing readings stop
+    reader.link_listeners.append(
+        lambda link, sensor_id=sensor_id: broadcaster.publish(
+            'link', {'sensor': sensor_id, **link, 'timestamp': datetime.now().isoformat()}
+        )
+    )
+
+scorer = DecisionScorer(
+    ML_API_URL, timeout=ML_API_TIMEOUT, local=LOCAL_SCORING, refresh_interval=DECISION_MODEL_REFRESH
+)
+
+def maintain_history():
+    """Flush buffered readings every interval and apply retention hourly"""
+    last_retention = 0
+    while not history_stopping.wait(HISTORY_FLUSH_INTERVAL):
         try:
-            data = arduino.readline().decode('utf-8').strip()
-            if data:
-                parts = data.split(",")
-                if len(parts) == 6:
-                    # Get raw moisture value (0-1023) and temperature
-                    raw_moisture = float(parts[5])
-                    temperature_c = float(parts[1])
-                    
-                    # Constrain raw moisture value
-                    raw_moisture = max(0, min(1023, raw_moisture))
-                    
-                    # Map the moisture value:
-                    # Input: 1023 (dry) -> 0 (wet)
-                    # Output: 400 (dry) -> 900 (wet)
-                    moisture = map_value(raw_moisture, 1023, 0, 400, 900)
-                    
-                    # Ensure temperature is within valid range
-                    temperature_c = max(0, min(40, temperature_c))
-                    
-                    return {
-                        'moisture': round(moisture),  # Round to nearest integer
-                        'temperature': round(temperature_c * 10) / 10  # Round to 1 decimal
-                    }
+            history.flush()
+            if datetime.now().timestamp() - last_retention > 3600:
+                history.apply_retention()
+                last_retention = datetime.now().timestamp()
         except Exception as e:
-            print(f"Error reading sensor data: {e}")
-            raise Exception("Failed to read sensor data")
-    raise Exception("No connection to sensor")
+            print(f"Error writing sensor history: {e}")
+
+def reading_response(reading):
+    return {
+        'moisture': reading['moisture'],
+        'temperature': reading['temperature'],
+        'timestamp': reading['timestamp'].isoformat()
+    }
+
+class SensorUnavailable(Exception):
+    """A sensor's link is down; carries the link state and the last reading"""
+
+    def __init__(self, message, reader):
+        super().__init__(message)
+        self.link = reader.link()
+        latest = reader.buffer.latest()
+        self.last_reading = reading_response(latest) if latest is not None else None
+
+def sensor_error(e, **fields):
+    """
+    Error response for a failed read: 503 with the link state, the last
+    known reading and a Retry-After header while the link is down, else 500
+    """
+    body = {**fields, "error": str(e), "timestamp": datetime.now().isoformat()}
+    if not isinstance(e, SensorUnavailable):
+        return jsonify(body), 500
+    body["link"] = e.link
+    body["last_reading"] = e.last_reading
+    headers = {}
+    if "retry_in_seconds" in e.link:
+        headers["Retry-After"] = str(max(1, math.ceil(e.link["retry_in_seconds"])))
+    return jsonify(body), 503, headers
+
+def read_arduino_data(sensor_id=None):
+    """
+    Latest reading of a sensor, mapped to the frontend's range, with its
+    smoothed values and window statistics. Raises at once while the link
+    is down, and when there is no reading yet or the newest one is stale.
+    """
+    sensor_id = sensor_id or DEFAULT_SENSOR
+    reader = sensors[sensor_id]
+    if not reader.connected:
+        raise SensorUnavailable(
+            f"Sensor link is down, {reader.state} ({reader.last_error or 'not connected yet'})", reader
+        )
+    reading = reader.buffer.latest()
+    if reading is None:
+        raise Exception(f"No reading received yet ({reader.last_error or 'waiting for sensor'})")
+    age = (datetime.now() - reading['timestamp']).total_seconds()
+    if age > STALE_READING_SECONDS:
+        raise Exception(f"No reading for {age:.0f}s ({reader.last_error or 'sensor silent'})")
+    return {**reading_response(reading), **(filters[sensor_id].snapshot() or {})}
 
 @app.route('/api/getCurrentReading', methods=['GET'])
 def get_current_reading():
@@ -76,12 +193,199 @@ def get_current_reading():
     """
     try:
         data = read_arduino_data()
-        return jsonify(data), 200
+        return jsonify({"sensor": DEFAULT_SENSOR, **data}), 200
+    except Exception as e:
+        return sensor_error(e, sensor=DEFAULT_SENSOR)
+
+@app.route('/api/currentDecision', methods=['GET'])
+def get_current_decision():
+    """
+    Current reading of a sensor (?sensor=, default the default sensor) with
+    its irrigation decision, made in this process when the model is loaded
+    and by the ML API otherwise. Answers 503 with the reading when neither
+    can decide.
+    """
+    sensor_id = request.args.get('sensor', DEFAULT_SENSOR)
+    if sensor_id not in sensors:
+        return unknown_sensor(sensor_id)
+    try:
+        reading = read_arduino_data(sensor_id)
+    except Exception as e:
+        return sensor_error(e, sensor=sensor_id)
+    try:
+        decision = scorer.decide(reading['moisture'], reading['temperature'])
+    except Exception as e:
+        return jsonify({
+            "sensor": sensor_id,
+            "reading": reading,
+            "error": f"No decision model available and the ML API failed: {e}",
+            "timestamp": datetime.now().isoformat()
+        }), 503
+    return jsonify({"sensor": sensor_id, **reading, "decision": decision}), 200
+
+def recent_readings(sensor_id):
+    """The last n readings of a sensor (default 60), oldest first"""
+    n = request.args.get('n', default=60, type=int)
+    n = max(1, min(n, MAX_READINGS))
+    recent = [reading_response(reading) for reading in sensors[sensor_id].buffer.last(n)]
+    return jsonify({"sensor": sensor_id, "readings": recent, "count": len(recent)}), 200
+
+def unknown_sensor(sensor_id):
+    return jsonify({
+        "error": f"Unknown sensor '{sensor_id}'",
+        "sensors": list(sensors),
+        "timestamp": datetime.now().isoformat()
+    }), 404
+
+@app.route('/api/readings', methods=['GET'])
+def get_recent_readings():
+    """
+    The last n readings of the default sensor, oldest first
+    """
+    return recent_readings(DEFAULT_SENSOR)
+
+@app.route('/api/sensors', methods=['GET'])
+def list_sensors():
+    """
+    Every sensor with its latest reading and link state, plus the average of
+    the sensors whose readings are fresh
+    """
+    entries = []
+    fresh = []
+    for sensor_id, reader in sensors.items():
+        entry = {"id": sensor_id, **reader.stats()}
+        try:
+            entry["current"] = read_arduino_data(sensor_id)
+            fresh.append(entry["current"])
+        except Exception as e:
+            entry["current"] = None
+            entry["error"] = str(e)
+        entries.append(entry)
+
+    summary = {"sensors": len(entries), "reporting": len(fresh)}
+    if fresh:
+        summary["moisture"] = sum(r['moisture'] for r in fresh) / len(fresh)
+        summary["temperature"] = sum(r['temperature'] for r in fresh) / len(fresh)
+    return jsonify({"sensors": entries, "summary": summary, "timestamp": datetime.now().isoformat()}), 200
+
+@app.route('/api/sensors/<sensor_id>/current', methods=['GET'])
+def get_sensor_reading(sensor_id):
+    """
+    Latest reading of one sensor
+    """
+    if sensor_id not in sensors:
+        return unknown_sensor(sensor_id)
+    try:
+        return jsonify({"sensor": sensor_id, **read_arduino_data(sensor_id)}), 200
     except Exception as e:
+        return sensor_error(e, sensor=sensor_id)
+
+@app.route('/api/sensors/<sensor_id>/readings', methods=['GET'])
+def get_sensor_readings(sensor_id):
+    """
+    The last n readings of one sensor, oldest first
+    """
+    if sensor_id not in sensors:
+        return unknown_sensor(sensor_id)
+    return recent_readings(sensor_id)
+
+@app.route('/api/stream', methods=['GET'])
+def stream_readings():
+    """
+    Server-sent events carrying every new reading, optionally of one sensor
+    (?sensor=), and a 'link' event with the link state whenever a sensor's
+    link goes down or comes back. Reconnecting clients resume from the
+    Last-Event-ID header (or ?last_id=); a 'reset' event means readings were
+    missed and the latest reading and link state of each sensor follow. A
+    slow client only gets the newest pending reading and link state per
+    sensor. 'heartbeat' events are sent while idle.
+    """
+    sensor_id = request.args.get('sensor')
+    if sensor_id is not None and sensor_id not in sensors:
+        return unknown_sensor(sensor_id)
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_sequence = int(last_id) if last_id else None
+    except ValueError:
+        last_sequence = None
+
+    def events():
+        subscription, backlog, reset = broadcaster.subscribe(last_sequence, sensor_id)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            if reset:
+                yield sse_event('reset', {'last_id': last_sequence, 'timestamp': datetime.now().isoformat()})
+            for frame in backlog:
+                yield sse_event(frame['event'], frame['data'], frame['sequence'])
+            while True:
+                frames = subscription.next(timeout=STREAM_HEARTBEAT_INTERVAL)
+                if not frames:
+                    yield sse_event('heartbeat', {'timestamp': datetime.now().isoformat()})
+                for frame in frames:
+                    yield sse_event(frame['event'], frame['data'], frame['sequence'])
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/stream/stats', methods=['GET'])
+def stream_stats():
+    """
+    Connected stream clients, frames published and readings conflated away
+    """
+    return jsonify(broadcaster.stats()), 200
+
+def history_points(resolution, records):
+    """JSON-ready points; rollups carry count and min/max/mean per field"""
+    columns = [name for name in records.dtype.names if name != 't']
+    timestamps = [datetime.fromtimestamp(t).isoformat() for t in records['t'].tolist()]
+    values = [
+        records[name].tolist() if name == 'count' else records[name].astype(float).round(2).tolist()
+        for name in columns
+    ]
+    return [dict(zip(['timestamp', *columns], row)) for row in zip(timestamps, *values)]
+
+def local_time(value):
+    """An ISO 8601 time as naive local time, like the stored timestamps; offsets are converted"""
+    t = datetime.fromisoformat(value)
+    return t.astimezone().replace(tzinfo=None) if t.tzinfo is not None else t
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    Readings of one sensor between from and to (ISO 8601, default the last
+    hour) at resolution raw, 1m, 1h or auto (the default, which picks the
+    finest level suited to the range). Rollup levels are read from their
+    own precomputed chunks, never from raw readings.
+    """
+    sensor_id = request.args.get('sensor', DEFAULT_SENSOR)
+    if sensor_id not in sensors:
+        return unknown_sensor(sensor_id)
+    try:
+        end = local_time(request.args['to']) if 'to' in request.args else datetime.now()
+        start = local_time(request.args['from']) if 'from' in request.args else end - timedelta(hours=1)
+        if start >= end:
+            raise ValueError("'from' must be before 'to'")
+        resolution, records = history.query(sensor_id, start, end, request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({"error": str(e), "timestamp": datetime.now().isoformat()}), 400
+
+    if len(records) > MAX_HISTORY_POINTS:
         return jsonify({
-            "error": str(e),
+            "error": f"{len(records)} points in range, more than {MAX_HISTORY_POINTS}; use a coarser resolution",
             "timestamp": datetime.now().isoformat()
-        }), 500
+        }), 400
+    return jsonify({
+        "sensor": sensor_id,
+        "resolution": resolution,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "points": history_points(resolution, records),
+        "count": len(records)
+    }), 200
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -93,14 +397,18 @@ def health_check():
         "sensor_moisture_range": "0 (wet) - 1023 (dry)",
         "frontend_moisture_range": "400 (dry) - 900 (wet)",
         "temperature_range": "0-40°C",
+        "sensors": {sensor_id: reader.stats() for sensor_id, reader in sensors.items()},
+        "history": history.stats(),
+        "decisions": scorer.stats(),
         "timestamp": datetime.now().isoformat()
     }), 200
 
 def cleanup():
-    """Ensure serial connection is closed when app shuts down"""
-    global arduino
-    if arduino and arduino.is_open:
-        arduino.close()
+    """Stop the reader threads and close the serial connections when the app shuts down"""
+    for reader in sensors.values():
+        reader.stop()
+    history_stopping.set()
+    history.flush()
 
 if __name__ == '__main__':
     try:
@@ -114,7 +422,11 @@ Moisture value mapping:
   - Frontend output: 400 (driest) to 900 (wettest)
 Temperature range: 0-40°C
         """)
-        app.run(host='0.0.0.0', port=API_PORT, debug=True, threaded=True)
+        for reader in sensors.values():
+            reader.start()
+        threading.Thread(target=maintain_history, name="history", daemon=True).start()
+        # The reloader would run a second copy of this process and open the port twice
+        app.run(host='0.0.0.0', port=API_PORT, debug=True, threaded=True, use_reloader=False)
     except Exception as e:
         print(f"Failed to start server: {e}")
-        cleanup()
\ No newline at end of file
+        cleanup()
@@ -0,0 +1,133 @@
+"""
+Reproducible virtual sensor fleet for mock_sensor_server.py.
+
+Every sensor gets its own soil and climate parameters from the fleet seed:
+moisture follows a daily evaporation curve on top of a drying cycle of a few
+days that ends with irrigation, and temperature a daily curve peaking in the
+afternoon, in solar time: UTC shifted by the fleet's utc_offset and each
+sensor's own offset. Noise comes from a hash of (seed, sensor, time step) rather than a
+random generator's state, so the reading of a sensor at a given time is the
+same in every run and whatever else was asked for before. Readings of many
+sensors are computed together as NumPy arrays.
+
+Latency and failure profiles make the fleet behave like real links: each
+request waits a log-normally distributed delay, a fraction of requests fail,
+and a fixed, seeded set of sensors is offline.
+"""
+import numpy as np
+
+# name -> median latency (ms), log-normal spread, failed request rate, offline sensor fraction
+PROFILES = {
+    'none': {'latency_ms': 0, 'jitter': 0.0, 'error_rate': 0.0, 'offline': 0.0},
+    'lan': {'latency_ms': 5, 'jitter': 0.4, 'error_rate': 0.0, 'offline': 0.0},
+    'cellular': {'latency_ms': 80, 'jitter': 0.8, 'error_rate': 0.01, 'offline': 0.02},
+    'flaky': {'latency_ms': 30, 'jitter': 1.2, 'error_rate': 0.05, 'offline': 0.10},
+}
+
+_MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix(x):
+    """splitmix64 finaliser: a well-spread uint64 hash of each element"""
+    with np.errstate(over='ignore'):
+        x = (x + np.uint64(0x9E3779B97F4A7C15)) & _MASK
+        x = ((x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK
+        x = ((x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK
+        return x ^ (x >> np.uint64(31))
+
+
+def sensor_id(index):
+    return f"sensor-{index + 1}"
+
+
+def sensor_index(sensor_id, count):
+    """Index of a sensor id, or None when it isn't in a fleet of count sensors"""
+    prefix, _, number = sensor_id.partition('-')
+    if prefix != 'sensor' or not number.isdigit() or not 1 <= int(number) <= count:
+        return None
+    return int(number) - 1
+
+
+class SensorFleet:
+    """
+    count virtual sensors sampled every sample_interval seconds, with their
+    daily curves centred on UTC + utc_offset hours
+    """
+
+    def __init__(self, count, seed=0, profile='none', sample_interval=1.0, utc_offset=0.0):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}, expected one of {list(PROFILES)}")
+        self.count = count
+        self.seed = seed
+        self.profile = profile
+        self.sample_interval = sample_interval
+        self.utc_offset = utc_offset
+
+        rng = np.random.default_rng(seed)
+        self.moisture_base = rng.uniform(600, 820, count)
+        self.daily_moisture = rng.uniform(15, 60, count)
+        self.drying_depth = rng.uniform(80, 200, count)
+        self.drying_days = rng.uniform(2, 6, count)
+        self.drying_offset = rng.uniform(0, 1, count)
+        self.temperature_base = rng.uniform(17, 27, count)
+        self.daily_temperature = rng.uniform(4, 9, count)
+        # Sensors spread over a few time zones' worth of solar time
+        self.solar_offset_hours = rng.uniform(-1.5, 1.5, count)
+        self.moisture_noise = rng.uniform(3, 12, count)
+        self.temperature_noise = rng.uniform(0.1, 0.6, count)
+        self.offline = rng.random(count) < PROFILES[profile]['offline']
+
+        self._rng = np.random.default_rng(seed + 1)
+
+    def _noise(self, indices, steps, channel):
+        """Uniform noise in [-1, 1] for each (sensor, step), fixed by the seed"""
+        key = (np.uint64(self.seed) << np.uint64(40)) ^ (indices.astype(np.uint64) << np.uint64(2)) ^ np.uint64(channel)
+        mixed = _mix(_mix(key) ^ steps.astype(np.uint64))
+        return (mixed >> np.uint64(11)).astype(np.float64) / float(1 << 53) * 2 - 1
+
+    def readings(self, indices, t):
+        """
+        Moisture, temperature and sample time of the sensors at indices at
+        epoch time t (or times t, one per sensor), in the sensor API's ranges
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        steps = np.floor(np.asarray(t, dtype=np.float64) / self.sample_interval).astype(np.int64)
+        steps = np.broadcast_to(steps, indices.shape)
+        sample_t = steps * self.sample_interval
+
+        # A fixed offset rather than the host's time zone, so readings are the
+        # same on every machine and don't shift at DST changes
+        hours = (sample_t / 3600 + self.utc_offset + self.solar_offset_hours[indices]) % 24
+        days = sample_t / 86400 / self.drying_days[indices] + self.drying_offset[indices]
+        # Moisture falls over the drying cycle and jumps back when irrigated,
+        # and dips in the afternoon as evaporation peaks
+        moisture = (
+            self.moisture_base[indices]
+            - self.drying_depth[indices] * (days % 1)
+            - self.daily_moisture[indices] * np.sin((hours - 9) * np.pi / 12)
+            + self.moisture_noise[indices] * self._noise(indices, steps, 0)
+        )
+        # Peak at 14:00, low at 02:00
+        temperature = (
+            self.temperature_base[indices]
+            + self.daily_temperature[indices] * np.sin((hours - 8) * np.pi / 12)
+            + self.temperature_noise[indices] * self._noise(indices, steps, 1)
+        )
+        moisture = np.rint(np.clip(moisture, 400, 900))
+        temperature = np.rint(np.clip(temperature, 0, 40) * 10) / 10
+        return moisture, temperature, sample_t
+
+    def history(self, index, t, n):
+        """The last n samples of one sensor up to time t, oldest first"""
+        times = t - np.arange(n - 1, -1, -1) * self.sample_interval
+        return self.readings(np.full(n, index), times)
+
+    def request_latency(self):
+        """Seconds to hold a request, drawn from the profile"""
+        profile = PROFILES[self.profile]
+        if not profile['latency_ms']:
+            return 0.0
+        return profile['latency_ms'] / 1000 * float(np.exp(profile['jitter'] * self._rng.standard_normal()))
+
+    def request_fails(self):
+        return self._rng.random() < PROFILES[self.profile]['error_rate']
@@ -0,0 +1,206 @@
+"""
+Capture and replay of raw serial traffic.
+
+A capture is a gzip file with one record per read from the port: the
+receive time in epoch seconds and the bytes exactly as read, with
+non-printable bytes backslash-escaped, so `zcat` shows the lines as the
+Arduino sent them:
+
+    # serial capture v1 port=COM9 framing=ascii
+    1729251234.512034 0,23.4,0,0,0,512\\r\\n
+
+Capture files are per sensor. A new file, named after the UTC time of its
+first record, is started at every startup and at the start of every UTC
+day, so a file cut short by a crash is read up to its last flush and
+nothing after it is lost.
+
+ReplayPort plays captures back through SerialReader as if they came from the
+device, at the captured pace, N times faster, or as fast as they can be
+parsed, so replayed readings take the same parse, map and listener path as
+live ones.
+"""
+import codecs
+import glob
+import gzip
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+HEADER_PREFIX = '# serial capture v1'
+
+
+def utc_day(t):
+    return datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%d')
+
+
+def capture_path(directory, t):
+    return os.path.join(directory, datetime.fromtimestamp(t, timezone.utc).strftime('%Y-%m-%dT%H%M%S') + '.cap.gz')
+
+
+class CaptureWriter:
+    """
+    Appends what a SerialReader reads to capture files in directory. Records
+    are compressed as they are written and flushed to disk every
+    flush_interval seconds.
+    """
+
+    def __init__(self, directory, port=None, framing='ascii', flush_interval=5.0):
+        self.directory = directory
+        self.port = port
+        self.framing = framing
+        self.flush_interval = flush_interval
+        self._file = None
+        self._path = None
+        self._day = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data, t=None):
+        t = time.time() if t is None else t
+        line = f"{t:.6f} ".encode() + codecs.escape_encode(bytes(data))[0] + b'\n'
+        with self._lock:
+            if utc_day(t) != self._day:
+                self._open(t)
+            self._file.write(line)
+            self.records += 1
+            self.bytes += len(data)
+            if t - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = t
+
+    def _open(self, t):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = capture_path(self.directory, t)
+        self._day = utc_day(t)
+        # Append so a restart within the same second doesn't overwrite the file
+        self._file = gzip.open(self._path, 'ab')
+        self._file.write(f"{HEADER_PREFIX} port={self.port} framing={self.framing}\n".encode())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._path = None
+                self._day = None
+
+    def stats(self):
+        return {"directory": self.directory, "file": self._path, "records": self.records, "bytes": self.bytes}
+
+
+def capture_files(paths):
+    """Capture files named by paths, expanding directories, in time order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, '**', '*.cap.gz'), recursive=True)
+        else:
+            files.append(path)
+    return sorted(files, key=os.path.basename)
+
+
+def read_header(path):
+    """Settings recorded in a capture file's header, e.g. {'port': ..., 'framing': ...}"""
+    with gzip.open(path, 'rb') as f:
+        line = f.readline().decode()
+    if not line.startswith(HEADER_PREFIX):
+        raise ValueError(f"{path} is not a serial capture")
+    return dict(field.split('=', 1) for field in line[len(HEADER_PREFIX):].split())
+
+
+def read_capture(paths):
+    """(receive time, bytes) of every record in the capture files, in order"""
+    for path in capture_files(paths):
+        with gzip.open(path, 'rb') as f:
+            try:
+                for line in f:
+                    if line.startswith(b'#'):
+                        continue  # Header
+                    stamp, _, data = line.rstrip(b'\n').partition(b' ')
+                    yield float(stamp), codecs.escape_decode(data)[0]
+            except (EOFError, zlib.error):
+                pass  # Cut short by a crash; keep what was flushed
+
+
+class ReplayPort:
+    """
+    Stands in for serial.serial_for_url: SerialReader(open_port=replay.open)
+    reads the captured records in order. speed is 1 for the captured pace,
+    N for N times faster and 0 for no waiting. clock() is the capture time
+    of the record being parsed, for timestamping replayed readings, and
+    finished is set once every record has been read.
+    """
+
+    def __init__(self, paths, speed=1.0):
+        self.paths = paths
+        self.speed = speed
+        self.finished = threading.Event()
+        self.records = 0
+        self.bytes = 0
+        self._records = read_capture(paths)
+        self._current_t = None
+
+    def open(self, port, baudrate=9600, timeout=None):
+        return ReplayConnection(self, timeout)
+
+    def clock(self):
+        return datetime.fromtimestamp(self._current_t) if self._current_t is not None else datetime.now()
+
+
+class ReplayConnection:
+    """The pyserial calls SerialReader makes, served from a ReplayPort"""
+
+    def __init__(self, replay, timeout):
+        self._replay = replay
+        self._timeout = timeout
+        self._pending = b''
+        self._start = None
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return len(self._pending)
+
+    def _next(self):
+        """The next record's bytes once it is due, or b'' at the end"""
+        replay = self._replay
+        record = next(replay._records, None)
+        if record is None:
+            replay.finished.set()
+            # Behave like a port that has gone quiet
+            if self._timeout:
+                time.sleep(self._timeout)
+            return b''
+        t, data = record
+        if self._start is None:
+            self._start = (time.perf_counter(), t)
+        elif replay.speed:
+            due = self._start[0] + (t - self._start[1]) / replay.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        replay._current_t = t
+        replay.records += 1
+        replay.bytes += len(data)
+        return data
+
+    def readline(self):
+        if not self._pending:
+            return self._next()
+        line, self._pending = self._pending, b''
+        return line
+
+    def read(self, size=1):
+        if not self._pending:
+            self._pending = self._next()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def close(self):
+        self.is_open = False
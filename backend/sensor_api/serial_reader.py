@@ -0,0 +1,303 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import serial
+
+from serial_framing import FRAME_SIZE, FrameDecoder, frame_readings
+
+FRAMINGS = ('ascii', 'binary')
+
+# Link states: opening the port and waiting for it to settle, reading,
+# waiting out a backoff delay after a failure, and stopped
+CONNECTING, CONNECTED, BACKOFF, STOPPED = 'connecting', 'connected', 'backoff', 'stopped'
+
+
+def map_value(value, in_min, in_max, out_min, out_max):
+    """Map a value from one range to another"""
+    return (value - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
+
+
+def parse_line(line):
+    """
+    Parse one Arduino line into a reading mapped to the frontend's range,
+    or None when the line isn't a complete reading.
+    Raw sensor: 1023 (fully dry) to 0 (maximum wet)
+    Frontend expects: 400 (driest) to 900 (wettest)
+    """
+    parts = line.split(",")
+    if len(parts) != 6:
+        return None
+    try:
+        # Get raw moisture value (0-1023) and temperature
+        raw_moisture = float(parts[5])
+        temperature_c = float(parts[1])
+    except ValueError:
+        return None
+
+    # Constrain raw moisture value
+    raw_moisture = max(0, min(1023, raw_moisture))
+
+    # Map the moisture value:
+    # Input: 1023 (dry) -> 0 (wet)
+    # Output: 400 (dry) -> 900 (wet)
+    moisture = map_value(raw_moisture, 1023, 0, 400, 900)
+
+    # Ensure temperature is within valid range
+    temperature_c = max(0, min(40, temperature_c))
+
+    return {
+        'moisture': round(moisture),  # Round to nearest integer
+        'temperature': round(temperature_c * 10) / 10  # Round to 1 decimal
+    }
+
+
+class LatencyWindow:
+    """Durations of the last size events, summarised as percentiles in ms"""
+
+    def __init__(self, size=1024):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def summary(self):
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0}
+        return {
+            "samples": len(samples),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3)
+        }
+
+
+class SerialReader:
+    """
+    Dedicated thread that owns the serial port and supervises the link. It
+    reads and parses lines continuously and appends every reading to a
+    ReadingBuffer, so request handlers never touch the port or wait for it.
+
+    When the port can't be opened or fails, it is closed and reopened after
+    a backoff delay that starts at retry_interval and doubles with every
+    consecutive failure up to max_retry_interval; the first reading after
+    a reconnect resets it. The current state (connecting, connected,
+    backoff, stopped), when the link went up or down and when the next
+    attempt is due are kept for handlers to report while the link is down.
+
+    port is a device name ('COM9', '/dev/ttyUSB0') or any pyserial URL
+    ('loop://', 'socket://host:port'). open_port can be replaced, e.g. by
+    fake_arduino.FakeSerialDevice.open, to stand in for an Arduino.
+
+    framing is 'ascii' for the CSV lines of the stock sketch or 'binary'
+    for devices sending serial_framing frames; in binary mode whatever has
+    arrived is read at once and decoded as a burst.
+
+    capture, a serial_capture.CaptureWriter, records everything read before
+    it is parsed. clock gives the timestamp of new readings (default now);
+    replays pass the capture time.
+    """
+
+    def __init__(self, port, buffer, baudrate=9600, timeout=1, retry_interval=2.0,
+                 open_port=serial.serial_for_url, settle_time=2.0, framing='ascii',
+                 max_retry_interval=60.0, capture=None, clock=None):
+        if framing not in FRAMINGS:
+            raise ValueError(f"Unknown framing {framing!r}, expected one of {FRAMINGS}")
+        self.port = port
+        self.buffer = buffer
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.open_port = open_port
+        self.settle_time = settle_time
+        self.framing = framing
+        self.decoder = FrameDecoder() if framing == 'binary' else None
+        self.capture = capture
+        self.clock = clock
+        # Called with each new reading from the reader thread
+        self.listeners = []
+        # Called with link() whenever the link goes up or down
+        self.link_listeners = []
+
+        self._connection = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+        self.state = STOPPED
+        self.state_since = datetime.now()
+        self.next_attempt_at = None
+        self.failures = 0
+        self.lines = 0
+        self.parse_errors = 0
+        self.reconnects = 0
+        self.last_error = None
+        # Time blocked in read() until data arrived, and time to parse and publish it
+        self.read_latency = LatencyWindow()
+        self.handle_latency = LatencyWindow()
+
+    @property
+    def connected(self):
+        return self.state == CONNECTED
+
+    def _set_state(self, state):
+        # state_since is when the link last went up or down, not when a
+        # retry started
+        changed = (state == CONNECTED) != self.connected or (state == STOPPED and self.state != STOPPED)
+        if changed:
+            self.state_since = datetime.now()
+        self.state = state
+        if changed:
+            link = self.link()
+            for listener in self.link_listeners:
+                try:
+                    listener(link)
+                except Exception as e:
+                    logging.error(f"Link listener failed on {self.port}: {e}")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=f"serial-{self.port}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close()
+        self._set_state(STOPPED)
+        if self.capture is not None:
+            self.capture.close()
+
+    def _open(self):
+        connection = self.open_port(self.port, baudrate=self.baudrate, timeout=self.timeout)
+        self._stopping.wait(self.settle_time)  # Give time for connection to stabilize
+        return connection
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except serial.SerialException:
+                pass
+
+    def _back_off(self, error, action):
+        """Record a failure, close the port and wait before the next attempt"""
+        self.last_error = str(error)
+        self.failures += 1
+        delay = min(self.max_retry_interval, self.retry_interval * 2 ** (self.failures - 1))
+        logging.error(f"Error {action} serial port {self.port}: {error} (retrying in {delay:.1f}s)")
+        self._close()
+        self.next_attempt_at = datetime.now().timestamp() + delay
+        self._set_state(BACKOFF)
+        self._stopping.wait(delay)
+        self.next_attempt_at = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._connection is None:
+                self._set_state(CONNECTING)
+                try:
+                    self._connection = self._open()
+                except (serial.SerialException, OSError) as e:
+                    self._back_off(e, "opening")
+                    continue
+                if self.decoder is not None:
+                    self.decoder.reset()
+                self._set_state(CONNECTED)
+                logging.info(f"Serial port {self.port} opened")
+
+            start = time.perf_counter()
+            try:
+                if self.decoder is not None:
+                    # Whatever has arrived, but at least one frame's worth, so a
+                    # slow link isn't decoded a byte at a time
+                    data = self._connection.read(max(self._connection.in_waiting, FRAME_SIZE))
+                else:
+                    data = self._connection.readline()
+            except (serial.SerialException, OSError) as e:
+                self.reconnects += 1
+                self._back_off(e, "reading")
+                continue
+
+            if not data:
+                continue  # Read timed out
+            read_done = time.perf_counter()
+            self.read_latency.add(read_done - start)
+            if self.capture is not None:
+                try:
+                    self.capture.write(data)
+                except OSError as e:
+                    logging.error(f"Error capturing serial port {self.port}: {e}")
+            if self.decoder is not None:
+                published = self._handle_frames(data)
+            else:
+                published = self._handle_line(data)
+            self.handle_latency.add(time.perf_counter() - read_done)
+            if published:
+                self.failures = 0
+
+    def _handle_line(self, line):
+        self.lines += 1
+        reading = parse_line(line.decode('utf-8', errors='replace').strip())
+        if reading is None:
+            self.parse_errors += 1
+            return 0
+        self._publish(reading['moisture'], reading['temperature'])
+        return 1
+
+    def _handle_frames(self, data):
+        frames = self.decoder.feed(data)
+        if not len(frames):
+            return 0
+        moisture, temperature = frame_readings(frames)
+        for m, t in zip(moisture.tolist(), temperature.tolist()):
+            self._publish(int(m), t)
+        return len(frames)
+
+    def _publish(self, moisture, temperature):
+        timestamp = self.clock() if self.clock is not None else None
+        reading = self.buffer.append(moisture, temperature, timestamp)
+        for listener in self.listeners:
+            try:
+                listener(reading)
+            except Exception as e:
+                logging.error(f"Reading listener failed on {self.port}: {e}")
+
+    def link(self):
+        """The link's state for reporting while it is down"""
+        link = {
+            "state": self.state,
+            "since": self.state_since.isoformat(),
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
+        if self.next_attempt_at is not None:
+            link["retry_in_seconds"] = round(max(0.0, self.next_attempt_at - datetime.now().timestamp()), 1)
+        return link
+
+    def stats(self):
+        stats = {
+            "port": self.port,
+            "framing": self.framing,
+            "connected": self.connected,
+            "link": self.link(),
+            "lines": self.lines,
+            "readings": self.buffer.total,
+            "parse_errors": self.parse_errors,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "read_latency": self.read_latency.summary(),
+            "handle_latency": self.handle_latency.summary()
+        }
+        if self.decoder is not None:
+            stats["frames"] = self.decoder.stats()
+        if self.capture is not None:
+            stats["capture"] = self.capture.stats()
+        return stats
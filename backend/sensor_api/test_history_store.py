@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from history_store import HistoryStore
+
+START = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def fill(store, sensor_id, seconds):
+    """One reading per second; moisture counts up so sums are easy to check"""
+    for i in range(seconds):
+        store.append(sensor_id, START + timedelta(seconds=i), 400 + i % 500, 20.0)
+    store.flush()
+
+
+def query_all(store, sensor_id, resolution):
+    return store.query(sensor_id, START, START + timedelta(days=1), resolution)[1]
+
+
+@pytest.mark.parametrize('seconds', [5000, 3000])
+def test_reopened_store_answers_every_resolution(tmp_path, seconds):
+    store = HistoryStore(str(tmp_path))
+    fill(store, 'sensor-1', seconds)
+    expected = {resolution: query_all(store, 'sensor-1', resolution) for resolution in ('raw', '1m', '1h')}
+
+    reopened = HistoryStore(str(tmp_path))
+    for resolution, records in expected.items():
+        got = query_all(reopened, 'sensor-1', resolution)
+        np.testing.assert_array_equal(got, records)
+
+    assert len(expected['raw']) == seconds
+    assert len(expected['1m']) == -(-seconds // 60)
+    assert len(expected['1h']) == -(-seconds // 3600)
+    assert expected['1m']['count'].sum() == seconds
+    assert expected['1h']['count'].sum() == seconds
+
+
+def test_reopened_store_keeps_appending_to_the_open_bucket(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    fill(store, 'sensor-1', 90)
+
+    reopened = HistoryStore(str(tmp_path))
+    reopened.append('sensor-1', START + timedelta(seconds=90), 400, 20.0)
+    minutes = query_all(reopened, 'sensor-1', '1m')
+    assert list(minutes['count']) == [60, 31]
+
+
+def test_unknown_sensor_is_empty(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    assert len(query_all(store, 'sensor-9', '1m')) == 0
+    assert store.sensors() == []
+
+
+def test_query_range_cuts_raw_readings(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    fill(store, 'sensor-1', 600)
+    resolution, records = store.query('sensor-1', START + timedelta(seconds=100), START + timedelta(seconds=200))
+    assert resolution == 'raw'
+    assert records['t'][0] == (START + timedelta(seconds=100)).timestamp()
+    assert len(records) == 100
@@ -0,0 +1,42 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import mock_sensor_server
+from sensor_fleet import SensorFleet
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fleet = SensorFleet(10, seed=0, profile='none')
+    monkeypatch.setattr(mock_sensor_server, 'fleet', fleet)
+    return fleet
+
+
+@pytest.fixture
+def client(fleet):
+    return TestClient(mock_sensor_server.app)
+
+
+def test_fleet_page(client):
+    body = client.get('/api/fleet/readings', params={'offset': 8, 'at': '2024-06-01T12:00:00Z'}).json()
+    assert [entry['sensor'] for entry in body['readings']] == ['sensor-9', 'sensor-10']
+    assert body['offline'] == []
+
+
+@pytest.mark.parametrize('path', ['/api/fleet/readings', '/api/sensors'])
+def test_page_past_the_end_is_empty(client, path):
+    response = client.get(path, params={'offset': 50})
+    assert response.status_code == 200
+    body = response.json()
+    assert body.get('readings', body.get('sensors')) == []
+
+
+def test_all_offline_page_is_empty(client, fleet):
+    fleet.offline[:] = True
+    response = client.post('/api/fleet/readings', json={'sensors': ['sensor-1', 'sensor-2']})
+    assert response.status_code == 200
+    assert response.json()['readings'] == []
+    assert response.json()['offline'] == ['sensor-1', 'sensor-2']
+
+    sensors = client.get('/api/sensors', params={'offset': 3, 'limit': 1}).json()['sensors']
+    assert sensors == [{'id': 'sensor-4', 'connected': False, 'current': None}]
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from fake_arduino import FakeSerialDevice
+from reading_buffer import ReadingBuffer
+from serial_framing import encode_frame
+from serial_reader import BACKOFF, CONNECTED, CONNECTING, STOPPED, SerialReader, parse_line
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the serial reader")
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def device():
+    return FakeSerialDevice()
+
+
+@pytest.fixture
+def make_reader(device):
+    readers = []
+
+    def make(**options):
+        options = dict(dict(timeout=0.05, settle_time=0, retry_interval=0.05, max_retry_interval=0.4), **options)
+        reader = SerialReader('fake', ReadingBuffer(), open_port=device.open, **options)
+        readers.append(reader)
+        return reader
+
+    yield make
+    for reader in readers:
+        reader.stop()
+
+
+def test_parse_line_maps_to_the_frontend_range():
+    assert parse_line("0,23.4,0,0,0,1023") == {'moisture': 400, 'temperature': 23.4}
+    assert parse_line("0,45.0,0,0,0,0") == {'moisture': 900, 'temperature': 40}
+    assert parse_line("0,23.4,0,0") is None
+    assert parse_line("0,abc,0,0,0,512") is None
+
+
+def test_readings_reach_buffer_and_listeners(device, make_reader):
+    reader = make_reader()
+    seen = []
+    reader.listeners.append(seen.append)
+    reader.start()
+    wait_for(lambda: reader.connected)
+
+    device.send(b"0,23.4,0,0,0,512\r\n0,bad\r\n0,24.0,0,0,0,1023\r\n")
+    wait_for(lambda: reader.lines == 3)
+    assert [(r['moisture'], r['temperature']) for r in seen] == [(650, 23.4), (400, 24.0)]
+    assert reader.buffer.latest() is seen[-1]
+    assert reader.parse_errors == 1
+
+
+def test_binary_frames_are_decoded_in_bursts(device, make_reader):
+    reader = make_reader(framing='binary')
+    seen = []
+    reader.listeners.append(seen.append)
+    reader.start()
+    wait_for(lambda: reader.connected)
+
+    device.send(b''.join(encode_frame(i, 1023 - i, 20 + i / 10) for i in range(50)))
+    wait_for(lambda: len(seen) == 50)
+    assert seen[0]['moisture'] == 400
+    assert [r['temperature'] for r in seen[:3]] == [20.0, 20.1, 20.2]
+
+
+def test_unplugged_device_backs_off_then_reconnects(device, make_reader):
+    device.unplug()
+    reader = make_reader()
+    links = []
+    reader.link_listeners.append(links.append)
+    reader.start()
+
+    wait_for(lambda: len(device.open_attempts) >= 4)
+    assert reader.state in (BACKOFF, CONNECTING)
+    assert reader.failures >= 3
+    gaps = [b - a for a, b in zip(device.open_attempts, device.open_attempts[1:4])]
+    # 0.05s, then doubling
+    for gap, delay in zip(gaps, (0.05, 0.1, 0.2)):
+        assert gap >= delay * 0.9
+
+    device.plug()
+    wait_for(lambda: reader.connected)
+    # Failures are only forgiven once a reading gets through
+    assert reader.failures >= 3
+    device.send(b"0,23.4,0,0,0,512\r\n")
+    wait_for(lambda: reader.buffer.total == 1)
+    assert reader.failures == 0
+    assert [link['state'] for link in links][-1] == CONNECTED
+
+
+def test_unplug_while_connected_reconnects(device, make_reader):
+    reader = make_reader()
+    links = []
+    reader.link_listeners.append(links.append)
+    reader.start()
+    wait_for(lambda: reader.connected)
+    device.send(b"0,23.4,0,0,0,512\r\n")
+    wait_for(lambda: reader.buffer.total == 1)
+
+    device.unplug()
+    wait_for(lambda: reader.reconnects == 1)
+    assert not reader.connected
+    assert "disconnected" in reader.last_error
+
+    device.plug()
+    wait_for(lambda: reader.connected)
+    device.send(b"0,24.0,0,0,0,512\r\n")
+    wait_for(lambda: reader.buffer.total == 2)
+    assert reader.failures == 0
+
+    reader.stop()
+    states = [link['state'] for link in links]
+    # Link listeners hear when the link goes up or down, not every retry
+    assert states == [CONNECTED, BACKOFF, CONNECTED, STOPPED]
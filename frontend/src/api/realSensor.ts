@@ -1,8 +1,20 @@
 import axios from 'axios';
 import { SensorData } from '../types';
 
+const SENSOR_API_URL = 'http://localhost:8001/api';
+
+// Server-sent events pushing every new reading of one sensor and its link
+// state (see sensor_api.py /api/stream)
+export const sensorStreamUrl = (sensor: string) =>
+  `${SENSOR_API_URL}/stream?sensor=${encodeURIComponent(sensor)}`;
+
+// A current reading, with the sensor the API read it from
+export interface CurrentReading extends SensorData {
+  sensor?: string;
+}
+
 const sensorApiClient = axios.create({
-  baseURL: 'http://localhost:8001/api',
+  baseURL: SENSOR_API_URL,
   timeout: 5000,
   headers: {
     'Content-Type': 'application/json',
@@ -10,9 +22,9 @@ const sensorApiClient = axios.create({
 });
 
 export const realSensorApi = {
-  async getCurrentReading(): Promise<SensorData> {
+  async getCurrentReading(): Promise<CurrentReading> {
     try {
-      const response = await sensorApiClient.get<SensorData>('/getCurrentReading');
+      const response = await sensorApiClient.get<CurrentReading>('/getCurrentReading');
       
       if (!response.data) {
         throw new Error('No data received from sensor');
@@ -1,10 +1,11 @@
 import { useState, useEffect, useCallback } from 'react';
 import { SensorData } from '../types';
 //import { mockSensorApi as sensorApi } from '../api/mockSensor';
-import { realSensorApi as sensorApi } from '../api/realSensor';
+import { realSensorApi as sensorApi, sensorStreamUrl } from '../api/realSensor';
 import toast from 'react-hot-toast';
 
-const POLLING_INTERVAL = 10000; // 10 seconds in milliseconds
+const POLLING_INTERVAL = 10000; // 10 seconds in milliseconds, when the stream is unavailable
+const STALE_AFTER = 30000; // A streamed reading older than this is flagged as out of date
 
 export function useRealtimeSensor() {
   const [data, setData] = useState<SensorData | null>(null);
@@ -13,12 +14,14 @@ export function useRealtimeSensor() {
   const [lastUpdate, setLastUpdate] = useState<string | null>(null);
   const [isManualFetching, setIsManualFetching] = useState(false);
 
-  const fetchSensorData = useCallback(async () => {
+  // Returns the sensor the reading came from, if the API says which
+  const fetchSensorData = useCallback(async (): Promise<string | undefined> => {
     try {
-      const response = await sensorApi.getCurrentReading();
-      setData(response);
+      const { moisture, temperature, sensor } = await sensorApi.getCurrentReading();
+      setData({ moisture, temperature });
       setLastUpdate(new Date().toISOString());
       setError(null);
+      return sensor;
     } catch (err) {
       setError(err instanceof Error ? err : new Error('Failed to fetch sensor data'));
       toast.error('Failed to update sensor data');
@@ -35,26 +38,86 @@ export function useRealtimeSensor() {
 
   useEffect(() => {
     let mounted = true;
-    let intervalId: NodeJS.Timeout;
+    let intervalId: NodeJS.Timeout | undefined;
+    let staleCheckId: NodeJS.Timeout | undefined;
+    let stream: EventSource | null = null;
 
+    const startPolling = () => {
+      intervalId = setInterval(async () => {
+        if (!mounted) return;
+        const sensor = await fetchSensorData();
+        if (sensor && mounted && typeof EventSource !== 'undefined') {
+          clearInterval(intervalId);
+          openStream(sensor);
+        }
+      }, POLLING_INTERVAL);
+    };
+
+    // Readings of the sensor getCurrentReading reads are pushed by the
+    // sensor API; EventSource reconnects and resumes on its own. A 'link'
+    // event says the sensor went away, and a reading that stops arriving is
+    // flagged, so the last value isn't shown as current forever.
+    const openStream = (sensor: string) => {
+      let lastReadingAt = Date.now();
+      let flagged = false;
+      stream = new EventSource(sensorStreamUrl(sensor));
+      stream.addEventListener('reading', (event) => {
+        if (!mounted) return;
+        const { moisture, temperature, timestamp } = JSON.parse((event as MessageEvent).data);
+        lastReadingAt = Date.now();
+        flagged = false;
+        setData({ moisture, temperature });
+        setLastUpdate(timestamp ?? new Date().toISOString());
+        setError(null);
+        setIsLoading(false);
+      });
+      stream.addEventListener('link', (event) => {
+        if (!mounted) return;
+        const { state, last_error } = JSON.parse((event as MessageEvent).data);
+        if (state === 'connected') {
+          // Give the sensor a full window to send its next reading
+          lastReadingAt = Date.now();
+          flagged = false;
+          setError(null);
+          return;
+        }
+        flagged = true;
+        setError(new Error(`Sensor disconnected: ${last_error ?? state}`));
+        toast.error('Sensor disconnected');
+      });
+      staleCheckId = setInterval(() => {
+        if (!mounted || flagged || Date.now() - lastReadingAt < STALE_AFTER) return;
+        flagged = true;
+        setError(new Error('No new sensor reading'));
+        toast.error('Sensor data is out of date');
+      }, STALE_AFTER / 6);
+      stream.onerror = () => {
+        if (stream && stream.readyState === EventSource.CLOSED && mounted) {
+          stream = null;
+          clearInterval(staleCheckId);
+          startPolling();
+        }
+      };
+    };
+
+    // The initial fetch says which sensor to stream; poll until it does
     const initializeSensor = async () => {
-      if (mounted) {
-        await fetchSensorData();
+      const sensor = await fetchSensorData();
+      if (!mounted) return;
+      if (sensor && typeof EventSource !== 'undefined') {
+        openStream(sensor);
+      } else {
+        startPolling();
       }
     };
 
     initializeSensor();
 
-    // Set up polling
-    intervalId = setInterval(() => {
-      if (mounted) {
-        fetchSensorData();
-      }
-    }, POLLING_INTERVAL);
-
     return () => {
       mounted = false;
+      stream?.close();
       clearInterval(intervalId);
+      clearInterval(staleCheckId);
     };
   }, [fetchSensorData]);
 
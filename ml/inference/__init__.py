@@ -0,0 +1,11 @@
+"""Model inference helpers shared by training, validation and the APIs"""
+from .feature_encoder import FeatureEncoder, FEATURE_COLUMNS, encoder_path
+from .flat_forest import FlatForest, forest_path, check_parity
+from .forest_compaction import compact_forest, COMPACTION_LEVELS, LOSSLESS_LEVELS
+from .decision_table import DecisionTable, table_path
+from .serving import ServingModel, load_serving_model, artifact_fingerprint
+from .model_registry import (
+    ModelRegistry, CANARY_READINGS, CANARY_TOLERANCE, canary_arrays, check_canaries, crop_model_path,
+    load_newest_valid
+)
+from .decisions import IRRIGATION_THRESHOLD, decide
@@ -0,0 +1,101 @@
+import json
+import os
+import numpy as np
+
+# Sensor grid: both sensor APIs round moisture to an integer and temperature
+# to 0.1 C, and SensorData bounds them to 400-900 and 0-40
+MOISTURE_MIN, MOISTURE_MAX = 400, 900
+TEMP_MIN_TENTHS, TEMP_MAX_TENTHS = 0, 400
+GRID_SHAPE = (MOISTURE_MAX - MOISTURE_MIN + 1, TEMP_MAX_TENTHS - TEMP_MIN_TENTHS + 1)
+
+
+def table_path(model_path):
+    """Location of the decision table built next to a model artifact"""
+    return f"{os.path.splitext(model_path)[0]}.table"
+
+
+def grid_readings():
+    """Moisture and temperature of every grid cell, in table order"""
+    moisture, temp_tenths = np.meshgrid(
+        np.arange(MOISTURE_MIN, MOISTURE_MAX + 1),
+        np.arange(TEMP_MIN_TENTHS, TEMP_MAX_TENTHS + 1),
+        indexing='ij'
+    )
+    return moisture.ravel().astype(float), temp_tenths.ravel() / 10
+
+
+class DecisionTable:
+    """
+    Irrigation probability precomputed for every reading on the sensor grid.
+
+    Lookups only hit the table when a reading is exactly a grid value
+    (integer moisture, temperature with one decimal); anything else is
+    reported as off-grid so the caller can fall back to the model.
+    """
+
+    def __init__(self, probabilities, fingerprint=None):
+        if probabilities.shape != GRID_SHAPE:
+            raise ValueError(f"Expected a {GRID_SHAPE} table, got {probabilities.shape}")
+        self.probabilities = probabilities
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, predict_positive, fingerprint=None):
+        """Score the whole grid with predict_positive(moisture, temperature)"""
+        moisture, temperature = grid_readings()
+        probabilities = np.asarray(predict_positive(moisture, temperature), dtype=np.float64)
+        return cls(probabilities.reshape(GRID_SHAPE), fingerprint)
+
+    def lookup(self, moisture, temperature):
+        """Probability for one reading, or None when it is not on the grid"""
+        moisture_index = int(round(moisture))
+        temp_tenths = int(round(temperature * 10))
+        if moisture_index != moisture or temp_tenths / 10 != temperature:
+            return None
+
+        moisture_index -= MOISTURE_MIN
+        temp_tenths -= TEMP_MIN_TENTHS
+        if 0 <= moisture_index < GRID_SHAPE[0] and 0 <= temp_tenths < GRID_SHAPE[1]:
+            return float(self.probabilities[moisture_index, temp_tenths])
+        return None
+
+    def lookup_batch(self, moisture, temperature):
+        """
+        Probabilities for many readings; off-grid readings get NaN and are
+        flagged False in the returned mask.
+        """
+        moisture = np.asarray(moisture, dtype=float)
+        temperature = np.asarray(temperature, dtype=float)
+
+        moisture_index = np.rint(moisture)
+        temp_tenths = np.rint(temperature * 10)
+        on_grid = (
+            (moisture_index == moisture) & (temp_tenths / 10 == temperature) &
+            (moisture_index >= MOISTURE_MIN) & (moisture_index <= MOISTURE_MAX) &
+            (temp_tenths >= TEMP_MIN_TENTHS) & (temp_tenths <= TEMP_MAX_TENTHS)
+        )
+
+        probabilities = np.full(len(moisture), np.nan)
+        probabilities[on_grid] = self.probabilities[
+            moisture_index[on_grid].astype(np.intp) - MOISTURE_MIN,
+            temp_tenths[on_grid].astype(np.intp) - TEMP_MIN_TENTHS
+        ]
+        return probabilities, on_grid
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'probabilities.npy'), self.probabilities)
+        with open(os.path.join(path, 'table.json'), 'w') as f:
+            json.dump({
+                'fingerprint': self.fingerprint,
+                'moisture_range': [MOISTURE_MIN, MOISTURE_MAX],
+                'temperature_range': [TEMP_MIN_TENTHS / 10, TEMP_MAX_TENTHS / 10],
+                'temperature_step': 0.1
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        with open(os.path.join(path, 'table.json')) as f:
+            header = json.load(f)
+        probabilities = np.asarray(np.load(os.path.join(path, 'probabilities.npy'), mmap_mode=mmap_mode))
+        return cls(probabilities, header.get('fingerprint'))
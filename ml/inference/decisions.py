@@ -0,0 +1,21 @@
+import numpy as np
+
+# Probability of needing irrigation at or above which a reading is
+# irrigated. Every service that turns probabilities into decisions uses
+# this one value, so they can't disagree on the same reading
+IRRIGATION_THRESHOLD = 0.6
+
+
+def decide(probability, threshold=IRRIGATION_THRESHOLD):
+    """
+    Apply the threshold to a probability or an array of probabilities.
+    Returns need_irrigation and the confidence, the probability of the
+    decided class; a scalar (NumPy or not) gives plain bool and float.
+    """
+    if np.ndim(probability) == 0:
+        probability = float(probability)
+        need_irrigation = probability >= threshold
+        return bool(need_irrigation), probability if need_irrigation else 1 - probability
+
+    need_irrigation = probability >= threshold
+    return need_irrigation, np.where(need_irrigation, probability, 1 - probability)
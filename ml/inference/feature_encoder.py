@@ -0,0 +1,137 @@
+import json
+import os
+import numpy as np
+
+# Column order of the feature matrix the irrigation models are trained on
+MOISTURE_BIN_COLUMNS = ['moisture_low', 'moisture_medium_low',
+                        'moisture_medium_high', 'moisture_high']
+TEMP_BIN_COLUMNS = ['temp_cold', 'temp_optimal', 'temp_hot']
+NUMERICAL_COLUMNS = [
+    'moisture_normalized', 'temp_normalized',
+    'moisture', 'temp', 'moisture_temp_interaction'
+]
+FEATURE_COLUMNS = NUMERICAL_COLUMNS + MOISTURE_BIN_COLUMNS + TEMP_BIN_COLUMNS
+
+# Wheat sensor range used for moisture normalization
+MOISTURE_RANGE = (400, 900)
+
+
+def encoder_path(model_path):
+    """Location of the encoder saved next to a model artifact"""
+    return f"{os.path.splitext(model_path)[0]}.encoder.json"
+
+
+class FeatureEncoder:
+    """
+    Turns raw moisture/temperature arrays into the 12-column model input.
+
+    All parameters (bin edges, normalization ranges, column order) are fixed
+    when the encoder is built, so the same readings always encode the same way
+    no matter how many rows are transformed together.
+    """
+
+    def __init__(self, moisture_edges, temp_edges, temp_range=None, right_closed=True,
+                 moisture_range=MOISTURE_RANGE, feature_columns=FEATURE_COLUMNS):
+        if list(feature_columns) != FEATURE_COLUMNS:
+            raise ValueError(f"Unsupported feature layout: {list(feature_columns)}")
+        if len(moisture_edges) != len(MOISTURE_BIN_COLUMNS) - 1:
+            raise ValueError(f"Expected {len(MOISTURE_BIN_COLUMNS) - 1} moisture bin edges")
+        if len(temp_edges) != len(TEMP_BIN_COLUMNS) - 1:
+            raise ValueError(f"Expected {len(TEMP_BIN_COLUMNS) - 1} temperature bin edges")
+
+        self.moisture_edges = np.asarray(moisture_edges, dtype=float)
+        self.temp_edges = np.asarray(temp_edges, dtype=float)
+        self.temp_range = None if temp_range is None else tuple(float(v) for v in temp_range)
+        self.right_closed = bool(right_closed)
+        self.moisture_range = tuple(float(v) for v in moisture_range)
+        self.feature_columns = list(FEATURE_COLUMNS)
+
+        # Precompute the min-max terms used by transform
+        self._moisture_offset = self.moisture_range[0]
+        self._moisture_span = self.moisture_range[1] - self.moisture_range[0]
+        if self.temp_range is not None and self.temp_range[1] > self.temp_range[0]:
+            self._temp_offset = self.temp_range[0]
+            self._temp_span = self.temp_range[1] - self.temp_range[0]
+        else:
+            # Min-max scaling without a known range is 0/0
+            self._temp_offset = 0.0
+            self._temp_span = np.nan
+
+    @classmethod
+    def fit(cls, moisture, temp):
+        """
+        Derive the encoder from training data: moisture quartile edges (as
+        pd.qcut), fixed temperature bands (as pd.cut) and the observed
+        temperature range for normalization.
+        """
+        moisture = np.asarray(moisture, dtype=float)
+        temp = np.asarray(temp, dtype=float)
+        return cls(
+            moisture_edges=np.quantile(moisture, [0.25, 0.5, 0.75]),
+            temp_edges=[15, 25],
+            temp_range=(temp.min(), temp.max()),
+            right_closed=True
+        )
+
+    @classmethod
+    def serving_default(cls):
+        """
+        The layout the API has always used for models shipped without a saved
+        encoder: fixed 550/700/850 moisture bands, left-closed bins and no
+        temperature range, so temp_normalized is NaN.
+        """
+        return cls(
+            moisture_edges=[550, 700, 850],
+            temp_edges=[15, 25],
+            temp_range=None,
+            right_closed=False
+        )
+
+    def transform(self, moisture, temp):
+        """Encode readings into a float64 matrix with FEATURE_COLUMNS order"""
+        moisture = np.asarray(moisture, dtype=float).reshape(-1)
+        temp = np.asarray(temp, dtype=float).reshape(-1)
+        n_rows = len(moisture)
+        if len(temp) != n_rows:
+            raise ValueError("moisture and temp must have the same length")
+
+        features = np.zeros((n_rows, len(FEATURE_COLUMNS)))
+
+        # Numerical features
+        features[:, 0] = (moisture - self._moisture_offset) / self._moisture_span * 100
+        features[:, 1] = (temp - self._temp_offset) / self._temp_span
+        features[:, 2] = moisture
+        features[:, 3] = temp
+        features[:, 4] = features[:, 0] * features[:, 1]
+
+        # One-hot bins; values outside the edges fall into the outer bins
+        rows = np.arange(n_rows)
+        moisture_bin = np.digitize(moisture, self.moisture_edges, right=self.right_closed)
+        temp_bin = np.digitize(temp, self.temp_edges, right=self.right_closed)
+        features[rows, len(NUMERICAL_COLUMNS) + moisture_bin] = 1
+        features[rows, len(NUMERICAL_COLUMNS) + len(MOISTURE_BIN_COLUMNS) + temp_bin] = 1
+
+        return features
+
+    def to_dict(self):
+        return {
+            'feature_columns': self.feature_columns,
+            'moisture_edges': self.moisture_edges.tolist(),
+            'temp_edges': self.temp_edges.tolist(),
+            'temp_range': None if self.temp_range is None else list(self.temp_range),
+            'right_closed': self.right_closed,
+            'moisture_range': list(self.moisture_range)
+        }
+
+    @classmethod
+    def from_dict(cls, params):
+        return cls(**params)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
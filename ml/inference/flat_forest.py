@@ -0,0 +1,260 @@
+import json
+import os
+import numpy as np
+
+from .feature_encoder import FeatureEncoder
+
+# Per-node arrays making up a flattened forest, saved one .npy file each
+NODE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value')
+
+# Rows walked together; small chunks keep the (rows x trees) working arrays in cache
+CHUNK_ROWS = 256
+
+
+def forest_path(model_path):
+    """Location of the flattened forest exported next to a model artifact"""
+    return f"{os.path.splitext(model_path)[0]}.forest"
+
+
+def fold_thresholds(threshold, mean, scale):
+    """
+    Move split thresholds from scaled space into raw feature space.
+
+    sklearn compares float32((x - mean) / scale) <= threshold, so the plain
+    threshold * scale + mean can land an ulp on the wrong side of inputs that
+    sit exactly on a split point (e.g. 20.5 C). Because that comparison is
+    monotone in x, bisection finds the largest raw float64 T for which it
+    still holds, making x <= T exactly equivalent.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    guess = threshold * scale + mean
+    step = (np.abs(threshold) + 1) * scale * 1e-6
+    lo, hi = guess - step, guess + step
+
+    # Widen the bracket until lo goes left and hi goes right
+    while True:
+        lo_bad, hi_bad = ~goes_left(lo), goes_left(hi)
+        if not (lo_bad.any() or hi_bad.any()):
+            break
+        step = step * 2
+        lo = np.where(lo_bad, lo - step, lo)
+        hi = np.where(hi_bad, hi + step, hi)
+
+    # Halving a float64 interval reaches adjacent values well within 128 steps
+    for _ in range(128):
+        mid = lo + (hi - lo) / 2
+        left = goes_left(mid)
+        lo = np.where(left, mid, lo)
+        hi = np.where(left, hi, mid)
+
+    return lo
+
+
+class FlatForest:
+    """
+    A fitted Random Forest flattened into contiguous node arrays.
+
+    All trees live in one set of arrays indexed by absolute node id. Leaves
+    point to themselves, so every row can be walked through every tree in
+    lock-step for max_depth vectorized steps without per-tree Python calls.
+    The StandardScaler of the training pipeline is folded into the split
+    thresholds, so raw encoder output goes straight in. Compacted forests
+    (see forest_compaction) may store narrower dtypes and quantized leaf
+    values, which value_scale maps back to probabilities.
+    """
+
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots,
+                 max_depth, encoder=None, metadata=None, value_scale=1.0):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value  # Probability of class 1 at each node, times 1 / value_scale
+        self.value_scale = float(value_scale)
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.encoder = encoder
+        self.metadata = metadata or {}
+        self.classes_ = np.array([0, 1])
+
+        # Interleaved children so one gather picks the branch: [2n] right, [2n + 1] left
+        self._children = np.empty(2 * len(left), dtype=np.int64)
+        self._children[0::2] = right
+        self._children[1::2] = left
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        """Memory held by the node arrays, including the derived child index"""
+        return sum(getattr(self, name).nbytes for name in NODE_ARRAYS + ('roots', '_children'))
+
+    @classmethod
+    def from_pipeline(cls, pipeline, encoder=None):
+        """Flatten a trained (scaler ->) RandomForestClassifier pipeline"""
+        steps = getattr(pipeline, 'named_steps', {'classifier': pipeline})
+        forest = steps['classifier']
+        scaler = steps.get('scaler')
+
+        if list(forest.classes_) != [0, 1]:
+            raise ValueError(f"Expected binary classes [0, 1], got {list(forest.classes_)}")
+
+        n_features = forest.n_features_in_
+        mean = np.zeros(n_features) if scaler is None or scaler.mean_ is None else scaler.mean_
+        scale = np.ones(n_features) if scaler is None or scaler.scale_ is None else scaler.scale_
+
+        parts = {name: [] for name in NODE_ARRAYS}
+        roots = []
+        offset = 0
+        max_depth = 0
+
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+            feature = np.where(is_leaf, 0, tree.feature)
+
+            # Fold the scaler so raw features can be compared directly
+            threshold = np.where(
+                is_leaf, 0.0,
+                fold_thresholds(np.where(is_leaf, 0.0, tree.threshold), mean[feature], scale[feature])
+            )
+
+            parts['feature'].append(feature)
+            parts['threshold'].append(threshold)
+            parts['left'].append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            parts['right'].append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            parts['missing_left'].append(tree.missing_go_to_left.astype(bool))
+            # sklearn stores class fractions per node for classifiers
+            values = tree.value[:, 0, :]
+            parts['value'].append(values[:, 1] / values.sum(axis=1))
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(parts['feature']).astype(np.int32),
+            threshold=np.concatenate(parts['threshold']).astype(np.float64),
+            left=np.concatenate(parts['left']).astype(np.int32),
+            right=np.concatenate(parts['right']).astype(np.int32),
+            missing_left=np.concatenate(parts['missing_left']),
+            value=np.concatenate(parts['value']).astype(np.float64),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth,
+            encoder=encoder,
+            metadata={'n_features': int(n_features)}
+        )
+
+    def predict_positive(self, X):
+        """Probability of class 1 for each row of the feature matrix"""
+        return self._chunked(self._walk, X)
+
+    def tree_probabilities(self, X):
+        """Class-1 probability from each tree separately, shape (n_rows, n_trees)"""
+        leaves = self._chunked(self._leaves, X)
+        return np.take(self.value, leaves) * self.value_scale
+
+    def _chunked(self, walk, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if len(X) <= CHUNK_ROWS:
+            return walk(X)
+        return np.concatenate([walk(X[i:i + CHUNK_ROWS]) for i in range(0, len(X), CHUNK_ROWS)])
+
+    def _walk(self, X):
+        """Mean leaf value over all trees for each row"""
+        probabilities = np.take(self.value, self._leaves(X)).mean(axis=1, dtype=np.float64)
+        if self.value_scale != 1.0:
+            probabilities *= self.value_scale
+        return probabilities
+
+    def _leaves(self, X):
+        """Route every row through every tree at once, one level per step"""
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.int64) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots.astype(np.int64), (n_rows, self.n_trees))
+        has_missing = np.isnan(flat_X).any()
+
+        for _ in range(self.max_depth):
+            x = np.take(flat_X, row_offsets + np.take(self.feature, nodes))
+            go_left = x <= np.take(self.threshold, nodes)
+            if has_missing:
+                go_left |= np.isnan(x) & np.take(self.missing_left, nodes)
+            nodes = np.take(self._children, 2 * nodes + go_left)
+
+        return nodes
+
+    def predict_proba(self, X):
+        """Class probabilities in the same (n_rows, 2) layout as sklearn"""
+        positive = self.predict_positive(X)
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_positive(X) >= 0.5).astype(int)
+
+    def save(self, path):
+        """Write the node arrays as .npy files plus a JSON header in a directory"""
+        os.makedirs(path, exist_ok=True)
+        for name in NODE_ARRAYS + ('roots',):
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+
+        header = {
+            'max_depth': self.max_depth,
+            'n_trees': self.n_trees,
+            'n_nodes': self.n_nodes,
+            'value_scale': self.value_scale,
+            'encoder': None if self.encoder is None else self.encoder.to_dict(),
+            'metadata': self.metadata
+        }
+        with open(os.path.join(path, 'forest.json'), 'w') as f:
+            json.dump(header, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load a saved forest; mmap_mode='r' maps the arrays instead of reading them"""
+        with open(os.path.join(path, 'forest.json')) as f:
+            header = json.load(f)
+
+        # asarray drops the memmap subclass (not the mapping) so lookups stay plain ndarray ops
+        arrays = {
+            name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode))
+            for name in NODE_ARRAYS + ('roots',)
+        }
+        encoder = header.get('encoder')
+        return cls(
+            **arrays,
+            max_depth=header['max_depth'],
+            encoder=None if encoder is None else FeatureEncoder.from_dict(encoder),
+            metadata=header.get('metadata'),
+            value_scale=header.get('value_scale', 1.0)
+        )
+
+
+def check_parity(pipeline, forest, X, tolerance=1e-9):
+    """
+    Compare the flattened forest against the original pipeline on X.
+    Returns the largest absolute difference in class-1 probability.
+    """
+    expected = pipeline.predict_proba(X)[:, 1]
+    actual = forest.predict_positive(X)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    if max_diff > tolerance:
+        raise AssertionError(
+            f"Flattened forest differs from the pipeline by {max_diff:.3g} (tolerance {tolerance:.3g})"
+        )
+    return max_diff
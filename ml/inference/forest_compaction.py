@@ -0,0 +1,230 @@
+import numpy as np
+
+from .flat_forest import FlatForest
+from .decision_table import grid_readings
+
+# Compaction levels, each building on the previous one:
+#   exact      the forest as exported, bit-for-bit equal to the pipeline
+#   merged     splits whose two leaves predict the same value removed (lossless)
+#   float32    float32 thresholds and leaf values, smallest index dtypes
+#   quantized  leaf values stored as 8-bit fractions, then merged again
+#   trees-N    only the N trees whose average best tracks the full forest
+COMPACTION_LEVELS = {
+    'exact': {},
+    'merged': {'merge_leaves': True},
+    'float32': {'merge_leaves': True, 'dtype': 'float32'},
+    'quantized': {'merge_leaves': True, 'dtype': 'quantized'},
+    'trees-50': {'merge_leaves': True, 'dtype': 'quantized', 'n_trees': 50},
+    'trees-25': {'merge_leaves': True, 'dtype': 'quantized', 'n_trees': 25},
+    'trees-10': {'merge_leaves': True, 'dtype': 'quantized', 'n_trees': 10},
+}
+
+# Levels that leave every prediction unchanged
+LOSSLESS_LEVELS = ('exact', 'merged')
+
+VALUE_LEVELS = 255
+
+
+def reference_features(encoder, temp_step_tenths=1):
+    """Encoded sensor grid readings (every moisture, temperature every step tenths of a degree)"""
+    moisture, temperature = grid_readings()
+    keep = np.rint(temperature * 10).astype(int) % temp_step_tenths == 0
+    return encoder.transform(moisture[keep], temperature[keep])
+
+
+def _max_depth(left, right, roots):
+    frontier = np.asarray(roots, dtype=np.int64)
+    depth = 0
+    while True:
+        internal = frontier[left[frontier] != frontier]
+        if not len(internal):
+            return depth
+        frontier = np.concatenate([left[internal], right[internal]])
+        depth += 1
+
+
+def _reachable(left, right, roots):
+    reachable = np.zeros(len(left), dtype=bool)
+    frontier = np.asarray(roots, dtype=np.int64)
+    while len(frontier):
+        reachable[frontier] = True
+        internal = frontier[left[frontier] != frontier]
+        frontier = np.concatenate([left[internal], right[internal]])
+    return reachable
+
+
+def _rebuild(forest, keep, left, right, value, roots, value_scale=None, **arrays):
+    """New forest from the nodes flagged in keep, renumbered in their original order"""
+    new_id = np.cumsum(keep) - 1
+    left = new_id[left[keep]]
+    right = new_id[right[keep]]
+    roots = new_id[roots]
+    return FlatForest(
+        feature=arrays.get('feature', forest.feature)[keep],
+        threshold=arrays.get('threshold', forest.threshold)[keep],
+        left=left.astype(np.int32),
+        right=right.astype(np.int32),
+        missing_left=forest.missing_left[keep],
+        value=value[keep],
+        roots=roots.astype(np.int32),
+        max_depth=_max_depth(left, right, roots),
+        encoder=forest.encoder,
+        metadata=dict(forest.metadata),
+        value_scale=forest.value_scale if value_scale is None else value_scale
+    )
+
+
+def select_trees(forest, X, n_trees):
+    """
+    Keep the n_trees trees whose average best reproduces the full forest's
+    probabilities on X, chosen by greedy forward selection on squared error.
+    """
+    if n_trees >= forest.n_trees:
+        return forest
+
+    probabilities = forest.tree_probabilities(X)
+    target = probabilities.mean(axis=1)
+    squares = (probabilities ** 2).mean(axis=0)
+    total = np.zeros(len(X))
+    chosen = np.zeros(forest.n_trees, dtype=bool)
+
+    for k in range(1, n_trees + 1):
+        # mean((total + p_j - k * target)^2) without materialising every candidate
+        residual = total - k * target
+        errors = 2 * (residual @ probabilities) / len(X) + squares
+        errors[chosen] = np.inf
+        best = int(np.argmin(errors))
+        chosen[best] = True
+        total += probabilities[:, best]
+
+    starts = forest.roots.astype(np.int64)
+    ends = np.append(starts[1:], forest.n_nodes)
+    keep = np.zeros(forest.n_nodes, dtype=bool)
+    for start, end in zip(starts[chosen], ends[chosen]):
+        keep[start:end] = True
+    return _rebuild(forest, keep, forest.left.astype(np.int64), forest.right.astype(np.int64),
+                    forest.value, starts[chosen])
+
+
+def merge_identical_leaves(forest):
+    """
+    Collapse every split whose two children are leaves with equal values,
+    repeating until none are left. Predictions are unchanged.
+    """
+    node_ids = np.arange(forest.n_nodes)
+    left = forest.left.astype(np.int64)
+    right = forest.right.astype(np.int64)
+    value = forest.value.copy()
+    feature = forest.feature.copy()
+    threshold = forest.threshold.copy()
+    is_leaf = left == node_ids
+
+    while True:
+        internal = np.flatnonzero(~is_leaf)
+        children_left, children_right = left[internal], right[internal]
+        mergeable = (
+            is_leaf[children_left] & is_leaf[children_right] &
+            (value[children_left] == value[children_right])
+        )
+        if not mergeable.any():
+            break
+        nodes = internal[mergeable]
+        value[nodes] = value[left[nodes]]
+        left[nodes] = nodes
+        right[nodes] = nodes
+        feature[nodes] = 0
+        threshold[nodes] = 0
+        is_leaf[nodes] = True
+
+    keep = _reachable(left, right, forest.roots)
+    return _rebuild(forest, keep, left, right, value, forest.roots.astype(np.int64),
+                    feature=feature, threshold=threshold)
+
+
+def quantize_values(forest):
+    """Store leaf values as 8-bit fractions of 1/255"""
+    value = np.rint(forest.value * forest.value_scale * VALUE_LEVELS).astype(np.uint8)
+    keep = np.ones(forest.n_nodes, dtype=bool)
+    return _rebuild(forest, keep, forest.left.astype(np.int64), forest.right.astype(np.int64),
+                    value, forest.roots.astype(np.int64), value_scale=1 / VALUE_LEVELS)
+
+
+def float32_thresholds(threshold, feature, X_reference=None):
+    """
+    Round thresholds to float32 without moving any reference input to the
+    other side of a split. Each threshold is rounded down to the largest
+    float32 not above it, which is exact for float32-representable inputs;
+    where a reference value falls in between (an encoded 56.00000000000001
+    against a threshold of 56.00000006, say) it is rounded up instead.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    down = threshold.astype(np.float32)
+    above = down.astype(np.float64) > threshold
+    down[above] = np.nextafter(down[above], np.float32(-np.inf))
+    if X_reference is None:
+        return down
+
+    up = down.copy()
+    below = up.astype(np.float64) < threshold
+    up[below] = np.nextafter(up[below], np.float32(np.inf))
+
+    rounded = down.copy()
+    for column in np.unique(feature):
+        values = np.unique(X_reference[:, column])
+        values = values[~np.isnan(values)]
+        nodes = np.flatnonzero(feature == column)
+        # Reference values in (down, threshold] would switch from left to right
+        moved = (np.searchsorted(values, threshold[nodes], 'right') -
+                 np.searchsorted(values, down[nodes].astype(np.float64), 'right')) > 0
+        rounded[nodes[moved]] = up[nodes[moved]]
+    return rounded
+
+
+def compact_dtypes(forest, X_reference=None):
+    """float32 thresholds and values, and the narrowest integer types for indices"""
+    index_dtype = np.uint16 if forest.n_nodes <= np.iinfo(np.uint16).max else np.int32
+    feature_dtype = np.uint8 if forest.feature.max(initial=0) <= np.iinfo(np.uint8).max else np.int32
+    value = forest.value if forest.value.dtype == np.uint8 else forest.value.astype(np.float32)
+    return FlatForest(
+        feature=forest.feature.astype(feature_dtype),
+        threshold=float32_thresholds(forest.threshold, forest.feature, X_reference),
+        left=forest.left.astype(index_dtype),
+        right=forest.right.astype(index_dtype),
+        missing_left=forest.missing_left,
+        value=value,
+        roots=forest.roots,
+        max_depth=forest.max_depth,
+        encoder=forest.encoder,
+        metadata=dict(forest.metadata),
+        value_scale=forest.value_scale
+    )
+
+
+def compact_forest(forest, level, X_reference=None):
+    """
+    Apply a compaction level to an exact forest. Tree selection and float32
+    rounding are checked against X_reference, by default the sensor grid
+    encoded with the forest's encoder (every 0.5 C for tree selection).
+    """
+    if level not in COMPACTION_LEVELS:
+        raise ValueError(f"Unknown compaction level {level!r}, expected one of {list(COMPACTION_LEVELS)}")
+    options = COMPACTION_LEVELS[level]
+    if X_reference is None and forest.encoder is not None and options.get('dtype'):
+        X_reference = reference_features(forest.encoder)
+    compacted = forest
+
+    if 'n_trees' in options:
+        if X_reference is None:
+            raise ValueError("Tree selection needs reference data or a forest with an encoder")
+        # A coarser grid is plenty for ranking trees and keeps the (rows x trees) matrix small
+        X_select = X_reference if forest.encoder is None else reference_features(forest.encoder, 5)
+        compacted = select_trees(compacted, X_select, options['n_trees'])
+    if options.get('dtype') == 'quantized':
+        compacted = quantize_values(compacted)
+    if options.get('merge_leaves'):
+        compacted = merge_identical_leaves(compacted)
+    if options.get('dtype'):
+        compacted = compact_dtypes(compacted, X_reference)
+
+    compacted.metadata['compaction'] = level
+    return compacted
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+
+from .feature_encoder import encoder_path
+from .flat_forest import forest_path
+from .decision_table import table_path
+
+MODEL_FILENAME = 'irrigation_model.joblib'
+METADATA_FILENAME = 'metadata.json'
+
+# Readings every published version is scored on; the API replays them
+# against a freshly loaded version before swapping it in
+CANARY_READINGS = [
+    (400, 0), (400, 40), (900, 0), (900, 40),
+    (550, 15), (700, 25), (850, 30), (612, 21.3)
+]
+# Allowed difference from the canary probabilities recorded at publish time
+CANARY_TOLERANCE = 1e-9
+
+
+def crop_model_path(models_dir, crop):
+    """Where the model trained for one crop is saved, under models_dir/crops/<crop>/"""
+    return os.path.join(models_dir, 'crops', crop, MODEL_FILENAME)
+
+
+def canary_arrays():
+    moisture, temperature = zip(*CANARY_READINGS)
+    return np.array(moisture, dtype=float), np.array(temperature, dtype=float)
+
+
+def check_canaries(candidate, registry=None, tolerance=CANARY_TOLERANCE):
+    """
+    Score the canary readings with a freshly loaded ServingModel and raise
+    ValueError if it looks broken: probabilities out of range, single and
+    batch predictions disagreeing, or, for a registry version, probabilities
+    differing from those recorded when it was published.
+    """
+    moisture, temperature = canary_arrays()
+    probabilities = candidate.predict_positive(moisture, temperature)
+    if not np.all(np.isfinite(probabilities)) or np.any((probabilities < 0) | (probabilities > 1)):
+        raise ValueError(f"Canary probabilities out of range: {probabilities.tolist()}")
+
+    singles = np.array([candidate.predict_one(m, t) for m, t in zip(moisture.tolist(), temperature.tolist())])
+    if np.max(np.abs(singles - probabilities)) > tolerance:
+        raise ValueError("Single and batch predictions disagree on the canary readings")
+
+    if registry is not None and candidate.version in registry.versions():
+        expected = registry.metadata(candidate.version).get('canary')
+        if expected:
+            # Compacted forests are checked against their own canaries
+            key = 'compact_probability' if candidate.is_compact and 'compact_probability' in expected[0] else 'probability'
+            expected = np.array([record[key] for record in expected])
+            max_diff = float(np.max(np.abs(expected - probabilities)))
+            if max_diff > tolerance:
+                raise ValueError(f"Canary probabilities differ from publish time by {max_diff:.3g}")
+
+
+def load_newest_valid(registry, load, default_path, skip=(), tolerance=CANARY_TOLERANCE):
+    """
+    Load registry versions newest first, then the model at default_path,
+    and return the first that passes its canaries, with a dict of the
+    versions rejected on the way and why. load(path, version) returns a
+    ServingModel; versions in skip are not tried. Raises the default
+    model's error when nothing passes.
+    """
+    rejected = {}
+    for version in reversed(registry.versions()):
+        if version in skip:
+            continue
+        try:
+            candidate = load(registry.model_path(version), version)
+            check_canaries(candidate, registry, tolerance)
+            return candidate, rejected
+        except Exception as e:
+            rejected[version] = f"{type(e).__name__}: {e}"
+    candidate = load(default_path, None)
+    check_canaries(candidate, registry, tolerance)
+    return candidate, rejected
+
+
+class ModelRegistry:
+    """
+    Directory of versioned model artifacts.
+
+    Each version is a sub-directory named by its publish timestamp holding
+    the joblib pipeline, its sidecars (encoder, compact forest, decision
+    table) and metadata.json. Versions are staged in a hidden directory and
+    renamed into place, so readers never see a half-written version.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def versions(self):
+        """Complete versions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and
+            os.path.exists(os.path.join(self.root, name, METADATA_FILENAME))
+        )
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def model_path(self, version):
+        return os.path.join(self.root, version, MODEL_FILENAME)
+
+    def metadata(self, version):
+        with open(os.path.join(self.root, version, METADATA_FILENAME)) as f:
+            return json.load(f)
+
+    def publish(self, model_path, metadata=None, canary_probabilities=None, version=None,
+                compact_canary_probabilities=None):
+        """
+        Copy a saved model and its sidecars into a new version. Canary
+        probabilities are recorded for the pipeline and, separately, for the
+        compact forest, which may be compacted beyond bit-for-bit parity.
+        """
+        version = version or datetime.now().strftime("%Y%m%d_%H%M%S")
+        final_dir = os.path.join(self.root, version)
+        if os.path.exists(final_dir):
+            raise ValueError(f"Model version {version} already exists")
+
+        staging_dir = os.path.join(self.root, f'.{version}.tmp')
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+
+        staged_model = os.path.join(staging_dir, MODEL_FILENAME)
+        shutil.copy2(model_path, staged_model)
+        if os.path.exists(encoder_path(model_path)):
+            shutil.copy2(encoder_path(model_path), encoder_path(staged_model))
+        for sidecar in (forest_path, table_path):
+            if os.path.isdir(sidecar(model_path)):
+                shutil.copytree(sidecar(model_path), sidecar(staged_model))
+
+        record = dict(metadata or {})
+        record.update({
+            'version': version,
+            'published_at': datetime.now().isoformat(),
+            'source': os.path.abspath(model_path)
+        })
+        if canary_probabilities is not None:
+            record['canary'] = [
+                {'moisture': m, 'temperature': t, 'probability': float(p)}
+                for (m, t), p in zip(CANARY_READINGS, canary_probabilities)
+            ]
+            if compact_canary_probabilities is not None:
+                for entry, p in zip(record['canary'], compact_canary_probabilities):
+                    entry['compact_probability'] = float(p)
+        with open(os.path.join(staging_dir, METADATA_FILENAME), 'w') as f:
+            json.dump(record, f, indent=2)
+
+        os.rename(staging_dir, final_dir)
+        return version
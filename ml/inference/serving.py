@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime
+import numpy as np
+
+from .feature_encoder import FeatureEncoder, encoder_path
+from .flat_forest import FlatForest, forest_path
+from .decision_table import DecisionTable, table_path
+
+
+def artifact_fingerprint(path):
+    """Short content hash of a model file or artifact directory"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(path, name), 'rb') as f:
+                digest.update(f.read())
+    else:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class ServingModel:
+    """
+    Everything needed to score raw readings: the estimator, the encoder it
+    was trained with and, in table mode, the precomputed decision table.
+    """
+
+    def __init__(self, estimator, encoder, source, fingerprint, decision_table=None, version=None):
+        self.estimator = estimator
+        self.encoder = encoder
+        self.source = source
+        self.fingerprint = fingerprint
+        self.decision_table = decision_table
+        self.version = version or fingerprint
+        self.loaded_at = datetime.now()
+
+    @property
+    def is_compact(self):
+        return isinstance(self.estimator, FlatForest)
+
+    @property
+    def nbytes(self):
+        """
+        Approximate memory held by the model: the forest arrays, or the size
+        of the pickled pipeline on disk, plus the decision table if any.
+        """
+        if self.is_compact:
+            size = self.estimator.nbytes
+        else:
+            size = os.path.getsize(self.source)
+        if self.decision_table is not None:
+            size += self.decision_table.probabilities.nbytes
+        return size
+
+    def predict_model(self, moisture, temperature, observe=None):
+        """
+        Class-1 probabilities from the estimator, bypassing the table.
+        observe(stage, seconds), when given, receives the time spent in the
+        'encode' and 'predict' stages.
+        """
+        if observe is None:
+            features = self.encoder.transform(moisture, temperature)
+            return self.estimator.predict_proba(features)[:, 1]
+
+        start = time.perf_counter()
+        features = self.encoder.transform(moisture, temperature)
+        encoded = time.perf_counter()
+        probabilities = self.estimator.predict_proba(features)[:, 1]
+        observe('encode', encoded - start)
+        observe('predict', time.perf_counter() - encoded)
+        return probabilities
+
+    def predict_positive(self, moisture, temperature, observe=None):
+        """Class-1 probabilities for arrays of readings"""
+        if self.decision_table is None:
+            return self.predict_model(moisture, temperature, observe)
+
+        probabilities, on_grid = self.decision_table.lookup_batch(moisture, temperature)
+        if not on_grid.all():
+            off_grid = ~on_grid
+            probabilities[off_grid] = self.predict_model(
+                np.asarray(moisture, dtype=float)[off_grid],
+                np.asarray(temperature, dtype=float)[off_grid],
+                observe
+            )
+        return probabilities
+
+    def lookup(self, moisture, temperature):
+        """Table probability for one reading, or None without a table hit"""
+        if self.decision_table is None:
+            return None
+        return self.decision_table.lookup(moisture, temperature)
+
+    def predict_one(self, moisture, temperature, observe=None):
+        """Class-1 probability for a single reading"""
+        probability = self.lookup(moisture, temperature)
+        if probability is not None:
+            return probability
+        return float(self.predict_model([moisture], [temperature], observe)[0])
+
+    def build_decision_table(self):
+        """Precompute the decision table for this model"""
+        return DecisionTable.build(self.predict_model, self.fingerprint)
+
+
+def load_serving_model(model_path, use_compact=True, table_mode=False, mmap=False, version=None):
+    """
+    Load a model for serving. The flattened forest exported next to
+    model_path is preferred over the joblib pipeline; in table mode a saved
+    decision table is used when it was built from the same artifact,
+    otherwise the table is built in memory. With mmap the forest and table
+    arrays are memory-mapped rather than read, so loading costs no copies
+    and the pages are shared with other processes mapping the same files.
+    """
+    mmap_mode = 'r' if mmap else None
+    if use_compact and os.path.isdir(forest_path(model_path)):
+        source = forest_path(model_path)
+        estimator = FlatForest.load(source, mmap_mode=mmap_mode)
+    else:
+        # joblib (and with it sklearn) is only imported for pickled pipelines
+        import joblib
+        source = model_path
+        estimator = joblib.load(model_path, mmap_mode=mmap_mode)
+
+    if getattr(estimator, 'encoder', None) is not None:
+        encoder = estimator.encoder
+    elif os.path.exists(encoder_path(model_path)):
+        encoder = FeatureEncoder.load(encoder_path(model_path))
+    else:
+        logging.info("No saved feature encoder found, using the default serving layout")
+        encoder = FeatureEncoder.serving_default()
+
+    model = ServingModel(estimator, encoder, source, artifact_fingerprint(source), version=version)
+
+    if table_mode:
+        saved_table = table_path(model_path)
+        table = None
+        if os.path.isdir(saved_table):
+            table = DecisionTable.load(saved_table, mmap_mode=mmap_mode)
+            if table.fingerprint != model.fingerprint:
+                logging.warning(f"Decision table at {saved_table} was built for another model, rebuilding")
+                table = None
+        if table is None:
+            start = time.perf_counter()
+            table = model.build_decision_table()
+            logging.info(f"Decision table built in {time.perf_counter() - start:.2f}s")
+        model.decision_table = table
+
+    return model
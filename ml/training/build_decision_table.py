@@ -0,0 +1,43 @@
+import sys
+import logging
+import os
+import time
+
+# Define base directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Shared serving code, so the table is built from exactly what the API loads
+sys.path.insert(0, BASE_DIR)
+from ml.inference import load_serving_model, table_path
+
+MODEL_PATH = os.path.join(BASE_DIR, 'ml', 'models', 'irrigation_model.joblib')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def build_decision_table(model_path=MODEL_PATH):
+    """Precompute the decision table for the API's table mode and save it next to the model"""
+    model = load_serving_model(model_path)
+    logging.info(f"Model loaded from {model.source}")
+
+    start = time.perf_counter()
+    table = model.build_decision_table()
+    logging.info(
+        f"Scored {table.probabilities.size} grid readings in {time.perf_counter() - start:.2f}s"
+    )
+
+    table.save(table_path(model_path))
+    logging.info(f"Decision table saved to {table_path(model_path)}")
+    return table
+
+def main():
+    if len(sys.argv) > 2:
+        print("Usage: python build_decision_table.py [model_joblib_file]")
+        sys.exit(1)
+
+    build_decision_table(sys.argv[1] if len(sys.argv) == 2 else MODEL_PATH)
+
+if __name__ == "__main__":
+    main()
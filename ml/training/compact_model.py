@@ -0,0 +1,122 @@
+import argparse
+import numpy as np
+import pandas as pd
+import sys
+import joblib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from sklearn.metrics import f1_score, roc_auc_score
+
+# Define base directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Shared feature encoding and compact model format
+sys.path.insert(0, BASE_DIR)
+from ml.inference import (
+    FeatureEncoder, FlatForest, encoder_path, forest_path, check_parity,
+    COMPACTION_LEVELS, compact_forest, IRRIGATION_THRESHOLD
+)
+from ml.inference.decision_table import grid_readings
+
+MODEL_PATH = os.path.join(BASE_DIR, 'ml', 'models', 'irrigation_model.joblib')
+TEST_DATASET = os.path.join(BASE_DIR, 'ml', 'training', 'dataset', 'test_dataset.csv')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def single_row_latency(forest, repeats=2000):
+    """Median time to encode and score one reading, as the API does per request"""
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        forest.predict_positive(forest.encoder.transform([612.0], [21.3]))
+        timings[i] = time.perf_counter() - start
+    return float(np.median(timings))
+
+def batch_throughput(forest, moisture, temperature):
+    """Readings encoded and scored per second in one batch"""
+    start = time.perf_counter()
+    forest.predict_positive(forest.encoder.transform(moisture, temperature))
+    return len(moisture) / (time.perf_counter() - start)
+
+def compaction_report(model_path=MODEL_PATH, test_data_path=TEST_DATASET):
+    """Build every compaction level and measure size, speed and accuracy for each"""
+    pipeline = joblib.load(model_path)
+    if os.path.exists(encoder_path(model_path)):
+        encoder = FeatureEncoder.load(encoder_path(model_path))
+    else:
+        logging.info("No saved feature encoder found, using the default serving layout")
+        encoder = FeatureEncoder.serving_default()
+
+    grid_moisture, grid_temperature = grid_readings()
+    X_grid = encoder.transform(grid_moisture, grid_temperature)
+    exact = FlatForest.from_pipeline(pipeline, encoder)
+    check_parity(pipeline, exact, X_grid)
+    exact_decisions = exact.predict_positive(X_grid) >= IRRIGATION_THRESHOLD
+
+    test_data = pd.read_csv(test_data_path)
+    X_test = encoder.transform(test_data['moisture'], test_data['temp'])
+    y_test = test_data['pump'].to_numpy()
+
+    rows = []
+    forests = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for level in COMPACTION_LEVELS:
+            forest = compact_forest(exact, level)
+            forests[level] = forest
+
+            saved = os.path.join(scratch, level)
+            forest.save(saved)
+            probabilities = forest.predict_positive(X_test)
+            grid_decisions = forest.predict_positive(X_grid) >= IRRIGATION_THRESHOLD
+
+            rows.append({
+                'level': level,
+                'trees': forest.n_trees,
+                'nodes': forest.n_nodes,
+                'artifact_kb': directory_size(saved) / 1024,
+                'ram_kb': forest.nbytes / 1024,
+                'single_us': single_row_latency(forest) * 1e6,
+                'batch_rows_per_s': batch_throughput(forest, grid_moisture, grid_temperature),
+                'f1': f1_score(y_test, probabilities >= IRRIGATION_THRESHOLD),
+                'auc': roc_auc_score(y_test, probabilities),
+                'grid_changed': int(np.sum(grid_decisions != exact_decisions))
+            })
+
+    return pd.DataFrame(rows).set_index('level'), forests
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compaction levels of a trained forest")
+    parser.add_argument('model', nargs='?', default=MODEL_PATH, help="Saved joblib pipeline")
+    parser.add_argument('--test-data', default=TEST_DATASET, help="Labelled CSV for F1 and AUC")
+    parser.add_argument('--save', choices=list(COMPACTION_LEVELS),
+                        help="Write this level as the compact model served by the API")
+    args = parser.parse_args()
+
+    report, forests = compaction_report(args.model, args.test_data)
+    with pd.option_context('display.float_format', '{:,.4g}'.format, 'display.max_columns', None,
+                           'display.width', 200):
+        print(f"\nCompaction report for {args.model}")
+        print(f"(grid_changed: sensor grid readings whose decision at {IRRIGATION_THRESHOLD} "
+              f"differs from the exact forest, out of {len(grid_readings()[0])})\n")
+        print(report)
+
+    if args.save:
+        target = forest_path(args.model)
+        shutil.rmtree(target, ignore_errors=True)
+        forests[args.save].save(target)
+        logging.info(
+            f"Compact model at level '{args.save}' saved to {target}; "
+            f"run export_compact_model.py to restore the exact export"
+        )
+
+if __name__ == "__main__":
+    main()
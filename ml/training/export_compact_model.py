@@ -0,0 +1,56 @@
+import numpy as np
+import sys
+import joblib
+import logging
+import os
+
+# Define base directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Shared feature encoding and compact model format
+sys.path.insert(0, BASE_DIR)
+from ml.inference import FeatureEncoder, FlatForest, encoder_path, forest_path, check_parity
+
+MODEL_PATH = os.path.join(BASE_DIR, 'ml', 'models', 'irrigation_model.joblib')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+def sensor_grid(encoder):
+    """Every reading the sensor APIs can produce: integer moisture, 0.1 C temperature"""
+    moisture, temp = np.meshgrid(np.arange(400, 901), np.arange(0, 401) / 10, indexing='ij')
+    return encoder.transform(moisture.ravel(), temp.ravel())
+
+def export_compact_model(model_path=MODEL_PATH):
+    """Flatten a saved pipeline, check it on the full sensor grid and save it next to the model"""
+    pipeline = joblib.load(model_path)
+    logging.info(f"Model loaded from {model_path}")
+
+    if os.path.exists(encoder_path(model_path)):
+        encoder = FeatureEncoder.load(encoder_path(model_path))
+    else:
+        logging.info("No saved feature encoder found, using the default serving layout")
+        encoder = FeatureEncoder.serving_default()
+
+    forest = FlatForest.from_pipeline(pipeline, encoder)
+    max_diff = check_parity(pipeline, forest, sensor_grid(encoder))
+    logging.info(f"Flattened forest matches the pipeline on the sensor grid (max difference {max_diff:.2e})")
+
+    forest.save(forest_path(model_path))
+    logging.info(
+        f"Compact model with {forest.n_trees} trees and {forest.n_nodes} nodes "
+        f"saved to {forest_path(model_path)}"
+    )
+    return forest
+
+def main():
+    if len(sys.argv) > 2:
+        print("Usage: python export_compact_model.py [model_joblib_file]")
+        sys.exit(1)
+
+    export_compact_model(sys.argv[1] if len(sys.argv) == 2 else MODEL_PATH)
+
+if __name__ == "__main__":
+    main()
@@ -18,9 +18,17 @@ import os
 # Define base directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Shared feature encoding used by training, validation and the API
+sys.path.insert(0, BASE_DIR)
+from ml.inference import (
+    FeatureEncoder, FEATURE_COLUMNS, encoder_path, FlatForest, forest_path, check_parity,
+    ModelRegistry, canary_arrays, compact_forest, crop_model_path
+)
+
 # Define subdirectories
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 MODELS_DIR = os.path.join(BASE_DIR, 'ml', 'models')
+REGISTRY_DIR = os.path.join(MODELS_DIR, 'registry')
 DATASET_DIR = os.path.join(BASE_DIR, 'ml', 'training', 'dataset')
 
 # Create directories if they don't exist
@@ -31,6 +39,10 @@ os.makedirs(MODELS_DIR, exist_ok=True)
 INPUT_DATASET = os.path.join(DATASET_DIR, 'input_dataset.csv')
 MODEL_PATH = os.path.join(MODELS_DIR, 'irrigation_model.joblib')
 
+# Compaction level of the exported serving model (see ml/inference/forest_compaction.py);
+# compact_model.py reports size, speed and accuracy for each level
+COMPACTION_LEVEL = 'exact'
+
 # Update paths for logs and images
 LOG_FILE = os.path.join(LOGS_DIR, f'training_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
 PLOT_DIR = os.path.join(LOGS_DIR, 'plots')
@@ -52,12 +64,14 @@ logging.basicConfig(
 )
 
 class IrrigationMLPipeline:
-    def __init__(self, input_file=INPUT_DATASET, model_save_path=MODEL_PATH):
+    def __init__(self, input_file=INPUT_DATASET, model_save_path=MODEL_PATH, crop=None):
         self.input_file = input_file
         self.model_save_path = model_save_path
+        self.crop = crop
         self.data = None
         self.pipeline = None
         self.feature_columns = None
+        self.encoder = None
         self.best_params = None
         
     def load_and_validate_data(self):
@@ -75,6 +89,12 @@ class IrrigationMLPipeline:
             if missing_columns:
                 raise ValueError(f"Missing required columns: {missing_columns}")
             
+            # Per-crop models are trained on that crop's rows only
+            if self.crop is not None:
+                self.data = self.data[self.data['crop'] == self.crop].reset_index(drop=True)
+                if self.data.empty:
+                    raise ValueError(f"No rows for crop '{self.crop}'")
+            
             # Check for missing values
             missing_values = self.data.isnull().sum()
             if missing_values.any():
@@ -136,47 +156,15 @@ class IrrigationMLPipeline:
         Prepare data with comprehensive feature engineering
         """
         try:
-            # 1. Basic normalization
-            self.data['moisture_normalized'] = (self.data['moisture'] - 400) / (900 - 400) * 100
-            self.data['temp_normalized'] = (self.data['temp'] - self.data['temp'].min()) / \
-                                         (self.data['temp'].max() - self.data['temp'].min())
-            
-            # 2. Create bins
-            self.data['moisture_bin'] = pd.qcut(
-                self.data['moisture'], 
-                q=4,
-                labels=['low', 'medium_low', 'medium_high', 'high']
-            )
+            # Fix bin edges and normalization ranges on the training data so
+            # the exact same encoding can be reused at validation and serving time
+            self.encoder = FeatureEncoder.fit(self.data['moisture'], self.data['temp'])
+            logging.info(f"Feature encoder: {self.encoder.to_dict()}")
             
-            self.data['temp_bin'] = pd.cut(
-                self.data['temp'],
-                bins=[float('-inf'), 15, 25, float('inf')],
-                labels=['cold', 'optimal', 'hot']
-            )
-            
-            # 3. Interaction features
-            self.data['moisture_temp_interaction'] = self.data['moisture_normalized'] * \
-                                                   self.data['temp_normalized']
+            X = self.encoder.transform(self.data['moisture'], self.data['temp'])
+            y = self.data['pump'].to_numpy()
             
-            # Create dummy variables
-            moisture_dummies = pd.get_dummies(self.data['moisture_bin'], prefix='moisture')
-            temp_dummies = pd.get_dummies(self.data['temp_bin'], prefix='temp')
-            
-            # Select features
-            numerical_features = [
-                'moisture_normalized', 'temp_normalized',
-                'moisture', 'temp', 'moisture_temp_interaction'
-            ]
-            
-            # Combine features
-            X = pd.concat([
-                self.data[numerical_features],
-                moisture_dummies,
-                temp_dummies
-            ], axis=1)
-            y = self.data['pump']
-            
-            self.feature_columns = X.columns
+            self.feature_columns = FEATURE_COLUMNS
             
             # Train-test split
             return train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
@@ -328,24 +316,91 @@ class IrrigationMLPipeline:
             logging.error(f"Error in analyzing feature importance: {str(e)}")
     
     def save_model(self):
-        """Save the trained pipeline"""
+        """Save the trained pipeline and its feature encoder"""
         if self.pipeline is None:
             logging.error("No model to save")
             return
         
         try:
+            os.makedirs(os.path.dirname(self.model_save_path), exist_ok=True)
             joblib.dump(self.pipeline, self.model_save_path)
             logging.info(f"Model saved to {self.model_save_path}")
+            
+            self.encoder.save(encoder_path(self.model_save_path))
+            logging.info(f"Feature encoder saved to {encoder_path(self.model_save_path)}")
         except Exception as e:
             logging.error(f"Error saving model: {str(e)}")
+    
+    def export_compact_model(self, X_check):
+        """
+        Export the pipeline as a flattened forest for low-latency serving.
+        The export is checked against the pipeline on X_check before it is written.
+        """
+        if self.pipeline is None:
+            logging.error("No model to export")
+            return
+        
+        try:
+            forest = FlatForest.from_pipeline(self.pipeline, self.encoder)
+            max_diff = check_parity(self.pipeline, forest, X_check)
+            logging.info(f"Flattened forest matches the pipeline (max difference {max_diff:.2e})")
+            
+            if COMPACTION_LEVEL != 'exact':
+                forest = compact_forest(forest, COMPACTION_LEVEL)
+                logging.info(f"Compacted to level '{COMPACTION_LEVEL}'")
+            
+            forest.save(forest_path(self.model_save_path))
+            logging.info(
+                f"Compact model with {forest.n_trees} trees and {forest.n_nodes} nodes "
+                f"saved to {forest_path(self.model_save_path)}"
+            )
+        except Exception as e:
+            logging.error(f"Error exporting compact model: {str(e)}")
+    
+    def publish_model(self, registry_dir=REGISTRY_DIR):
+        """
+        Publish the saved model and its sidecars as a new registry version.
+        Canary probabilities are recorded so the API can verify the version
+        loads to the same predictions before serving it.
+        """
+        if self.pipeline is None:
+            logging.error("No model to publish")
+            return None
+        
+        try:
+            moisture, temperature = canary_arrays()
+            X_canary = self.encoder.transform(moisture, temperature)
+            canary_probabilities = self.pipeline.predict_proba(X_canary)[:, 1]
+            
+            # A compacted forest may differ slightly from the pipeline, so it gets its own canaries
+            compact_canary_probabilities = None
+            if os.path.isdir(forest_path(self.model_save_path)):
+                forest = FlatForest.load(forest_path(self.model_save_path))
+                compact_canary_probabilities = forest.predict_positive(X_canary)
+            
+            version = ModelRegistry(registry_dir).publish(
+                self.model_save_path,
+                metadata={'best_params': self.best_params},
+                canary_probabilities=canary_probabilities,
+                compact_canary_probabilities=compact_canary_probabilities
+            )
+            logging.info(f"Model published to the registry as version {version}")
+            return version
+        except Exception as e:
+            logging.error(f"Error publishing model: {str(e)}")
+            return None
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <input_csv_file>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python script.py <input_csv_file> [crop]")
         sys.exit(1)
     
-    # Initialize pipeline
-    pipeline = IrrigationMLPipeline(sys.argv[1])
+    # Initialize pipeline; with a crop the model is saved under ml/models/crops/<crop>/
+    crop = sys.argv[2] if len(sys.argv) == 3 else None
+    if crop is None:
+        pipeline = IrrigationMLPipeline(sys.argv[1])
+    else:
+        pipeline = IrrigationMLPipeline(sys.argv[1], crop_model_path(MODELS_DIR, crop), crop)
     
     # Load and validate data
     if not pipeline.load_and_validate_data():
@@ -369,6 +424,14 @@ def main():
     
     # Save model
     pipeline.save_model()
+    
+    # Export compact model for serving
+    pipeline.export_compact_model(X_test)
+    
+    # Publish a new version for the API to pick up; per-crop models are
+    # loaded from their save path by the API's model pool instead
+    if crop is None:
+        pipeline.publish_model()
 
 if __name__ == "__main__":
     main()
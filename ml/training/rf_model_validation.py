@@ -7,9 +7,15 @@ import joblib
 import logging
 from datetime import datetime
 import os
+import sys
 
 # Define base directory and create logs directory
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Shared feature encoding used by training, validation and the API
+sys.path.insert(0, BASE_DIR)
+from ml.inference import FeatureEncoder, FlatForest, encoder_path, forest_path, check_parity, LOSSLESS_LEVELS
+
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOGS_DIR, exist_ok=True)
 
@@ -28,12 +34,19 @@ class ModelTester:
         """Initialize the model tester"""
         self.model_path = model_path or os.path.join(BASE_DIR, 'ml', 'models', 'irrigation_model.joblib')
         self.pipeline = None
+        self.encoder = None
         
     def load_model(self):
-        """Load the trained model pipeline"""
+        """Load the trained model pipeline and its feature encoder"""
         try:
             self.pipeline = joblib.load(self.model_path)
             logging.info("Model loaded successfully")
+            
+            if os.path.exists(encoder_path(self.model_path)):
+                self.encoder = FeatureEncoder.load(encoder_path(self.model_path))
+                logging.info("Feature encoder loaded successfully")
+            else:
+                logging.warning("No saved feature encoder found, bins will be fitted on the test data")
             return True
         except Exception as e:
             logging.error(f"Error loading model: {str(e)}")
@@ -41,45 +54,10 @@ class ModelTester:
     
     def prepare_test_data(self, test_data):
         """Prepare test data with feature engineering"""
-        # Basic normalization
-        test_data['moisture_normalized'] = (test_data['moisture'] - 400) / (900 - 400) * 100
-        test_data['temp_normalized'] = (test_data['temp'] - test_data['temp'].min()) / \
-                                     (test_data['temp'].max() - test_data['temp'].min())
-        
-        # Create bins
-        test_data['moisture_bin'] = pd.qcut(
-            test_data['moisture'], 
-            q=4,
-            labels=['low', 'medium_low', 'medium_high', 'high']
-        )
-        
-        test_data['temp_bin'] = pd.cut(
-            test_data['temp'],
-            bins=[float('-inf'), 15, 25, float('inf')],
-            labels=['cold', 'optimal', 'hot']
-        )
-        
-        # Interaction features
-        test_data['moisture_temp_interaction'] = test_data['moisture_normalized'] * \
-                                               test_data['temp_normalized']
-        
-        # Create dummy variables
-        moisture_dummies = pd.get_dummies(test_data['moisture_bin'], prefix='moisture')
-        temp_dummies = pd.get_dummies(test_data['temp_bin'], prefix='temp')
-        
-        # Combine features
-        numerical_features = [
-            'moisture_normalized', 'temp_normalized',
-            'moisture', 'temp', 'moisture_temp_interaction'
-        ]
+        encoder = self.encoder or FeatureEncoder.fit(test_data['moisture'], test_data['temp'])
+        X_test = encoder.transform(test_data['moisture'], test_data['temp'])
         
-        X_test = pd.concat([
-            test_data[numerical_features],
-            moisture_dummies,
-            temp_dummies
-        ], axis=1)
-        
-        return X_test, test_data['pump']
+        return X_test, test_data['pump'].to_numpy()
     
     def test_model(self, test_data_path):
         """Run complete model testing"""
@@ -97,11 +75,40 @@ class ModelTester:
         # Log results
         self._log_results(y_test, predictions, probabilities)
         
+        # Check the exported compact model still matches the pipeline
+        self.check_compact_model(X_test)
+        
         # Generate visualizations
         self._plot_results(y_test, predictions, probabilities)
         
         return predictions, probabilities
     
+    def check_compact_model(self, X_test):
+        """Compare the flattened forest served by the API against the pipeline"""
+        if not os.path.isdir(forest_path(self.model_path)):
+            logging.info("No compact model exported, skipping parity check")
+            return None
+        
+        try:
+            forest = FlatForest.load(forest_path(self.model_path))
+            level = forest.metadata.get('compaction', 'exact')
+            if level not in LOSSLESS_LEVELS:
+                # Lossy compaction is judged on decisions rather than bit-for-bit parity
+                probabilities = forest.predict_positive(X_test)
+                max_diff = float(np.max(np.abs(probabilities - self.pipeline.predict_proba(X_test)[:, 1])))
+                agreement = np.mean((probabilities >= 0.5) == self.pipeline.predict(X_test))
+                logging.info(
+                    f"Compact model compacted to '{level}': max difference {max_diff:.2e}, "
+                    f"{agreement:.1%} of test decisions match the pipeline"
+                )
+                return True
+            max_diff = check_parity(self.pipeline, forest, X_test)
+            logging.info(f"Compact model parity check passed (max difference {max_diff:.2e})")
+            return True
+        except AssertionError as e:
+            logging.error(f"Compact model parity check failed: {str(e)}")
+            return False
+    
     def _log_results(self, y_test, predictions, probabilities):
         """Log model performance metrics"""
         # Classification report
@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Define base directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.insert(0, BASE_DIR)
+from ml.inference import IRRIGATION_THRESHOLD, decide
+
+
+@pytest.mark.parametrize('probability', [0.8, np.float32(0.8), np.float64(0.8), np.array(0.8), 1])
+def test_scalars_give_plain_python_values(probability):
+    need_irrigation, confidence = decide(probability)
+    assert type(need_irrigation) is bool and type(confidence) is float
+    assert need_irrigation
+    json.dumps({"need_irrigation": need_irrigation, "confidence": confidence})
+
+
+def test_confidence_is_the_decided_class_probability():
+    assert decide(0.3) == (False, pytest.approx(0.7))
+    assert decide(IRRIGATION_THRESHOLD)[0] is True
+
+
+def test_arrays_decide_elementwise():
+    need_irrigation, confidence = decide(np.array([0.1, 0.9, IRRIGATION_THRESHOLD]))
+    np.testing.assert_array_equal(need_irrigation, [False, True, True])
+    np.testing.assert_allclose(confidence, [0.9, 0.9, IRRIGATION_THRESHOLD])
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Define base directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+sys.path.insert(0, BASE_DIR)
+from ml.inference import FeatureEncoder, FlatForest, encoder_path, forest_path, check_parity
+
+joblib = pytest.importorskip('joblib')
+
+MODEL_PATH = os.path.join(BASE_DIR, 'ml', 'models', 'irrigation_model.joblib')
+
+# The pipeline was fitted on a DataFrame; the encoder produces plain arrays in the same column order
+pytestmark = pytest.mark.filterwarnings("ignore:X does not have valid feature names")
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    return joblib.load(MODEL_PATH)
+
+
+@pytest.fixture(scope='module')
+def forest():
+    return FlatForest.load(forest_path(MODEL_PATH))
+
+
+@pytest.fixture(scope='module')
+def encoder(forest):
+    if forest.encoder is not None:
+        return forest.encoder
+    if os.path.exists(encoder_path(MODEL_PATH)):
+        return FeatureEncoder.load(encoder_path(MODEL_PATH))
+    return FeatureEncoder.serving_default()
+
+
+def test_parity_on_sensor_grid(pipeline, forest, encoder):
+    # Every reading the sensor APIs can produce: integer moisture, 0.1 C temperature
+    moisture, temp = np.meshgrid(np.arange(400, 901), np.arange(0, 401) / 10, indexing='ij')
+    check_parity(pipeline, forest, encoder.transform(moisture.ravel(), temp.ravel()))
+
+
+def test_parity_on_random_readings(pipeline, forest, encoder):
+    rng = np.random.default_rng(0)
+    moisture = rng.uniform(300, 1000, 20000)
+    temp = rng.uniform(-10, 50, 20000)
+    check_parity(pipeline, forest, encoder.transform(moisture, temp))
+
+
+@pytest.mark.parametrize('moisture, temp', [(400, 0), (612, 21.3), (900, 40)])
+def test_parity_on_single_serving_default_row(pipeline, forest, moisture, temp):
+    X = FeatureEncoder.serving_default().transform([moisture], [temp])
+    assert X.shape[0] == 1
+    assert np.isnan(X[0, 1])  # temp_normalized
+    check_parity(pipeline, forest, X)
+    assert forest.predict_positive(X)[0] == pytest.approx(pipeline.predict_proba(X)[0, 1], abs=1e-9)